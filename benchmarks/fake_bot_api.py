@@ -0,0 +1,169 @@
+"""Локальная подмена Telegram Bot API для нагрузочных прогонов.
+
+HTTP-сервер на стандартной библиотеке отвечает на getMe и sendMessage так же,
+как api.telegram.org, и умеет портить ответы: задержка, ошибки 5xx, 429 с
+retry_after при превышении лимита и оборванные соединения - как до обработки
+запроса (сообщение потеряно), так и после (сообщение доставлено, а клиент
+об этом не узнал). Бот подключается через telegram.Bot(token, base_url=api.base_url).
+"""
+import json
+import random
+import socket
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+class FakeBotAPI:
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, drop_rate=0.0,
+                 ghost_rate=0.0, rate_limit=None, retry_after=1, seed=1):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.ghost_rate = ghost_rate
+        self.rate_limit = rate_limit
+        self.retry_after = max(1, int(retry_after))
+        # Принятые сообщения: (chat_id, текст) в порядке приёма
+        self.messages = []
+        self.stats = Counter()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._tokens = float(rate_limit or 0)
+        self._tokens_time = time.monotonic()
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/bot"
+
+    def start(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, как у настоящего API: клиент держит пул соединений
+            protocol_version = 'HTTP/1.1'
+            # Ответ уходит одним сегментом: иначе Nagle и отложенный ACK добавляют ~40 мс к запросу
+            wbufsize = -1
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                api._handle(self)
+
+            do_GET = do_POST
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def _roll(self, rate):
+        if not rate:
+            return False
+        with self._lock:
+            return self._rng.random() < rate
+
+    def _take_token(self):
+        """Глобальный лимит отправки на стороне сервера (token bucket)"""
+        if not self.rate_limit:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate_limit, self._tokens + (now - self._tokens_time) * self.rate_limit)
+            self._tokens_time = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def _handle(self, request):
+        length = int(request.headers.get('Content-Length') or 0)
+        body = request.rfile.read(length) if length else b''
+        method = request.path.rsplit('/', 1)[-1]
+        if request.headers.get('Content-Type', '').startswith('application/json'):
+            params = json.loads(body or b'{}')
+        else:
+            params = {key: values[0] for key, values in parse_qs(body.decode('utf-8')).items()}
+
+        with self._lock:
+            self.stats['requests'] += 1
+            delay = self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            time.sleep(delay)
+
+        if method == 'getMe':
+            return self._reply(request, 200, {'ok': True, 'result': {
+                'id': 1, 'is_bot': True, 'first_name': 'Fake', 'username': 'fake_bot'
+            }})
+        if method != 'sendMessage':
+            return self._reply(request, 200, {'ok': True, 'result': True})
+
+        if self._roll(self.drop_rate):
+            self._count('dropped')
+            return self._drop(request)
+        if not self._take_token():
+            self._count('rate_limited')
+            return self._reply(request, 429, {
+                'ok': False, 'error_code': 429,
+                'description': f"Too Many Requests: retry after {self.retry_after}",
+                'parameters': {'retry_after': self.retry_after},
+            })
+        if self._roll(self.error_rate):
+            self._count('server_errors')
+            return self._reply(request, 500, {
+                'ok': False, 'error_code': 500, 'description': 'Internal Server Error'
+            })
+
+        chat_id = str(params.get('chat_id'))
+        text = params.get('text', '')
+        with self._lock:
+            self.messages.append((chat_id, text))
+            message_id = len(self.messages)
+            self.stats['delivered'] += 1
+
+        if self._roll(self.ghost_rate):
+            # Сообщение принято, но ответ не дошёл: клиент повторит отправку
+            self._count('ghosted')
+            return self._drop(request)
+
+        self._reply(request, 200, {'ok': True, 'result': {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': int(chat_id) if chat_id.lstrip('-').isdigit() else 0, 'type': 'private'},
+            'text': text,
+        }})
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    @staticmethod
+    def _reply(request, status, payload):
+        data = json.dumps(payload).encode('utf-8')
+        request.send_response(status)
+        request.send_header('Content-Type', 'application/json')
+        request.send_header('Content-Length', str(len(data)))
+        request.end_headers()
+        request.wfile.write(data)
+
+    @staticmethod
+    def _drop(request):
+        request.close_connection = True
+        try:
+            request.connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
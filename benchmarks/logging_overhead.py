@@ -0,0 +1,121 @@
+"""Цена логирования в цикле check_candidates.
+
+Прогоняет холодный (все строки новые) и тёплый (таблица почти не менялась)
+циклы на синтетической таблице при разных настройках логов и сравнивает
+время цикла, число записей и объём вывода. DEBUG без выборки пишет столько же
+построчных записей, сколько прежде писалось на INFO, поэтому разница INFO и
+DEBUG - это экономия от сводного логирования.
+
+Каждая настройка запускается в отдельном процессе: LOG_LEVEL и
+LOG_ROW_SAMPLE_EVERY читаются из окружения при импорте config. Логи пишутся
+в os.devnull с форматом из main.py, так что форматирование и запись учтены.
+
+Запуск из корня репозитория:
+    python -m benchmarks.logging_overhead --rows 50000
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+
+# Настройки: (название, LOG_LEVEL, LOG_ROW_SAMPLE_EVERY)
+MODES = (
+    ('DEBUG, все строки', 'DEBUG', 1),
+    ('DEBUG, каждая 100-я', 'DEBUG', 100),
+    ('INFO (по умолчанию)', 'INFO', 1),
+)
+
+
+class CountingHandler(logging.StreamHandler):
+    """Обработчик, который считает записи и байты вывода"""
+
+    def __init__(self, stream):
+        super().__init__(stream)
+        self.records = 0
+        self.bytes = 0
+
+    def emit(self, record):
+        self.records += 1
+        self.bytes += len(self.format(record)) + 1
+        super().emit(record)
+
+
+def child(rows, repeat):
+    """Замер в текущем процессе; печатает результат одной строкой JSON"""
+    sink = open(os.devnull, 'w', encoding='utf-8')
+    handler = CountingHandler(sink)
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(getattr(logging, os.environ.get('LOG_LEVEL', 'INFO')))
+
+    # Импорт после настройки логов: basicConfig в main.py тогда ничего не меняет
+    from benchmarks.suite import Workdir, register_recruiters, stub_telegram
+    from main import CandidateBot
+    from sheet_source import SyntheticSheetSource
+
+    result = {'cold': None, 'warm': None, 'cold_records': 0, 'warm_records': 0,
+              'cold_bytes': 0, 'warm_bytes': 0}
+    for _ in range(max(1, repeat)):
+        workdir = Workdir()
+        try:
+            source = SyntheticSheetSource(tabs=10, rows=max(1, rows // 10))
+            db = workdir.database()
+            register_recruiters(db, source)
+            bot = CandidateBot(sheet_source=source, telegram_bot=stub_telegram(db), database=db)
+            for phase in ('cold', 'warm'):
+                if phase == 'warm':
+                    source.advance(20)
+                handler.records = handler.bytes = 0
+                started = time.perf_counter()
+                asyncio.run(bot.check_candidates())
+                elapsed = time.perf_counter() - started
+                if result[phase] is None or elapsed < result[phase]:
+                    result[phase] = elapsed
+                result[f'{phase}_records'] = handler.records
+                result[f'{phase}_bytes'] = handler.bytes
+        finally:
+            workdir.cleanup()
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.rows, args.repeat)
+        return
+
+    results = []
+    for label, level, sample in MODES:
+        env = dict(os.environ, LOG_LEVEL=level, LOG_ROW_SAMPLE_EVERY=str(sample))
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.logging_overhead', '--child',
+             '--rows', str(args.rows), '--repeat', str(args.repeat)],
+            env=env, check=True, capture_output=True, text=True
+        ).stdout
+        results.append((label, json.loads(output.strip().splitlines()[-1])))
+
+    print(f"Строк в таблице: {args.rows}")
+    print(f"{'логи':<22} {'цикл хол., с':>13} {'записей':>9} {'КБ':>8}   "
+          f"{'цикл тёпл., с':>14} {'записей':>9} {'КБ':>8}")
+    for label, r in results:
+        print(f"{label:<22} {r['cold']:>13.3f} {r['cold_records']:>9} {r['cold_bytes'] / 1024:>8.0f}   "
+              f"{r['warm']:>14.3f} {r['warm_records']:>9} {r['warm_bytes'] / 1024:>8.0f}")
+
+    verbose = results[0][1]
+    summary = results[-1][1]
+    print(f"Экономия INFO против построчного вывода: холодный цикл "
+          f"{1 - summary['cold'] / verbose['cold']:.0%}, тёплый {1 - summary['warm'] / verbose['warm']:.0%}")
+
+
+if __name__ == '__main__':
+    main()
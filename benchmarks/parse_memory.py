@@ -0,0 +1,97 @@
+"""Пиковая память и время разбора строк листа: словари против Candidate.
+
+Запуск из корня репозитория:
+    python -m benchmarks.parse_memory --rows 100000
+"""
+import argparse
+import logging
+import random
+import time
+import tracemalloc
+
+from config import COLUMNS
+from google_sheets import GoogleSheetsAPI
+from sync import row_identity, candidate_key
+
+
+def make_rows(count, seed=1):
+    """Строки в том виде, в каком их отдаёт Sheets API (пустые ячейки в конце отброшены)"""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        row = [''] * (COLUMNS['start_date'] + 1)
+        row[COLUMNS['name']] = f"Кандидат {i} {rng.choice(['Иванов', 'Петрова', 'Сидоров'])}"
+        row[COLUMNS['object']] = f"Объект {rng.randint(1, 300)}"
+        row[COLUMNS['recruiter']] = f"Рекрутер {rng.randint(1, 40)}"
+        row[COLUMNS['start_date']] = f"{rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.2026"
+        if i % 10 == 0:
+            # Строка без даты выхода: API обрезает её после последней непустой ячейки
+            row = row[:COLUMNS['recruiter'] + 1]
+        rows.append(row)
+    return rows
+
+
+def legacy_parse_rows(api, sheet_name, values):
+    """Прежний разбор: копия строки с дополнением и словарь на кандидата"""
+    candidates = []
+    occurrences = {}
+    for idx, row in enumerate(values):
+        if len(row) < 17:
+            row = row + [''] * (17 - len(row))
+        name = row[COLUMNS['name']].strip() if len(row) > COLUMNS['name'] else ''
+        obj = row[COLUMNS['object']].strip() if len(row) > COLUMNS['object'] else ''
+        recruiter = row[COLUMNS['recruiter']].strip() if len(row) > COLUMNS['recruiter'] else None
+        date_str = row[COLUMNS['start_date']].strip() if len(row) > COLUMNS['start_date'] else ''
+        if not name or not obj or not date_str:
+            continue
+        parsed_date = api._parse_date(date_str)
+        if not parsed_date:
+            continue
+        identity = row_identity(name, obj)
+        ordinal = occurrences.get(identity, 0)
+        occurrences[identity] = ordinal + 1
+        candidates.append({
+            'id': candidate_key(sheet_name, identity, ordinal),
+            'name': name,
+            'object': obj,
+            'start_date': parsed_date,
+            'recruiter_id': recruiter if recruiter else None,
+            'sheet': sheet_name,
+            'row': idx + 2
+        })
+    return candidates
+
+
+def measure(label, parse, values):
+    # Время меряем отдельно: tracemalloc сильно замедляет выделения
+    started = time.perf_counter()
+    parse(values)
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    result = parse(values)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<10} {len(result):>8} канд. {elapsed:8.3f} с   пик {peak / 1024 / 1024:8.1f} МБ")
+    return peak, len(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    # Клиент Sheets создаётся при первом запросе, а разбор к API не обращается
+    api = GoogleSheetsAPI('benchmark')
+    values = make_rows(args.rows)
+
+    legacy, legacy_count = measure('dict', lambda v: legacy_parse_rows(api, 'Лист', v), values)
+    current, current_count = measure('Candidate', lambda v: api._parse_rows('Лист', v), values)
+    if not current_count or current_count != legacy_count:
+        # Разбор, потерявший строки, был бы «экономнее» по памяти
+        raise SystemExit(f"Разобрано {current_count} кандидатов вместо {legacy_count} - замер недействителен")
+    print(f"Пиковая память: {current / legacy:.0%} от прежней")
+
+
+if __name__ == '__main__':
+    main()
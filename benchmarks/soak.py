@@ -0,0 +1,218 @@
+"""Длительный прогон бота против локальной подмены Telegram Bot API.
+
+Бот (настоящие CandidateBot, TelegramBot и telegram.Bot) работает по
+расписанию AsyncIOScheduler на синтетической таблице, которая правится
+между циклами, и отправляет напоминания в benchmarks.fake_bot_api с
+заданными задержкой, ошибками, лимитом и обрывами соединений. В конце
+печатает доставленные сообщения в секунду, дубли и потерянные напоминания
+и перцентили длительности цикла.
+
+Запуск из корня репозитория:
+    python -m benchmarks.soak --cycles 20 --interval 1
+    python -m benchmarks.soak --latency 0.2 --error-rate 0.05 --drop-rate 0.02 \\
+        --ghost-rate 0.01 --server-rate 20 --mode digest
+
+Код возврата 1, если есть потерянные напоминания (отмечены отправленными,
+но сервер их не получил).
+"""
+import argparse
+import asyncio
+import html
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from telegram import Bot
+from telegram.request import HTTPXRequest
+
+from benchmarks.fake_bot_api import FakeBotAPI
+from database import Database, REMINDER_SENT
+from main import CandidateBot
+from sheet_source import SyntheticSheetSource
+from telegram_bot import TelegramBot, RateLimiter
+
+TOKEN = '123456:soak'
+CHAT_ID_BASE = 100000
+
+# Имя кандидата в тексте одиночного напоминания и в строке сводки
+REMINDER_NAME = re.compile(r'<b>Кандидат:</b> (.+)\n')
+DIGEST_NAME = re.compile(r'^\d+\. <b>(.+?)</b> — ', re.MULTILINE)
+
+
+def percentile(values, share):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(share * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def received_reminders(messages):
+    """Сколько раз каждый (chat_id, ФИО) пришёл на сервер"""
+    received = Counter()
+    for chat_id, text in messages:
+        for pattern in (REMINDER_NAME, DIGEST_NAME):
+            for name in pattern.findall(text):
+                received[(chat_id, html.unescape(name))] += 1
+    return received
+
+
+def reminder_state(db_path, chat_ids, target_date):
+    """Кандидаты, отмеченные в базе отправленными, и ещё ожидающие отправки на target_date"""
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute('''
+            SELECT name, recruiter_id, start_date, reminder_sent
+            FROM candidates
+            WHERE deleted_at IS NULL AND (reminder_sent = ? OR start_date = ?)
+        ''', (REMINDER_SENT, target_date)).fetchall()
+    finally:
+        conn.close()
+    sent = set()
+    pending = set()
+    for name, recruiter_id, start_date, reminder_sent in rows:
+        chat_id = chat_ids.get(recruiter_id)
+        if not chat_id:
+            continue
+        if reminder_sent == REMINDER_SENT:
+            sent.add((chat_id, name))
+        elif start_date == target_date:
+            pending.add((chat_id, name))
+    return sent, pending
+
+
+async def soak(args):
+    api = FakeBotAPI(
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        drop_rate=args.drop_rate, ghost_rate=args.ghost_rate,
+        rate_limit=args.server_rate, retry_after=args.retry_after, seed=args.seed
+    ).start()
+    workdir = tempfile.mkdtemp(prefix='candidate-soak-')
+    db_path = os.path.join(workdir, 'soak.db')
+    db = Database(db_path)
+
+    source = SyntheticSheetSource(
+        tabs=args.tabs, rows=args.rows, seed=args.seed,
+        recruiters=args.recruiters, spread_days=args.spread_days
+    )
+    chat_ids = {}
+    for number, name in enumerate(source.recruiter_names, 1):
+        chat_ids[name] = str(CHAT_ID_BASE + number)
+        db.add_recruiter(chat_ids[name], name)
+
+    telegram = TelegramBot(token=TOKEN, database=db)
+    # Пул соединений как у Application (у голого Bot он из одного соединения)
+    request = HTTPXRequest(connection_pool_size=args.pool_size)
+    telegram.bot = Bot(TOKEN, base_url=api.base_url, request=request)
+    telegram.rate_limiter = RateLimiter(args.global_rate, args.per_chat_rate)
+    telegram.max_attempts = max(1, args.max_attempts)
+    telegram.retry_base_delay = args.retry_base_delay
+    bot = CandidateBot(sheet_source=source, telegram_bot=telegram, database=db)
+    bot.reminder_mode = args.mode
+    # Повтор недоставленных из очереди - уже в следующем цикле, а не через минуту
+    bot.retry_base_seconds = args.outbox_retry_base
+    bot.retry_max_seconds = max(args.outbox_retry_base, args.interval)
+
+    latencies = []
+    done = asyncio.Event()
+
+    async def cycle():
+        if latencies:
+            source.advance(args.changes)
+        started = time.perf_counter()
+        await bot.check_candidates()
+        latencies.append(time.perf_counter() - started)
+        print(f"цикл {len(latencies):>3}: {latencies[-1]:7.2f} с, "
+              f"принято сервером {api.stats['delivered']}", flush=True)
+        if len(latencies) >= args.cycles:
+            done.set()
+
+    scheduler = AsyncIOScheduler()
+    scheduler.add_job(
+        cycle, 'interval', seconds=args.interval, next_run_time=datetime.now(),
+        max_instances=1, coalesce=True
+    )
+
+    started = time.perf_counter()
+    await telegram.bot.initialize()
+    scheduler.start()
+    try:
+        await done.wait()
+    finally:
+        scheduler.shutdown(wait=False)
+        await telegram.bot.shutdown()
+        api.stop()
+    elapsed = time.perf_counter() - started
+
+    tomorrow = (date.today() + timedelta(days=1)).isoformat()
+    sent, pending = reminder_state(db_path, chat_ids, tomorrow)
+    db.close()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    received = received_reminders(api.messages)
+    duplicates = sum(count - 1 for count in received.values() if count > 1)
+    lost = sent - set(received)
+    busy = sum(latencies)
+
+    print()
+    print(f"Циклов: {len(latencies)} за {elapsed:.1f} с")
+    print(f"Длительность цикла, с: p50 {percentile(latencies, 0.5):.2f}  "
+          f"p95 {percentile(latencies, 0.95):.2f}  p99 {percentile(latencies, 0.99):.2f}  "
+          f"max {max(latencies):.2f}")
+    print(f"Запросов к API: {api.stats['requests']}, принято сообщений: {api.stats['delivered']}, "
+          f"429: {api.stats['rate_limited']}, 5xx: {api.stats['server_errors']}, "
+          f"обрывов до обработки: {api.stats['dropped']}, после: {api.stats['ghosted']}")
+    print(f"Доставлено сообщений в секунду: {api.stats['delivered'] / elapsed:.1f} "
+          f"(в секунду работы циклов: {api.stats['delivered'] / busy if busy else 0:.1f})")
+    print(f"Напоминаний получено: {len(received)}, дублей: {duplicates}, "
+          f"потеряно: {len(lost)}, ждут повтора: {len(pending - set(received))}")
+    return 1 if lost else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--cycles', type=int, default=10)
+    parser.add_argument('--interval', type=float, default=1.0, help='секунд между циклами')
+    parser.add_argument('--tabs', type=int, default=5)
+    parser.add_argument('--rows', type=int, default=1000, help='строк на лист')
+    parser.add_argument('--recruiters', type=int, default=40)
+    parser.add_argument('--spread-days', type=int, default=7,
+                        help='разброс дат выхода вокруг сегодня; меньше - больше напоминаний')
+    parser.add_argument('--changes', type=int, default=50, help='правок таблицы между циклами')
+    parser.add_argument('--mode', choices=('candidate', 'digest'), default='candidate')
+    parser.add_argument('--latency', type=float, default=0.0, help='задержка ответа API, с')
+    parser.add_argument('--jitter', type=float, default=0.0, help='случайная добавка к задержке, с')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='доля ответов 500')
+    parser.add_argument('--drop-rate', type=float, default=0.0,
+                        help='доля соединений, оборванных до обработки')
+    parser.add_argument('--ghost-rate', type=float, default=0.0,
+                        help='доля соединений, оборванных после приёма сообщения')
+    parser.add_argument('--server-rate', type=float, default=None,
+                        help='лимит сервера, сообщений в секунду (сверх - 429)')
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--global-rate', type=float, default=1000.0, help='лимит бота, сообщений в секунду')
+    parser.add_argument('--per-chat-rate', type=float, default=1000.0, help='лимит бота на чат')
+    parser.add_argument('--pool-size', type=int, default=256, help='соединений в пуле HTTP-клиента')
+    parser.add_argument('--max-attempts', type=int, default=5)
+    parser.add_argument('--retry-base-delay', type=float, default=0.05)
+    parser.add_argument('--outbox-retry-base', type=float, default=0.1,
+                        help='пауза перед повтором сообщения из очереди, с')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--verbose', action='store_true', help='не глушить логи бота')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if not args.verbose:
+        logging.disable(logging.ERROR)
+    raise SystemExit(asyncio.run(soak(args)))
+
+
+if __name__ == '__main__':
+    main()
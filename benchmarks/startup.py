@@ -0,0 +1,174 @@
+"""Время холодного запуска: импорт main, создание CandidateBot и клиента Sheets.
+
+Каждый замер идёт в новом интерпретаторе, иначе модули уже лежат в
+sys.modules и импорт ничего не стоит. Этапы:
+    interpreter    - python -c pass (нижняя граница, для сравнения)
+    import_main    - import main
+    construct_bot  - CandidateBot() с источником google по умолчанию и
+                     временной базой (после import main, без сети)
+    sheets_client  - импорт googleapiclient и сборка клиента Sheets из
+                     вшитого discovery-документа (то, что раньше делал
+                     конструктор бота)
+Для каждого этапа печатается лучшее время из --repeat прогонов и пиковый
+RSS процесса, затем - самые дорогие пакеты по python -X importtime.
+
+Запуск из корня репозитория:
+    python -m benchmarks.startup
+    python -m benchmarks.startup --repeat 10 --top 20
+    python -m benchmarks.startup --save-baseline   # записать текущие числа как эталон
+
+Код возврата 1, если этап медленнее эталона больше чем на --tolerance.
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'startup_baseline.json')
+STAGES = ('interpreter', 'import_main', 'construct_bot', 'sheets_client')
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def peak_rss_mb():
+    # ru_maxrss - в КБ на Linux и в байтах на macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def child(stage):
+    """Один замер в текущем (свежем) процессе; печатает результат одной строкой JSON"""
+    workdir = tempfile.mkdtemp(prefix='candidate-startup-')
+    try:
+        if stage == 'import_main':
+            started = time.perf_counter()
+            import main  # noqa: F401
+            elapsed = time.perf_counter() - started
+        elif stage == 'construct_bot':
+            from main import CandidateBot
+            from database import Database
+            started = time.perf_counter()
+            bot = CandidateBot(database=Database(os.path.join(workdir, 'startup.db')))
+            elapsed = time.perf_counter() - started
+            bot.db.close()
+        elif stage == 'sheets_client':
+            started = time.perf_counter()
+            from google.auth.credentials import AnonymousCredentials
+            from google_sheets import _build_client
+            _build_client('sheets', 'v4', AnonymousCredentials())
+            elapsed = time.perf_counter() - started
+        else:
+            raise ValueError(f"Неизвестный этап: {stage}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(json.dumps({'seconds': elapsed, 'peak_mb': peak_rss_mb()}))
+
+
+def child_env():
+    env = dict(os.environ)
+    # Конструктор бота читает настройки, но в сеть не ходит: хватает заглушек
+    env.setdefault('TELEGRAM_BOT_TOKEN', '1:startup-benchmark')
+    env['SHEET_SOURCE'] = 'google'
+    env['METRICS_PORT'] = '0'
+    return env
+
+
+def measure(stage, repeat):
+    """Лучшее время этапа из repeat свежих процессов"""
+    best = None
+    for _ in range(max(1, repeat)):
+        if stage == 'interpreter':
+            started = time.perf_counter()
+            subprocess.run([sys.executable, '-c', 'pass'], check=True)
+            result = {'seconds': time.perf_counter() - started, 'peak_mb': 0.0}
+        else:
+            output = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.startup', '--child', stage],
+                cwd=ROOT, env=child_env(), check=True, capture_output=True, text=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+        if best is None or result['seconds'] < best['seconds']:
+            best = result
+    return {'seconds': round(best['seconds'], 6), 'peak_mb': round(best['peak_mb'], 3)}
+
+
+def import_times(statement):
+    """Собственное время импорта по пакетам верхнего уровня (python -X importtime), в секундах.
+
+    Суммируется self-время всех модулей пакета: накопленное время верхнего
+    уровня целиком уходит в main и не показывает, что именно дорого.
+    """
+    stderr = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        cwd=ROOT, env=child_env(), check=True, capture_output=True, text=True
+    ).stderr
+    totals = {}
+    for line in stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:'):
+            continue
+        own, _, name = line[len('import time:'):].split('|', 2)
+        if not own.strip().isdigit():
+            continue
+        package = name.strip().split('.')[0]
+        totals[package] = totals.get(package, 0.0) + int(own) / 1_000_000
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES))
+    parser.add_argument('--repeat', type=int, default=5, help='процессов на этап (берётся лучший)')
+    parser.add_argument('--top', type=int, default=12, help='сколько пакетов показать из -X importtime')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='дописать текущие результаты в файл эталона')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='допустимое ухудшение относительно эталона (0.5 = 50%%)')
+    parser.add_argument('--child', choices=STAGES[1:], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child)
+        return
+
+    # Не на уровне модуля: suite импортирует main, а дочерний процесс должен начинать с нуля
+    from benchmarks.suite import load_baseline, save_baseline, compare
+
+    reference = load_baseline(args.baseline)
+    results = {}
+    regressions = []
+
+    print(f"{'этап':<15} {'время, с':>10} {'пик RSS, МБ':>12}")
+    for stage in args.stages:
+        result = measure(stage, args.repeat)
+        results[stage] = result
+        verdict, regressed = compare(result, reference.get(stage), args.tolerance)
+        if regressed:
+            regressions.append(stage)
+        print(f"{stage:<15} {result['seconds']:>10.4f} {result['peak_mb']:>12.1f}  {verdict}")
+
+    if args.top > 0:
+        print(f"\nimport main, топ-{args.top} пакетов по собственному времени импорта (-X importtime):")
+        for name, seconds in import_times('import main')[:args.top]:
+            print(f"  {seconds * 1000:8.1f} мс  {name}")
+
+    if args.save_baseline:
+        merged = dict(reference)
+        merged.update(results)
+        save_baseline(args.baseline, merged)
+        print(f"Эталон записан: {args.baseline}")
+    elif not reference:
+        print(f"Эталона нет ({args.baseline}); запустите с --save-baseline")
+
+    if regressions:
+        print(f"Регрессии: {', '.join(regressions)}")
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
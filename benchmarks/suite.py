@@ -0,0 +1,323 @@
+"""Бенчмарки горячих путей синхронизации и напоминаний.
+
+Меряет разбор строк, нормализацию дат, запись в базу (старый путь
+exists + add против пакетного upsert), выборку напоминаний (полный скан
+с _should_send_reminder против get_due_reminders) и полный цикл
+check_candidates на синтетической таблице с заглушкой Telegram. Для
+каждого этапа печатает время, пропускную способность и пиковую память
+и сравнивает их с эталоном из baseline.json.
+
+Запуск из корня репозитория:
+    python -m benchmarks.suite                         # 1k, 10k и 100k строк
+    python -m benchmarks.suite --sizes 1000 10000 --stages parse dates
+    python -m benchmarks.suite --save-baseline         # записать текущие числа как эталон
+
+Код возврата 1, если какой-то этап медленнее или прожорливее эталона
+больше чем на --tolerance.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import os
+import platform
+import shutil
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from config import COLUMNS, SYNC_BATCH_SIZE
+from database import Database
+from dates import normalize_date, clear_date_cache
+from main import CandidateBot
+from sheet_source import SyntheticSheetSource
+from telegram_bot import TelegramBot, RateLimiter
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+DEFAULT_SIZES = (1000, 10000, 100000)
+SHEET = 'Лист 1'
+# Разница меньше этих порогов считается шумом, даже если в процентах она велика
+MIN_TIME_DELTA = 0.02
+MIN_MEMORY_DELTA_MB = 0.1
+
+
+class StubBot:
+    """Заглушка telegram.Bot: сообщения никуда не уходят"""
+
+    def __init__(self):
+        self.sent = 0
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        self.sent += 1
+
+    async def get_me(self):
+        return None
+
+
+def stub_telegram(database):
+    """Настоящий TelegramBot (форматирование, повторы, отправка пачками) без сети и лимитов"""
+    bot = TelegramBot(token='0:benchmark', database=database)
+    bot.bot = StubBot()
+    bot.rate_limiter = RateLimiter(global_rate=1e9, per_chat_rate=1e9)
+    return bot
+
+
+class Workdir:
+    """Временная папка под базы данных одного прогона"""
+
+    def __init__(self):
+        self.path = tempfile.mkdtemp(prefix='candidate-bench-')
+        self._count = 0
+        self._databases = []
+
+    def database(self):
+        self._count += 1
+        db = Database(os.path.join(self.path, f"bench-{self._count}.db"))
+        self._databases.append(db)
+        return db
+
+    def cleanup(self):
+        for db in self._databases:
+            db.close()
+        self._databases = []
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+def sheet_values(size):
+    """Строки одного синтетического листа в виде ответа Sheets API"""
+    source = SyntheticSheetSource(tabs=1, rows=size)
+    return source, [row for _, row in source._iter_rows(SHEET)]
+
+
+def parsed_candidates(size):
+    source, values = sheet_values(size)
+    return source._parse_rows(SHEET, values)
+
+
+def register_recruiters(db, source):
+    """Зарегистрировать всех рекрутеров синтетической таблицы, чтобы напоминания уходили"""
+    for number, name in enumerate(source.recruiter_names, 1):
+        db.add_recruiter(str(100000 + number), name)
+
+
+# Каждый этап готовит данные (это не меряется) и возвращает (функция, число элементов)
+
+def stage_parse(size, workdir):
+    source, values = sheet_values(size)
+    return (lambda: source._parse_rows(SHEET, values)), len(values)
+
+
+def stage_dates(size, workdir):
+    _, values = sheet_values(size)
+    index = COLUMNS['start_date']
+    raw = [row[index] if len(row) > index else '' for row in values]
+
+    def run():
+        # Холодный кэш: меряем разбор, а не только попадания в lru_cache
+        clear_date_cache()
+        for value in raw:
+            normalize_date(value)
+    return run, len(raw)
+
+
+def stage_db_insert_exists(size, workdir):
+    candidates = parsed_candidates(size)
+    db = workdir.database()
+
+    def run():
+        for c in candidates:
+            if not db.candidate_exists(c.id):
+                db.add_candidate(c.id, c.name, c.object, c.start_date, c.recruiter_id, c.sheet)
+    return run, len(candidates)
+
+
+def stage_db_upsert(size, workdir):
+    candidates = parsed_candidates(size)
+    db = workdir.database()
+
+    def run():
+        for start in range(0, len(candidates), SYNC_BATCH_SIZE):
+            db.upsert_candidates(candidates[start:start + SYNC_BATCH_SIZE])
+    return run, len(candidates)
+
+
+def _reminder_bot(size, workdir):
+    candidates = parsed_candidates(size)
+    db = workdir.database()
+    db.upsert_candidates(candidates)
+    source = SyntheticSheetSource(tabs=1, rows=size)
+    return CandidateBot(sheet_source=source, telegram_bot=stub_telegram(db), database=db), len(candidates)
+
+
+def stage_reminders_scan(size, workdir):
+    bot, count = _reminder_bot(size, workdir)
+
+    def run():
+        return [row for row in bot.db.get_candidates_for_reminder() if bot._should_send_reminder(row[3])]
+    return run, count
+
+
+def stage_reminders_due(size, workdir):
+    bot, count = _reminder_bot(size, workdir)
+    tomorrow = (date.today() + timedelta(days=1)).isoformat()
+    return (lambda: bot.db.get_due_reminders(tomorrow)), count
+
+
+def _cycle_bot(size, workdir):
+    source = SyntheticSheetSource(tabs=10, rows=max(1, size // 10))
+    db = workdir.database()
+    register_recruiters(db, source)
+    return CandidateBot(sheet_source=source, telegram_bot=stub_telegram(db), database=db)
+
+
+def stage_cycle_cold(size, workdir):
+    """Первый цикл: все строки новые, уходят напоминания на завтра"""
+    bot = _cycle_bot(size, workdir)
+    return (lambda: asyncio.run(bot.check_candidates())), size
+
+
+def stage_cycle_warm(size, workdir):
+    """Повторный цикл после правки 20 строк таблицы"""
+    bot = _cycle_bot(size, workdir)
+    asyncio.run(bot.check_candidates())
+    bot.sheets_api.advance(20)
+    return (lambda: asyncio.run(bot.check_candidates())), size
+
+
+STAGES = {
+    'parse': stage_parse,
+    'dates': stage_dates,
+    'db_insert_exists': stage_db_insert_exists,
+    'db_upsert': stage_db_upsert,
+    'reminders_scan': stage_reminders_scan,
+    'reminders_due': stage_reminders_due,
+    'cycle_cold': stage_cycle_cold,
+    'cycle_warm': stage_cycle_warm,
+}
+
+
+def measure(stage, size, repeat):
+    """Лучшее время из repeat прогонов и пиковая память отдельного прогона.
+
+    Данные готовятся заново перед каждым прогоном: этапы с базой меняют её.
+    Память меряется отдельно, потому что tracemalloc сильно замедляет выделения.
+    """
+    setup = STAGES[stage]
+    best = None
+    items = 0
+    for _ in range(max(1, repeat)):
+        workdir = Workdir()
+        try:
+            run, items = setup(size, workdir)
+            gc.collect()
+            started = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - started
+        finally:
+            workdir.cleanup()
+        best = elapsed if best is None else min(best, elapsed)
+
+    workdir = Workdir()
+    try:
+        run, items = setup(size, workdir)
+        gc.collect()
+        tracemalloc.start()
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        workdir.cleanup()
+
+    return {
+        'items': items,
+        'seconds': round(best, 6),
+        'per_second': round(items / best, 1) if best else None,
+        'peak_mb': round(peak / 1024 / 1024, 3),
+    }
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f).get('results', {})
+
+
+def save_baseline(path, results):
+    data = {
+        'meta': {
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'created': date.today().isoformat(),
+        },
+        'results': results,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def compare(current, reference, tolerance):
+    """Отношения к эталону и признак регрессии по времени и памяти"""
+    if not reference:
+        return '', False
+    time_ratio = current['seconds'] / reference['seconds'] if reference['seconds'] else 1.0
+    memory_ratio = current['peak_mb'] / reference['peak_mb'] if reference['peak_mb'] else 1.0
+    slower = (time_ratio > 1 + tolerance
+              and current['seconds'] - reference['seconds'] > MIN_TIME_DELTA)
+    bigger = (memory_ratio > 1 + tolerance
+              and current['peak_mb'] - reference['peak_mb'] > MIN_MEMORY_DELTA_MB)
+    regressed = slower or bigger
+    mark = '  ⚠️ регрессия' if regressed else ''
+    return f"время x{time_ratio:5.2f}  память x{memory_ratio:5.2f}{mark}", regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES))
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES))
+    parser.add_argument('--repeat', type=int, default=3, help='прогонов на замер времени (берётся лучший)')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='дописать текущие результаты в файл эталона')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='допустимое ухудшение относительно эталона (0.5 = 50%%)')
+    args = parser.parse_args()
+
+    # Построчные логи и предупреждения о датах не должны попадать в замеры вывода
+    logging.disable(logging.WARNING)
+
+    reference = load_baseline(args.baseline)
+    results = {}
+    regressions = []
+
+    print(f"{'этап':<18} {'строк':>7} {'время, с':>10} {'в секунду':>12} {'пик, МБ':>9}")
+    for size in args.sizes:
+        for stage in args.stages:
+            key = f"{stage}/{size}"
+            result = measure(stage, size, args.repeat)
+            results[key] = result
+            verdict, regressed = compare(result, reference.get(key), args.tolerance)
+            if regressed:
+                regressions.append(key)
+            per_second = f"{result['per_second']:,.0f}".replace(',', ' ') if result['per_second'] else '-'
+            print(f"{stage:<18} {size:>7} {result['seconds']:>10.4f} {per_second:>12} "
+                  f"{result['peak_mb']:>9.2f}  {verdict}")
+
+    if args.save_baseline:
+        merged = dict(reference)
+        merged.update(results)
+        save_baseline(args.baseline, merged)
+        print(f"Эталон записан: {args.baseline}")
+    elif not reference:
+        print(f"Эталона нет ({args.baseline}); запустите с --save-baseline")
+
+    if regressions:
+        print(f"Регрессии: {', '.join(regressions)}")
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""Проверка и замер приёмника webhook (webhook.WebhookServer) без сети.
+
+Сервер поднимается на 127.0.0.1 с port=0 поверх настоящего
+telegram.ext.Application, в котором вместо обработчиков бота стоит
+TypeHandler, записывающий полученные обновления; getMe при initialize()
+отвечает локальная подмена Bot API (benchmarks.fake_bot_api). Проверяется, что:
+    - запрос с неверным X-Telegram-Bot-Api-Secret-Token получает 403
+      и до приложения не доходит;
+    - запрос с верным секретом получает 200;
+    - обновление с тем же update_id доходит до приложения.
+Затем --requests обновлений отправляются по --clients соединений
+одновременно: печатаются запросы в секунду и перцентили задержки.
+
+Запуск из корня репозитория:
+    python -m benchmarks.webhook
+    python -m benchmarks.webhook --requests 2000 --clients 32 --concurrency 8
+
+Код возврата 1, если какая-то проверка не прошла.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from telegram import Bot, Update
+from telegram.ext import Application, TypeHandler
+
+from benchmarks.fake_bot_api import FakeBotAPI
+from webhook import WebhookServer
+
+SECRET = 'webhook-benchmark-secret'
+PATH = '/telegram'
+
+
+def make_update(update_id, chat_id=501):
+    """Минимальное обновление Telegram с текстовым сообщением"""
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': 'Webhook'},
+            'text': 'Иванов',
+        },
+    }
+
+
+async def post(port, body, secret):
+    """POST обновления на приёмник. Возвращает HTTP-статус ответа"""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        data = json.dumps(body).encode('utf-8')
+        head = (
+            f"POST {PATH} HTTP/1.1\r\nHost: 127.0.0.1\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+        )
+        if secret is not None:
+            head += f"X-Telegram-Bot-Api-Secret-Token: {secret}\r\n"
+        writer.write(head.encode('latin-1') + b"\r\n" + data)
+        await writer.drain()
+        status_line = await reader.readline()
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def run(requests, clients, concurrency):
+    received = []
+
+    async def record(update, context):
+        received.append(update.update_id)
+
+    api = FakeBotAPI().start()
+    app = Application.builder().bot(Bot('1:webhook-benchmark', base_url=api.base_url)).build()
+    app.add_handler(TypeHandler(Update, record))
+    await app.initialize()
+    server = await WebhookServer(app, SECRET, port=0, path=PATH, concurrency=concurrency).start()
+    failures = []
+
+    def check(ok, description):
+        print(f"  {'✓' if ok else '✗'} {description}")
+        if not ok:
+            failures.append(description)
+
+    try:
+        print(f"Приёмник на 127.0.0.1:{server.port}{PATH}")
+        status = await post(server.port, make_update(1), 'wrong-secret')
+        check(status == 403, f"неверный секрет -> 403 (получено {status})")
+        check(1 not in received, "обновление с неверным секретом не дошло до приложения")
+
+        status = await post(server.port, make_update(2), SECRET)
+        check(status == 200, f"верный секрет -> 200 (получено {status})")
+        check(received == [2], f"обновление 2 дошло до приложения (получено {received})")
+
+        if requests > 0:
+            received.clear()
+            latencies = []
+            pending = iter(range(1000, 1000 + requests))
+
+            async def client():
+                for update_id in pending:
+                    started = time.perf_counter()
+                    if await post(server.port, make_update(update_id), SECRET) != 200:
+                        failures.append(f"обновление {update_id}: ответ не 200")
+                    latencies.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(client() for _ in range(max(1, clients))))
+            elapsed = time.perf_counter() - started
+            check(sorted(received) == list(range(1000, 1000 + requests)),
+                  f"все {requests} обновлений дошли до приложения (дошло {len(received)})")
+            print(f"\n{requests} запросов по {clients} соединений за {elapsed:.2f} с: "
+                  f"{requests / elapsed:,.0f} в секунду".replace(',', ' '))
+            print(f"задержка p50 {percentile(latencies, 0.5) * 1000:.1f} мс, "
+                  f"p95 {percentile(latencies, 0.95) * 1000:.1f} мс, "
+                  f"p99 {percentile(latencies, 0.99) * 1000:.1f} мс")
+    finally:
+        await server.stop()
+        await app.shutdown()
+        api.stop()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=500, help='обновлений в замере (0 - только проверки)')
+    parser.add_argument('--clients', type=int, default=16, help='одновременных соединений')
+    parser.add_argument('--concurrency', type=int, default=8, help='TELEGRAM_WEBHOOK_CONCURRENCY приёмника')
+    args = parser.parse_args()
+
+    failures = asyncio.run(run(args.requests, args.clients, args.concurrency))
+    if failures:
+        print(f"Не прошло проверок: {len(failures)}")
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
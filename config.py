@@ -6,18 +6,126 @@ load_dotenv()
 # Google Sheets
 _raw_sheets_id = os.getenv('GOOGLE_SHEETS_ID', '1jXV_w8PZ3cBAvJHYF5YgIph__O_5qXAxZW_rYOwvvvc')
 GOOGLE_SHEETS_ID = _raw_sheets_id.strip()
+# Несколько таблиц (через запятую), например по одной на бизнес-юнит; по умолчанию - GOOGLE_SHEETS_ID.
+# Первая таблица списка при обновлении забирает кандидатов, загруженных до появления этой настройки
+GOOGLE_SHEETS_IDS = [
+    sheet_id.strip() for sheet_id in os.getenv('GOOGLE_SHEETS_IDS', '').split(',') if sheet_id.strip()
+] or [GOOGLE_SHEETS_ID]
+# Сколько таблиц читать и разбирать одновременно
+SHEETS_WORKERS = max(1, int(os.getenv('SHEETS_WORKERS', 4)))
 GOOGLE_CREDENTIALS_FILE = os.getenv('GOOGLE_CREDENTIALS_FILE', 'credentials.json')
+# Режим чтения листов: batch - все листы одним values.batchGet, sheet - по одному запросу на лист,
+# stream - каждый лист окнами по SHEETS_STREAM_WINDOW строк с потоковой записью в базу
+SHEETS_FETCH_MODE = os.getenv('SHEETS_FETCH_MODE', 'batch').strip().lower()
+SHEETS_STREAM_WINDOW = int(os.getenv('SHEETS_STREAM_WINDOW', 5000))
+# Пропуск неизменившихся листов: ревизия таблицы из Drive API (нужен включённый Drive API
+# и доступ drive.metadata.readonly) и контрольная сумма значений каждого листа
+SHEETS_REVISION_PROBE = os.getenv('SHEETS_REVISION_PROBE', '0').strip().lower() in ('1', 'true', 'yes')
+# Всегда читать и разбирать все листы, не глядя на сохранённые отпечатки
+SHEETS_FORCE_FULL_SYNC = os.getenv('SHEETS_FORCE_FULL_SYNC', '0').strip().lower() in ('1', 'true', 'yes')
+# Максимум диапазонов в одном batchGet запросе
+SHEETS_BATCH_SIZE = int(os.getenv('SHEETS_BATCH_SIZE', 100))
+# Время жизни кэша списка листов (секунды)
+SHEETS_METADATA_TTL_SECONDS = int(os.getenv('SHEETS_METADATA_TTL_SECONDS', 3600))
+
+# Источник листов: google - Google Sheets, local - CSV/XLSX из LOCAL_SHEETS_PATH,
+# synthetic - сгенерированные SYNTHETIC_TABS листов по SYNTHETIC_ROWS строк
+SHEET_SOURCE = os.getenv('SHEET_SOURCE', 'google').strip().lower()
+LOCAL_SHEETS_PATH = os.getenv('LOCAL_SHEETS_PATH', 'sheets')
+SYNTHETIC_TABS = int(os.getenv('SYNTHETIC_TABS', 10))
+SYNTHETIC_ROWS = int(os.getenv('SYNTHETIC_ROWS', 1000))
+SYNTHETIC_SEED = int(os.getenv('SYNTHETIC_SEED', 1))
 
 # Telegram
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 TELEGRAM_RECRUITER_CHAT_ID = os.getenv('TELEGRAM_RECRUITER_CHAT_ID')
+# Лимиты отправки: Telegram допускает ~30 сообщений в секунду на бота
+# и ~1 сообщение в секунду в один чат
+TELEGRAM_GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE', 25))
+TELEGRAM_PER_CHAT_RATE = float(os.getenv('TELEGRAM_PER_CHAT_RATE', 1))
+TELEGRAM_SEND_CONCURRENCY = int(os.getenv('TELEGRAM_SEND_CONCURRENCY', 8))
+TELEGRAM_SEND_MAX_ATTEMPTS = int(os.getenv('TELEGRAM_SEND_MAX_ATTEMPTS', 5))
+# Базовая задержка экспоненциального повтора при сетевых ошибках (сек)
+TELEGRAM_RETRY_BASE_DELAY = float(os.getenv('TELEGRAM_RETRY_BASE_DELAY', 1))
+# Чаты администраторов (через запятую): им доступны служебные команды вроде /stats
+TELEGRAM_ADMIN_CHAT_IDS = {
+    chat_id.strip() for chat_id in os.getenv('TELEGRAM_ADMIN_CHAT_IDS', '').split(',') if chat_id.strip()
+}
+# Кнопок с именами на одной странице выбора рекрутера в /start
+TELEGRAM_PICKER_PAGE_SIZE = max(1, int(os.getenv('TELEGRAM_PICKER_PAGE_SIZE', 8)))
+# Получение обновлений: polling (long polling) или webhook (встроенный HTTP-приёмник).
+# Для webhook нужен публичный HTTPS-адрес TELEGRAM_WEBHOOK_URL (обычно обратный прокси перед
+# TELEGRAM_WEBHOOK_HOST:TELEGRAM_WEBHOOK_PORT). Каждой реплике на одном хосте - свой порт
+TELEGRAM_UPDATE_MODE = os.getenv('TELEGRAM_UPDATE_MODE', 'polling').strip().lower()
+TELEGRAM_WEBHOOK_URL = os.getenv('TELEGRAM_WEBHOOK_URL', '').strip()
+TELEGRAM_WEBHOOK_HOST = os.getenv('TELEGRAM_WEBHOOK_HOST', '0.0.0.0')
+TELEGRAM_WEBHOOK_PORT = int(os.getenv('TELEGRAM_WEBHOOK_PORT', 8080))
+# Секрет заголовка X-Telegram-Bot-Api-Secret-Token (A-Z, a-z, 0-9, _ и -);
+# пусто - случайный при каждом запуске
+TELEGRAM_WEBHOOK_SECRET = os.getenv('TELEGRAM_WEBHOOK_SECRET', '').strip()
+# Сколько обновлений обрабатывается одновременно (это же max_connections для Telegram, до 100)
+TELEGRAM_WEBHOOK_CONCURRENCY = min(100, max(1, int(os.getenv('TELEGRAM_WEBHOOK_CONCURRENCY', 8))))
+# Переходить на polling, если webhook не включился. По умолчанию выключено: polling снимает
+# webhook, через который получают обновления остальные реплики
+TELEGRAM_WEBHOOK_POLLING_FALLBACK = os.getenv('TELEGRAM_WEBHOOK_POLLING_FALLBACK', '0').strip().lower() in ('1', 'true', 'yes')
+
+# Напоминания: candidate - отдельное сообщение на каждого кандидата,
+# digest - одно сводное сообщение на рекрутера
+REMINDER_MODE = os.getenv('REMINDER_MODE', 'candidate').strip().lower()
+# Во сколько (ЧЧ:ММ, местное время) накануне выхода отправлять напоминание
+REMINDER_SEND_TIME = os.getenv('REMINDER_SEND_TIME', '09:00')
+# Очередь напоминаний (reminder_outbox): сколько сообщений забирать на отправку за раз,
+# сколько раз пробовать доставить и экспоненциальная пауза между попытками (сек)
+REMINDER_OUTBOX_BATCH_SIZE = max(1, int(os.getenv('REMINDER_OUTBOX_BATCH_SIZE', 100)))
+REMINDER_MAX_ATTEMPTS = max(1, int(os.getenv('REMINDER_MAX_ATTEMPTS', 6)))
+REMINDER_RETRY_BASE_SECONDS = float(os.getenv('REMINDER_RETRY_BASE_SECONDS', 60))
+REMINDER_RETRY_MAX_SECONDS = float(os.getenv('REMINDER_RETRY_MAX_SECONDS', 3600))
+# Как часто проверять очередь на сообщения, у которых подошло время повтора (сек)
+REMINDER_OUTBOX_POLL_SECONDS = int(os.getenv('REMINDER_OUTBOX_POLL_SECONDS', 60))
 
 # Database
 DATABASE_PATH = os.getenv('DATABASE_PATH', 'candidates.db')
+# Настройки SQLite: ожидание блокировки (сек), размер кэша страниц (КБ),
+# размер mmap (байт), число подготовленных запросов в кэше соединения
+SQLITE_BUSY_TIMEOUT = float(os.getenv('SQLITE_BUSY_TIMEOUT', 10))
+SQLITE_CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', 16384))
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', 64 * 1024 * 1024))
+SQLITE_STATEMENT_CACHE = int(os.getenv('SQLITE_STATEMENT_CACHE', 256))
+
+# Логи: уровень и выборка построчных DEBUG-записей (каждая N-я строка листа, кандидат
+# синхронизации или напоминания; 1 - все). На INFO пишутся только сводки по листам и циклам
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').strip().upper()
+LOG_ROW_SAMPLE_EVERY = max(1, int(os.getenv('LOG_ROW_SAMPLE_EVERY', 1)))
+
+# Метрики в формате Prometheus: http://METRICS_HOST:METRICS_PORT/metrics (0 - выключено)
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', 0))
+
+# Профилирование циклов (cProfile + tracemalloc): отчёты пишутся в PROFILE_DIR.
+# PROFILE_CYCLES - сколько первых циклов профилировать после запуска (0 - только по /profile),
+# PROFILE_SLOW_CYCLE_SECONDS - цикл дольше порога взводит профилирование следующего (0 - выключено)
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+PROFILE_CYCLES = int(os.getenv('PROFILE_CYCLES', 0))
+PROFILE_SLOW_CYCLE_SECONDS = float(os.getenv('PROFILE_SLOW_CYCLE_SECONDS', 0))
+PROFILE_TOP_N = int(os.getenv('PROFILE_TOP_N', 25))
 
 # Schedule
 CHECK_INTERVAL_HOURS = int(os.getenv('CHECK_INTERVAL_HOURS', 1))
 
+# Несколько реплик с общей базой: цикл таблицы и рассылку напоминаний ведёт только
+# держатель аренды (таблица leases). Аренда продлевается каждые LEASE_TTL_SECONDS / 3 сек;
+# если держатель пропал, её забирает другая реплика. REPLICA_ID - имя реплики в leases
+# (по умолчанию хост:pid). Только реплики на одном хосте: блокировки SQLite в режиме WAL
+# не работают на сетевых дисках
+LEASE_TTL_SECONDS = max(3, int(os.getenv('LEASE_TTL_SECONDS', 120)))
+REPLICA_ID = os.getenv('REPLICA_ID', '').strip()
+
+# Сколько изменённых строк записывать в базу одной транзакцией при синхронизации
+SYNC_BATCH_SIZE = int(os.getenv('SYNC_BATCH_SIZE', 1000))
+
+# Размер кэша разобранных дат (уникальных строк)
+DATE_CACHE_SIZE = int(os.getenv('DATE_CACHE_SIZE', 4096))
+
 # Google Sheets columns (0-indexed)
 COLUMNS = {
     'name': 0,           # Колонка A - ФИО кандидата
@@ -1,17 +1,127 @@
 import sqlite3
-from datetime import datetime
+import hashlib
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 import os
-from config import DATABASE_PATH
+import logging
+from config import (
+    DATABASE_PATH, SQLITE_BUSY_TIMEOUT, SQLITE_CACHE_SIZE_KB,
+    SQLITE_MMAP_SIZE, SQLITE_STATEMENT_CACHE
+)
+from sync import row_identity, candidate_key, content_hash
+from metrics import timed, DB_SECONDS, DB_FAILURES
+
+logger = logging.getLogger(__name__)
+
+# Значения candidates.reminder_sent
+REMINDER_PENDING = 0
+REMINDER_SENT = 1
+REMINDER_EXPIRED = 2  # дата выхода прошла, а напоминание так и не ушло
+REMINDER_QUEUED = 3   # напоминание стоит в reminder_outbox
+REMINDER_FAILED = 4   # доставка не удалась окончательно
+
+# Статусы сообщений reminder_outbox
+OUTBOX_PENDING = 'pending'
+OUTBOX_IN_FLIGHT = 'in_flight'  # забрано на отправку, результат ещё не записан
+OUTBOX_SENT = 'sent'
+OUTBOX_FAILED = 'failed'
+OUTBOX_EXPIRED = 'expired'
+OUTBOX_CANCELLED = 'cancelled'  # кандидата удалили или перенесли дату до отправки
+
+# Состояние кандидатов, чьё сообщение уже есть в очереди под тем же ключом
+_OUTBOX_CANDIDATE_STATE = {
+    OUTBOX_PENDING: REMINDER_QUEUED,
+    OUTBOX_IN_FLIGHT: REMINDER_QUEUED,
+    OUTBOX_SENT: REMINDER_SENT,
+    OUTBOX_FAILED: REMINDER_FAILED,
+    OUTBOX_EXPIRED: REMINDER_EXPIRED,
+}
+
+
+def outbox_key(chat_id, start_date, candidate_ids):
+    """Ключ идемпотентности сообщения: одно и то же напоминание не попадёт в очередь дважды"""
+    raw = '\x1f'.join([str(chat_id), start_date] + sorted(candidate_ids))
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
 
 class Database:
     def __init__(self, db_path=DATABASE_PATH):
         self.db_path = db_path
+        # Одно долгоживущее соединение на поток: scheduler и обработчики Telegram
+        # не делят соединение и не платят за его открытие на каждый запрос
+        self._connections = {}
+        self._lock = threading.Lock()
+        # Кэши справочника рекрутеров: активные (id, имя) и имя -> chat_id.
+        # Перечитываются из базы только после изменений (None - не загружен)
+        self._recruiter_directory = None
+        self._chat_ids = None
+        # PRAGMA data_version, последний раз прочитанная каждым соединением
+        self._data_versions = {}
         self.init_db()
     
+    def _connection(self):
+        """Получить соединение текущего потока (создаётся при первом обращении)"""
+        conn = self._connections.get(threading.get_ident())
+        if conn is None:
+            conn = sqlite3.connect(
+                self.db_path,
+                timeout=SQLITE_BUSY_TIMEOUT,
+                isolation_level=None,  # транзакции открываются явно в _transaction()
+                check_same_thread=False,  # только чтобы close() мог закрыть чужие соединения
+                cached_statements=SQLITE_STATEMENT_CACHE
+            )
+            # WAL: читатели не блокируются писателем
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(f'PRAGMA mmap_size={int(SQLITE_MMAP_SIZE)}')
+            conn.execute(f'PRAGMA cache_size={-int(SQLITE_CACHE_SIZE_KB)}')
+            conn.execute('PRAGMA temp_store=MEMORY')
+            with self._lock:
+                self._connections[threading.get_ident()] = conn
+        return conn
+    
+    @contextmanager
+    def _cursor(self):
+        """Курсор для чтения вне транзакции"""
+        cursor = self._connection().cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+    
+    @contextmanager
+    def _transaction(self):
+        """Курсор внутри транзакции: COMMIT при успехе, ROLLBACK при исключении"""
+        conn = self._connection()
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            yield cursor
+        except BaseException:
+            if conn.in_transaction:
+                cursor.execute('ROLLBACK')
+            raise
+        else:
+            cursor.execute('COMMIT')
+        finally:
+            cursor.close()
+    
+    def close(self):
+        """Закрыть все открытые соединения"""
+        with self._lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+        self._data_versions.clear()
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                logger.warning(f"⚠️ Ошибка при закрытии соединения с базой: {e}")
+    
     def init_db(self):
         """Инициализация базы данных"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
+        with self._transaction() as cursor:
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS candidates (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -34,85 +144,625 @@ class Database:
                     created_at TEXT
                 )
             ''')
-            conn.commit()
+            # Поиск chat_id по имени при рассылке напоминаний
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_recruiters_name ON recruiters(recruiter_name)
+            ''')
+            # Справочник рекрутеров из таблицы: хранится в базе, поэтому /start после
+            # перезапуска отвечает сразу, не дожидаясь первой синхронизации
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS recruiter_directory (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT UNIQUE NOT NULL,
+                    active INTEGER NOT NULL DEFAULT 1,
+                    created_at TEXT,
+                    updated_at TEXT
+                )
+            ''')
+            # Отпечатки листов: по ним неизменившиеся листы не скачиваются и не разбираются
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS sheet_fingerprints (
+                    spreadsheet_id TEXT NOT NULL,
+                    sheet TEXT NOT NULL,
+                    row_count INTEGER,
+                    checksum TEXT,
+                    revision TEXT,
+                    updated_at TEXT,
+                    PRIMARY KEY (spreadsheet_id, sheet)
+                )
+            ''')
+            # Очередь напоминаний: сообщение попадает сюда в одной транзакции с отметкой
+            # кандидатов (REMINDER_QUEUED) и отправляется отдельно, с повторами
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS reminder_outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    idempotency_key TEXT UNIQUE NOT NULL,
+                    chat_id TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    start_date TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at TEXT NOT NULL,
+                    last_error TEXT,
+                    created_at TEXT,
+                    updated_at TEXT
+                )
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_outbox_ready
+                ON reminder_outbox(next_attempt_at) WHERE status = 'pending'
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS reminder_outbox_candidates (
+                    outbox_id INTEGER NOT NULL,
+                    candidate_id TEXT NOT NULL,
+                    PRIMARY KEY (outbox_id, candidate_id)
+                )
+            ''')
+            # Аренды для нескольких реплик с общей базой: цикл таблицы и рассылку
+            # ведёт только держатель, пока не истёк expires_at
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS leases (
+                    name TEXT PRIMARY KEY,
+                    holder TEXT NOT NULL,
+                    expires_at TEXT NOT NULL,
+                    acquired_at TEXT
+                )
+            ''')
+            self._migrate_candidates(cursor)
+            self._seed_recruiter_directory(cursor)
+            # Частичный индекс только по ожидающим напоминаниям: отправленные
+            # и просроченные строки в него не попадают и не раздувают его
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_candidates_due
+                ON candidates(start_date) WHERE reminder_sent = 0
+            ''')
     
+    def _seed_recruiter_directory(self, cursor):
+        """Заполнить пустой справочник рекрутеров именами из уже загруженных кандидатов"""
+        cursor.execute('SELECT 1 FROM recruiter_directory LIMIT 1')
+        if cursor.fetchone():
+            return
+        now = datetime.now().isoformat()
+        cursor.execute('''
+            INSERT INTO recruiter_directory (name, active, created_at, updated_at)
+            SELECT DISTINCT recruiter_id, 1, ?, ? FROM candidates
+            WHERE deleted_at IS NULL AND recruiter_id IS NOT NULL
+        ''', (now, now))
+    
+    def _migrate_candidates(self, cursor):
+        """Добавить колонки инкрементальной синхронизации и перевести старые ID на стабильные"""
+        cursor.execute('PRAGMA table_info(candidates)')
+        columns = {row[1] for row in cursor.fetchall()}
+        # spreadsheet - ID таблицы кандидата (NULL - записан до поддержки нескольких таблиц)
+        for column in ('sheet', 'row_hash', 'deleted_at', 'spreadsheet'):
+            if column not in columns:
+                cursor.execute(f'ALTER TABLE candidates ADD COLUMN {column} TEXT')
+        
+        # Старые записи имеют ID вида "{лист}_{номер строки}" и не имеют хэша
+        cursor.execute('''
+            SELECT id, candidate_id, name, object, start_date, recruiter_id
+            FROM candidates
+            WHERE row_hash IS NULL
+        ''')
+        legacy = []
+        for row_id, candidate_id, name, obj, start_date, recruiter_id in cursor.fetchall():
+            sheet_name, _, row_number = candidate_id.rpartition('_')
+            if not sheet_name or not row_number.isdigit():
+                continue
+            legacy.append((sheet_name, int(row_number), row_id, name, obj, start_date, recruiter_id))
+        if not legacy:
+            return
+        
+        legacy.sort()
+        occurrences = {}
+        for sheet_name, _, row_id, name, obj, start_date, recruiter_id in legacy:
+            identity = row_identity(name, obj)
+            ordinal = occurrences.get((sheet_name, identity), 0)
+            occurrences[(sheet_name, identity)] = ordinal + 1
+            cursor.execute('''
+                UPDATE candidates
+                SET candidate_id = ?, sheet = ?, row_hash = ?
+                WHERE id = ?
+            ''', (
+                candidate_key(sheet_name, identity, ordinal), sheet_name,
+                content_hash(name, obj, start_date, recruiter_id), row_id
+            ))
+        logger.info(f"🔄 Переведено на стабильные ID кандидатов: {len(legacy)}")
+    
+    @timed(DB_SECONDS, DB_FAILURES, 'candidate_exists')
     def candidate_exists(self, candidate_id):
         """Проверить, существует ли кандидат"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
+        with self._cursor() as cursor:
             cursor.execute('SELECT id FROM candidates WHERE candidate_id = ?', (candidate_id,))
             return cursor.fetchone() is not None
     
-    def add_candidate(self, candidate_id, name, obj, start_date, recruiter_id=None):
+    @timed(DB_SECONDS, DB_FAILURES, 'add_candidate')
+    def add_candidate(self, candidate_id, name, obj, start_date, recruiter_id=None,
+                      sheet=None, row_hash=None):
         """Добавить нового кандидата"""
         now = datetime.now().isoformat()
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
+            with self._transaction() as cursor:
                 cursor.execute('''
                     INSERT INTO candidates 
-                    (candidate_id, name, object, start_date, recruiter_id, created_at, updated_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', (candidate_id, name, obj, start_date, recruiter_id, now, now))
-                conn.commit()
+                    (candidate_id, name, object, start_date, recruiter_id, sheet, row_hash,
+                     created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (candidate_id, name, obj, start_date, recruiter_id, sheet, row_hash, now, now))
                 return True
         except sqlite3.IntegrityError:
             return False
     
+    @timed(DB_SECONDS, DB_FAILURES, 'upsert_candidates')
+    def upsert_candidates(self, candidates, spreadsheet=None):
+        """Вставить или обновить пачку кандидатов (models.Candidate) одной транзакцией.
+        
+        Неизменившиеся строки (тот же хэш) не перезаписываются. При смене
+        даты выхода напоминание отправляется заново, удалённые ранее
+        кандидаты восстанавливаются. spreadsheet - ID таблицы кандидатов.
+        Возвращает (вставлено, обновлено).
+        """
+        now = datetime.now().isoformat()
+        rows = [
+            (
+                c.id, c.name, c.object, c.start_date, c.recruiter_id, c.sheet, spreadsheet,
+                content_hash(c.name, c.object, c.start_date, c.recruiter_id),
+                now, now
+            )
+            for c in candidates
+        ]
+        if not rows:
+            return 0, 0
+        
+        with self._transaction() as cursor:
+            cursor.execute('SELECT COALESCE(MAX(id), 0) FROM candidates')
+            max_id = cursor.fetchone()[0]
+            conn = cursor.connection
+            changes_before = conn.total_changes
+            cursor.executemany('''
+                INSERT INTO candidates
+                (candidate_id, name, object, start_date, recruiter_id, sheet, spreadsheet, row_hash,
+                 created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(candidate_id) DO UPDATE SET
+                    name = excluded.name,
+                    object = excluded.object,
+                    recruiter_id = excluded.recruiter_id,
+                    sheet = excluded.sheet,
+                    spreadsheet = COALESCE(excluded.spreadsheet, candidates.spreadsheet),
+                    row_hash = excluded.row_hash,
+                    reminder_sent = CASE WHEN candidates.start_date = excluded.start_date
+                                         THEN candidates.reminder_sent ELSE 0 END,
+                    start_date = excluded.start_date,
+                    deleted_at = NULL,
+                    updated_at = excluded.updated_at
+                WHERE candidates.row_hash IS NOT excluded.row_hash
+                   OR candidates.deleted_at IS NOT NULL
+            ''', rows)
+            changed = conn.total_changes - changes_before
+            # AUTOINCREMENT гарантирует, что новые строки получили id больше прежнего максимума
+            cursor.execute('SELECT COUNT(*) FROM candidates WHERE id > ?', (max_id,))
+            inserted = cursor.fetchone()[0]
+        return inserted, changed - inserted
+    
+    @timed(DB_SECONDS, DB_FAILURES, 'delete_candidates')
+    def delete_candidates(self, candidate_ids):
+        """Пометить кандидатов удалёнными из таблицы"""
+        now = datetime.now().isoformat()
+        with self._transaction() as cursor:
+            cursor.executemany('''
+                UPDATE candidates
+                SET deleted_at = ?, updated_at = ?
+                WHERE candidate_id = ? AND deleted_at IS NULL
+            ''', [(now, now, candidate_id) for candidate_id in candidate_ids])
+    
+    @timed(DB_SECONDS, DB_FAILURES, 'get_sync_state')
+    def get_sync_state(self, spreadsheet=None):
+        """Получить (candidate_id, лист, хэш строки) неудалённых кандидатов таблицы spreadsheet (None - всех)"""
+        with self._cursor() as cursor:
+            if spreadsheet is None:
+                cursor.execute('''
+                    SELECT candidate_id, sheet, row_hash
+                    FROM candidates
+                    WHERE deleted_at IS NULL
+                ''')
+            else:
+                cursor.execute('''
+                    SELECT candidate_id, sheet, row_hash
+                    FROM candidates
+                    WHERE deleted_at IS NULL AND spreadsheet = ?
+                ''', (spreadsheet,))
+            return cursor.fetchall()
+    
+    @timed(DB_SECONDS, DB_FAILURES, 'adopt_legacy_candidates')
+    def adopt_legacy_candidates(self, spreadsheet, namespace):
+        """Отнести кандидатов без таблицы к spreadsheet, добавив к их ID префикс namespace.
+        
+        Так записи, сделанные до поддержки нескольких таблиц, продолжают
+        синхронизироваться, а не удаляются и не вставляются заново (с повторной
+        рассылкой). Ссылки очереди напоминаний переводятся в той же транзакции.
+        Возвращает число переведённых кандидатов.
+        """
+        with self._cursor() as cursor:
+            cursor.execute('SELECT 1 FROM candidates WHERE spreadsheet IS NULL LIMIT 1')
+            if cursor.fetchone() is None:
+                return 0
+        prefix = f"{namespace}:"
+        with self._transaction() as cursor:
+            cursor.execute('''
+                UPDATE reminder_outbox_candidates SET candidate_id = ? || candidate_id
+                WHERE candidate_id IN (SELECT candidate_id FROM candidates WHERE spreadsheet IS NULL)
+            ''', (prefix,))
+            cursor.execute('''
+                UPDATE candidates SET candidate_id = ? || candidate_id, spreadsheet = ?
+                WHERE spreadsheet IS NULL
+            ''', (prefix, spreadsheet))
+            return cursor.rowcount
+    
+    @timed(DB_SECONDS, DB_FAILURES, 'get_candidates_for_reminder')
     def get_candidates_for_reminder(self):
         """Получить кандидатов, которым нужно отправить напоминание"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
+        with self._cursor() as cursor:
             cursor.execute('''
                 SELECT candidate_id, name, object, start_date, recruiter_id
                 FROM candidates
-                WHERE reminder_sent = 0
+                WHERE reminder_sent = 0 AND deleted_at IS NULL
                 ORDER BY start_date ASC
             ''')
             return cursor.fetchall()
     
+    @timed(DB_SECONDS, DB_FAILURES, 'get_due_reminders')
+    def get_due_reminders(self, target_date):
+        """Получить кандидатов с датой выхода target_date (ГГГГ-ММ-ДД), которым не отправлено напоминание"""
+        with self._cursor() as cursor:
+            cursor.execute('''
+                SELECT candidate_id, name, object, start_date, recruiter_id
+                FROM candidates
+                WHERE reminder_sent = 0 AND start_date = ? AND deleted_at IS NULL
+                ORDER BY recruiter_id, name
+            ''', (target_date,))
+            return cursor.fetchall()
+    
+    @timed(DB_SECONDS, DB_FAILURES, 'get_next_reminder_date')
+    def get_next_reminder_date(self, after):
+        """Ближайшая дата выхода (ГГГГ-ММ-ДД) позже after среди ожидающих напоминания кандидатов"""
+        with self._cursor() as cursor:
+            # Порядок по start_date отдаёт частичный индекс idx_candidates_due
+            cursor.execute('''
+                SELECT start_date FROM candidates
+                WHERE reminder_sent = 0 AND start_date > ? AND deleted_at IS NULL
+                ORDER BY start_date
+                LIMIT 1
+            ''', (after,))
+            result = cursor.fetchone()
+            return result[0] if result else None
+    
+    @timed(DB_SECONDS, DB_FAILURES, 'expire_past_reminders')
+    def expire_past_reminders(self, today):
+        """Пометить просроченными напоминания кандидатов, чья дата выхода раньше today.
+        
+        Возвращает число таких кандидатов.
+        """
+        now = datetime.now().isoformat()
+        with self._transaction() as cursor:
+            cursor.execute('''
+                UPDATE candidates
+                SET reminder_sent = ?, updated_at = ?
+                WHERE reminder_sent = 0 AND start_date < ?
+            ''', (REMINDER_EXPIRED, now, today))
+            return cursor.rowcount
+    
+    @timed(DB_SECONDS, DB_FAILURES, 'mark_reminder_sent')
     def mark_reminder_sent(self, candidate_id):
         """Отметить, что напоминание отправлено"""
         now = datetime.now().isoformat()
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
+        with self._transaction() as cursor:
             cursor.execute('''
                 UPDATE candidates
                 SET reminder_sent = 1, reminder_sent_date = ?
                 WHERE candidate_id = ?
             ''', (now, candidate_id))
-            conn.commit()
     
+    @timed(DB_SECONDS, DB_FAILURES, 'enqueue_reminders')
+    def enqueue_reminders(self, messages):
+        """Поставить напоминания в очередь одной транзакцией.
+        
+        messages - последовательность (candidate_ids, chat_id, text, start_date).
+        Вместе с сообщением кандидаты помечаются REMINDER_QUEUED и больше не
+        попадают в get_due_reminders(). Сообщение с уже известным ключом
+        идемпотентности не дублируется: кандидаты получают состояние,
+        соответствующее статусу имеющегося сообщения. Возвращает число
+        новых сообщений в очереди.
+        """
+        now = datetime.now().isoformat()
+        enqueued = 0
+        with self._transaction() as cursor:
+            for candidate_ids, chat_id, text, start_date in messages:
+                key = outbox_key(chat_id, start_date, candidate_ids)
+                cursor.execute('''
+                    SELECT id, status FROM reminder_outbox WHERE idempotency_key = ?
+                ''', (key,))
+                existing = cursor.fetchone()
+                if existing and existing[1] != OUTBOX_CANCELLED:
+                    state = _OUTBOX_CANDIDATE_STATE[existing[1]]
+                    cursor.executemany('''
+                        UPDATE candidates SET reminder_sent = ?, updated_at = ?
+                        WHERE candidate_id = ? AND reminder_sent = 0
+                    ''', [(state, now, candidate_id) for candidate_id in candidate_ids])
+                    continue
+                
+                if existing:
+                    # Отменённое сообщение с тем же составом снова актуально
+                    outbox_id = existing[0]
+                    cursor.execute('''
+                        UPDATE reminder_outbox
+                        SET status = ?, text = ?, attempts = 0, next_attempt_at = ?,
+                            last_error = NULL, updated_at = ?
+                        WHERE id = ?
+                    ''', (OUTBOX_PENDING, text, now, now, outbox_id))
+                    cursor.execute('DELETE FROM reminder_outbox_candidates WHERE outbox_id = ?', (outbox_id,))
+                else:
+                    cursor.execute('''
+                        INSERT INTO reminder_outbox
+                        (idempotency_key, chat_id, text, start_date, status, next_attempt_at,
+                         created_at, updated_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', (key, chat_id, text, start_date, OUTBOX_PENDING, now, now, now))
+                    outbox_id = cursor.lastrowid
+                cursor.executemany('''
+                    INSERT INTO reminder_outbox_candidates (outbox_id, candidate_id) VALUES (?, ?)
+                ''', [(outbox_id, candidate_id) for candidate_id in candidate_ids])
+                cursor.executemany('''
+                    UPDATE candidates SET reminder_sent = ?, updated_at = ?
+                    WHERE candidate_id = ?
+                ''', [(REMINDER_QUEUED, now, candidate_id) for candidate_id in candidate_ids])
+                enqueued += 1
+        return enqueued
+    
+    @timed(DB_SECONDS, DB_FAILURES, 'claim_reminders')
+    def claim_reminders(self, limit, today):
+        """Забрать до limit сообщений, готовых к отправке: pending -> in_flight.
+        
+        В той же транзакции сообщения с датой выхода не позже today (ГГГГ-ММ-ДД)
+        помечаются просроченными, а сообщения, чьих кандидатов удалили или
+        перенесли, отменяются; оставшиеся в них кандидаты снова ждут постановки
+        в очередь. Возвращает список (outbox_id, chat_id, text, candidate_ids, attempts),
+        attempts - номер текущей попытки.
+        """
+        now = datetime.now().isoformat()
+        with self._transaction() as cursor:
+            cursor.execute('''
+                UPDATE candidates SET reminder_sent = ?, updated_at = ?
+                WHERE reminder_sent = ? AND candidate_id IN (
+                    SELECT oc.candidate_id FROM reminder_outbox_candidates oc
+                    JOIN reminder_outbox o ON o.id = oc.outbox_id
+                    WHERE o.status = ? AND o.start_date <= ?
+                )
+            ''', (REMINDER_EXPIRED, now, REMINDER_QUEUED, OUTBOX_PENDING, today))
+            cursor.execute('''
+                UPDATE reminder_outbox SET status = ?, updated_at = ?
+                WHERE status = ? AND start_date <= ?
+            ''', (OUTBOX_EXPIRED, now, OUTBOX_PENDING, today))
+            
+            cursor.execute('''
+                SELECT id, chat_id, text, attempts FROM reminder_outbox
+                WHERE status = ? AND next_attempt_at <= ?
+                ORDER BY next_attempt_at, id
+                LIMIT ?
+            ''', (OUTBOX_PENDING, now, limit))
+            rows = cursor.fetchall()
+            if not rows:
+                return []
+            
+            placeholders = ','.join('?' * len(rows))
+            cursor.execute(f'''
+                SELECT oc.outbox_id, oc.candidate_id, c.reminder_sent, c.deleted_at
+                FROM reminder_outbox_candidates oc
+                LEFT JOIN candidates c ON c.candidate_id = oc.candidate_id
+                WHERE oc.outbox_id IN ({placeholders})
+            ''', [row[0] for row in rows])
+            candidates = {}
+            stale = set()
+            for outbox_id, candidate_id, state, deleted_at in cursor.fetchall():
+                candidates.setdefault(outbox_id, []).append(candidate_id)
+                if state != REMINDER_QUEUED or deleted_at is not None:
+                    stale.add(outbox_id)
+            
+            if stale:
+                cursor.executemany('''
+                    UPDATE reminder_outbox SET status = ?, updated_at = ? WHERE id = ?
+                ''', [(OUTBOX_CANCELLED, now, outbox_id) for outbox_id in stale])
+                cursor.executemany('''
+                    UPDATE candidates SET reminder_sent = 0, updated_at = ?
+                    WHERE candidate_id = ? AND reminder_sent = ?
+                ''', [
+                    (now, candidate_id, REMINDER_QUEUED)
+                    for outbox_id in stale for candidate_id in candidates[outbox_id]
+                ])
+            
+            claimed = [row for row in rows if row[0] not in stale]
+            cursor.executemany('''
+                UPDATE reminder_outbox
+                SET status = ?, attempts = attempts + 1, updated_at = ?
+                WHERE id = ?
+            ''', [(OUTBOX_IN_FLIGHT, now, row[0]) for row in claimed])
+        return [
+            (outbox_id, chat_id, text, candidates.get(outbox_id, []), attempts + 1)
+            for outbox_id, chat_id, text, attempts in claimed
+        ]
+    
+    @timed(DB_SECONDS, DB_FAILURES, 'complete_reminders')
+    def complete_reminders(self, sent, failed):
+        """Записать результаты отправки пачки одной транзакцией.
+        
+        sent - [(outbox_id, candidate_ids)]; failed - [(outbox_id, candidate_ids,
+        ошибка, retry_at)], где retry_at - время следующей попытки (ISO) или None,
+        если сообщение не доставлено окончательно.
+        """
+        now = datetime.now().isoformat()
+        with self._transaction() as cursor:
+            cursor.executemany('''
+                UPDATE reminder_outbox SET status = ?, last_error = NULL, updated_at = ? WHERE id = ?
+            ''', [(OUTBOX_SENT, now, outbox_id) for outbox_id, _ in sent])
+            cursor.executemany('''
+                UPDATE candidates SET reminder_sent = ?, reminder_sent_date = ?
+                WHERE candidate_id = ? AND reminder_sent = ?
+            ''', [
+                (REMINDER_SENT, now, candidate_id, REMINDER_QUEUED)
+                for _, candidate_ids in sent for candidate_id in candidate_ids
+            ])
+            
+            cursor.executemany('''
+                UPDATE reminder_outbox
+                SET status = ?, next_attempt_at = COALESCE(?, next_attempt_at),
+                    last_error = ?, updated_at = ?
+                WHERE id = ?
+            ''', [
+                (OUTBOX_PENDING if retry_at else OUTBOX_FAILED, retry_at, error, now, outbox_id)
+                for outbox_id, _, error, retry_at in failed
+            ])
+            cursor.executemany('''
+                UPDATE candidates SET reminder_sent = ?, updated_at = ?
+                WHERE candidate_id = ? AND reminder_sent = ?
+            ''', [
+                (REMINDER_FAILED, now, candidate_id, REMINDER_QUEUED)
+                for _, candidate_ids, _, retry_at in failed if not retry_at
+                for candidate_id in candidate_ids
+            ])
+    
+    @timed(DB_SECONDS, DB_FAILURES, 'resume_reminders')
+    def resume_reminders(self):
+        """Вернуть в очередь сообщения, оставшиеся in_flight после остановки или сбоя.
+        
+        Результат их отправки неизвестен, поэтому они отправляются ещё раз
+        (доставка «хотя бы один раз»). Возвращает число таких сообщений.
+        """
+        now = datetime.now().isoformat()
+        with self._transaction() as cursor:
+            cursor.execute('''
+                UPDATE reminder_outbox SET status = ?, next_attempt_at = ?, updated_at = ?
+                WHERE status = ?
+            ''', (OUTBOX_PENDING, now, now, OUTBOX_IN_FLIGHT))
+            return cursor.rowcount
+    
+    @timed(DB_SECONDS, DB_FAILURES, 'get_sheet_fingerprints')
+    def get_sheet_fingerprints(self, spreadsheet_id):
+        """Получить {лист: (число строк, контрольная сумма, ревизия)} для таблицы"""
+        with self._cursor() as cursor:
+            cursor.execute('''
+                SELECT sheet, row_count, checksum, revision
+                FROM sheet_fingerprints
+                WHERE spreadsheet_id = ?
+            ''', (spreadsheet_id,))
+            return {sheet: (row_count, checksum, revision) for sheet, row_count, checksum, revision in cursor.fetchall()}
+    
+    @timed(DB_SECONDS, DB_FAILURES, 'save_sheet_fingerprints')
+    def save_sheet_fingerprints(self, spreadsheet_id, fingerprints, listed_sheets=None):
+        """Сохранить отпечатки листов: {лист: (число строк, контрольная сумма, ревизия)}.
+        
+        Если передан непустой listed_sheets, отпечатки листов не из этого списка удаляются.
+        """
+        now = datetime.now().isoformat()
+        with self._transaction() as cursor:
+            if listed_sheets:
+                listed = set(listed_sheets)
+                cursor.execute('''
+                    SELECT sheet FROM sheet_fingerprints WHERE spreadsheet_id = ?
+                ''', (spreadsheet_id,))
+                stale = [sheet for (sheet,) in cursor.fetchall() if sheet not in listed]
+                cursor.executemany('''
+                    DELETE FROM sheet_fingerprints WHERE spreadsheet_id = ? AND sheet = ?
+                ''', [(spreadsheet_id, sheet) for sheet in stale])
+            cursor.executemany('''
+                INSERT INTO sheet_fingerprints
+                (spreadsheet_id, sheet, row_count, checksum, revision, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(spreadsheet_id, sheet) DO UPDATE SET
+                    row_count = excluded.row_count,
+                    checksum = excluded.checksum,
+                    revision = excluded.revision,
+                    updated_at = excluded.updated_at
+            ''', [
+                (spreadsheet_id, sheet, row_count, checksum, revision, now)
+                for sheet, (row_count, checksum, revision) in fingerprints.items()
+            ])
+    
+    @timed(DB_SECONDS, DB_FAILURES, 'acquire_lease')
+    def acquire_lease(self, name, holder, ttl):
+        """Взять или продлить аренду name на ttl секунд.
+        
+        Аренда достаётся holder, если её нет, она истекла или уже принадлежит
+        ему; проверка и запись - одна транзакция BEGIN IMMEDIATE, так что две
+        реплики не получат аренду одновременно. Возвращает True, если holder -
+        держатель аренды.
+        """
+        now = datetime.now()
+        expires_at = (now + timedelta(seconds=ttl)).isoformat()
+        now = now.isoformat()
+        with self._transaction() as cursor:
+            cursor.execute('''
+                INSERT INTO leases (name, holder, expires_at, acquired_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET
+                    acquired_at = CASE WHEN leases.holder = excluded.holder
+                                       THEN leases.acquired_at ELSE excluded.acquired_at END,
+                    holder = excluded.holder,
+                    expires_at = excluded.expires_at
+                WHERE leases.holder = excluded.holder OR leases.expires_at <= ?
+            ''', (name, holder, expires_at, now, now))
+            return cursor.rowcount > 0
+    
+    @timed(DB_SECONDS, DB_FAILURES, 'release_leases')
+    def release_leases(self, names, holder):
+        """Отпустить аренды holder, чтобы другие реплики забрали их, не дожидаясь истечения"""
+        with self._transaction() as cursor:
+            cursor.executemany('''
+                DELETE FROM leases WHERE name = ? AND holder = ?
+            ''', [(name, holder) for name in names])
+    
+    @timed(DB_SECONDS, DB_FAILURES, 'get_candidate_recruiter_names')
+    def get_candidate_recruiter_names(self):
+        """Получить уникальные имена рекрутеров из неудалённых кандидатов"""
+        with self._cursor() as cursor:
+            cursor.execute('''
+                SELECT DISTINCT recruiter_id FROM candidates
+                WHERE deleted_at IS NULL AND recruiter_id IS NOT NULL
+                ORDER BY recruiter_id
+            ''')
+            return [row[0] for row in cursor.fetchall()]
+    
+    @timed(DB_SECONDS, DB_FAILURES, 'get_all_candidates')
     def get_all_candidates(self):
         """Получить всех кандидатов"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
+        with self._cursor() as cursor:
             cursor.execute('''
                 SELECT candidate_id, name, object, start_date, recruiter_id
                 FROM candidates
+                WHERE deleted_at IS NULL
             ''')
             return cursor.fetchall()
     
+    @timed(DB_SECONDS, DB_FAILURES, 'add_recruiter')
     def add_recruiter(self, chat_id, recruiter_name):
         """Добавить рекрутера или обновить если уже существует"""
         now = datetime.now().isoformat()
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
+            with self._transaction() as cursor:
                 cursor.execute('''
                     INSERT OR REPLACE INTO recruiters (chat_id, recruiter_name, created_at)
                     VALUES (?, ?, ?)
                 ''', (chat_id, recruiter_name, now))
-                conn.commit()
-                return True
+            # Карта имя -> chat_id перечитается при следующем обращении
+            self._chat_ids = None
+            return True
         except Exception as e:
             logger.error(f"Ошибка при добавлении рекрутера: {e}")
             return False
     
+    @timed(DB_SECONDS, DB_FAILURES, 'get_recruiter_by_chat_id')
     def get_recruiter_by_chat_id(self, chat_id):
         """Получить имя рекрутера по chat_id"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
+        with self._cursor() as cursor:
             cursor.execute('''
                 SELECT recruiter_name FROM recruiters WHERE chat_id = ?
             ''', (chat_id,))
@@ -121,28 +771,117 @@ class Database:
     
     def get_chat_id_by_recruiter_name(self, recruiter_name):
         """Получить chat_id рекрутера по его имени"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
+        return self.get_recruiter_chat_ids().get(recruiter_name)
+    
+    def _drop_stale_caches(self):
+        """Сбросить кэши рекрутеров, если базу изменило другое соединение.
+
+        PRAGMA data_version соединения меняется после каждой чужой транзакции -
+        другой реплики или другого потока этого процесса; свои записи кэши
+        сбрасывают сами. Значения разных соединений не сравнимы, поэтому
+        последнее значение хранится для каждого соединения отдельно.
+        """
+        conn = self._connection()
+        version = conn.execute('PRAGMA data_version').fetchone()[0]
+        ident = threading.get_ident()
+        if self._data_versions.get(ident) != version:
+            self._data_versions[ident] = version
+            self._recruiter_directory = None
+            self._chat_ids = None
+    
+    def get_recruiter_chat_ids(self):
+        """Карта имя рекрутера -> chat_id зарегистрированных рекрутеров.
+
+        Держится в памяти и перечитывается только после изменений в базе
+        (add_recruiter() этого процесса или запись другой реплики), так что
+        рассылка напоминаний не делает запрос на каждого кандидата.
+        Словарь общий - не изменять.
+        """
+        self._drop_stale_caches()
+        chat_ids = self._chat_ids
+        if chat_ids is None:
+            chat_ids = self._chat_ids = self._load_recruiter_chat_ids()
+        return chat_ids
+    
+    @timed(DB_SECONDS, DB_FAILURES, 'load_recruiter_chat_ids')
+    def _load_recruiter_chat_ids(self):
+        with self._cursor() as cursor:
+            # При нескольких чатах на одно имя побеждает последняя регистрация
             cursor.execute('''
-                SELECT chat_id FROM recruiters WHERE recruiter_name = ?
-            ''', (recruiter_name,))
-            result = cursor.fetchone()
-            return result[0] if result else None
+                SELECT recruiter_name, chat_id FROM recruiters ORDER BY id
+            ''')
+            return dict(cursor.fetchall())
     
+    @timed(DB_SECONDS, DB_FAILURES, 'get_all_recruiters')
     def get_all_recruiters(self):
         """Получить всех зарегистрированных рекрутеров"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
+        with self._cursor() as cursor:
             cursor.execute('''
                 SELECT chat_id, recruiter_name FROM recruiters ORDER BY recruiter_name
             ''')
             return cursor.fetchall()
     
-    def set_unique_recruiter_names(self, names):
-        """Сохранить список уникальных имен рекрутеров из таблицы"""
-        self.recruiter_names_cache = names
+    def get_recruiter_directory(self):
+        """Активные рекрутеры из справочника: список (id, имя) по алфавиту.
+
+        Справочник хранится в базе и доступен сразу после запуска; в памяти
+        держится его копия, которая перечитывается только после изменений
+        в базе (update_recruiter_directory() или запись другой реплики). Пока
+        база не менялась, возвращается один и тот же список - не изменять.
+        """
+        self._drop_stale_caches()
+        directory = self._recruiter_directory
+        if directory is None:
+            directory = self._recruiter_directory = self._load_recruiter_directory()
+        return directory
+    
+    @timed(DB_SECONDS, DB_FAILURES, 'load_recruiter_directory')
+    def _load_recruiter_directory(self):
+        with self._cursor() as cursor:
+            cursor.execute('''
+                SELECT id, name FROM recruiter_directory WHERE active = 1 ORDER BY name
+            ''')
+            return cursor.fetchall()
     
     def get_unique_recruiter_names(self):
-        """Получить список уникальных имен рекрутеров"""
-        # Возвращаем кэшированный список из последней проверки таблицы
-        return getattr(self, 'recruiter_names_cache', [])
+        """Активные имена рекрутеров из справочника, по алфавиту"""
+        return [name for _, name in self.get_recruiter_directory()]
+    
+    @timed(DB_SECONDS, DB_FAILURES, 'get_recruiter_name')
+    def get_recruiter_name(self, recruiter_id):
+        """Имя активного рекрутера по id справочника (из callback_data кнопки)"""
+        with self._cursor() as cursor:
+            cursor.execute('''
+                SELECT name FROM recruiter_directory WHERE id = ? AND active = 1
+            ''', (recruiter_id,))
+            result = cursor.fetchone()
+            return result[0] if result else None
+    
+    @timed(DB_SECONDS, DB_FAILURES, 'update_recruiter_directory')
+    def update_recruiter_directory(self, names):
+        """Привести справочник к полному набору имён рекрутеров из таблицы.
+
+        В базу пишется только разница с текущим справочником: новые имена
+        добавляются (или снова становятся активными), пропавшие помечаются
+        неактивными. Возвращает (добавлено, скрыто).
+        """
+        names = set(names)
+        current = set(self.get_unique_recruiter_names())
+        added = names - current
+        removed = current - names
+        if not added and not removed:
+            return 0, 0
+        
+        now = datetime.now().isoformat()
+        with self._transaction() as cursor:
+            cursor.executemany('''
+                INSERT INTO recruiter_directory (name, active, created_at, updated_at)
+                VALUES (?, 1, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET active = 1, updated_at = excluded.updated_at
+            ''', [(name, now, now) for name in added])
+            cursor.executemany('''
+                UPDATE recruiter_directory SET active = 0, updated_at = ? WHERE name = ?
+            ''', [(now, name) for name in removed])
+        # id новых имён назначает база - справочник перечитается при следующем обращении
+        self._recruiter_directory = None
+        return len(added), len(removed)
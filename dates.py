@@ -0,0 +1,121 @@
+import logging
+import re
+from datetime import date, datetime
+from functools import lru_cache
+from config import DATE_CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+# дд.мм.гггг в начале строки (после даты допускается хвост, например " г.")
+_FULL_DATE_RE = re.compile(r'(\d{1,2})\.(\d{1,2})\.(\d{4})')
+# мм.гг - месяц и год без дня
+_MONTH_YEAR_RE = re.compile(r'(\d{1,2})\.(\d{2})')
+# Прочие поддерживаемые форматы
+_FORMATS = ('%Y-%m-%d', '%d.%m.%Y', '%d/%m/%Y', '%d-%m-%Y')
+
+# Признак того, что быстрый путь не распознал строку
+_NOT_FAST = object()
+
+_unparseable = 0
+
+
+def _parse_fast(value):
+    """Быстрый разбор дд.мм.гггг и гггг-мм-дд без регулярных выражений"""
+    if len(value) != 10 or not value.isascii():
+        return _NOT_FAST
+    if value[2] == '.' and value[5] == '.':
+        day, month, year = value[0:2], value[3:5], value[6:10]
+    elif value[4] == '-' and value[7] == '-':
+        year, month, day = value[0:4], value[5:7], value[8:10]
+    else:
+        return _NOT_FAST
+    if not (day.isdigit() and month.isdigit() and year.isdigit()):
+        return _NOT_FAST
+    try:
+        return date(int(year), int(month), int(day)).isoformat()
+    except ValueError:
+        logger.warning(f"⚠️ Невалидная дата: {value}")
+        return None
+
+
+def _parse_slow(value):
+    """Разбор остальных форматов: дд.мм.гггг с хвостом, мм.гг и стандартные форматы"""
+    match = _FULL_DATE_RE.match(value)
+    if match:
+        day, month, year = match.groups()
+        try:
+            return date(int(year), int(month), int(day)).isoformat()
+        except ValueError:
+            logger.warning(f"⚠️ Невалидная дата: {value}")
+            return None
+
+    # Формат мм.гг: 1-й день месяца, годы 00-49 -> 20xx, 50-99 -> 19xx
+    match = _MONTH_YEAR_RE.match(value)
+    if match:
+        month, year = match.groups()
+        year_full = int(year)
+        year_full += 2000 if year_full < 50 else 1900
+        try:
+            return date(year_full, int(month), 1).isoformat()
+        except ValueError:
+            logger.warning(f"⚠️ Невалидная дата: {value}")
+            return None
+
+    for fmt in _FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date().isoformat()
+        except ValueError:
+            continue
+
+    logger.warning(f"⚠️ Невозможно распарсить дату: {value}")
+    return None
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def _normalize_cached(raw):
+    """Разбор строки, которой ещё нет в кэше"""
+    global _unparseable
+    value = raw.strip()
+    if not value:
+        return None
+    result = _parse_fast(value)
+    if result is _NOT_FAST:
+        result = _parse_slow(value)
+    if result is None:
+        _unparseable += 1
+    return result
+
+
+def normalize_date(raw):
+    """Привести дату из таблицы к виду ГГГГ-ММ-ДД. None, если дату не распознать.
+
+    Результат кэшируется по исходной строке: каждая уникальная строка
+    разбирается один раз за время жизни процесса.
+    """
+    if not raw:
+        return None
+    return _normalize_cached(raw)
+
+
+def parse_date(raw):
+    """То же, что normalize_date, но возвращает datetime.date"""
+    normalized = normalize_date(raw)
+    return date.fromisoformat(normalized) if normalized else None
+
+
+def date_cache_stats():
+    """Счётчики кэша: попадания, промахи, размер и число нераспознанных уникальных строк"""
+    info = _normalize_cached.cache_info()
+    return {
+        'hits': info.hits,
+        'misses': info.misses,
+        'size': info.currsize,
+        'unparseable': _unparseable,
+    }
+
+
+def clear_date_cache():
+    """Очистить кэш и счётчики"""
+    global _unparseable
+    _normalize_cached.cache_clear()
+    _unparseable = 0
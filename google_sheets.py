@@ -1,23 +1,76 @@
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
-from config import GOOGLE_SHEETS_ID, GOOGLE_CREDENTIALS_FILE, COLUMNS
+from config import (
+    GOOGLE_SHEETS_ID, GOOGLE_CREDENTIALS_FILE,
+    SHEETS_FETCH_MODE, SHEETS_BATCH_SIZE, SHEETS_METADATA_TTL_SECONDS, SHEETS_STREAM_WINDOW,
+    SHEETS_REVISION_PROBE, SHEETS_FORCE_FULL_SYNC
+)
 import os
 import json
-from datetime import datetime
-import re
+import time
+import hashlib
 import logging
+import metrics
+from dates import normalize_date
+from sheet_source import SheetSource
+from sync import spreadsheet_namespace
 
 logger = logging.getLogger(__name__)
 
 SCOPES = ['https://www.googleapis.com/auth/spreadsheets.readonly']
+# Нужен только для чтения ревизии таблицы (SHEETS_REVISION_PROBE)
+DRIVE_METADATA_SCOPE = 'https://www.googleapis.com/auth/drive.metadata.readonly'
 
-class GoogleSheetsAPI:
-    def __init__(self, spreadsheet_id=GOOGLE_SHEETS_ID):
+# Диапазон данных на каждом листе: от A до Q (колонка Q = индекс 16), без заголовка
+SHEET_RANGE = 'A2:Q'
+
+
+def _build_client(name, version, credentials):
+    """Клиент Google API по описанию, вшитому в googleapiclient.
+    
+    static_discovery не ходит в сеть за discovery-документом, cache_discovery=False
+    не пытается поднять файловый кэш (он работает только со старым oauth2client).
+    Библиотека импортируется здесь: её импорт - заметная часть времени запуска.
+    """
+    from googleapiclient.discovery import build
+    return build(name, version, credentials=credentials, static_discovery=True, cache_discovery=False)
+
+class GoogleSheetsAPI(SheetSource):
+    def __init__(self, spreadsheet_id=GOOGLE_SHEETS_ID, fetch_mode=SHEETS_FETCH_MODE,
+                 batch_size=SHEETS_BATCH_SIZE, metadata_ttl=SHEETS_METADATA_TTL_SECONDS,
+                 stream_window=SHEETS_STREAM_WINDOW, database=None,
+                 revision_probe=SHEETS_REVISION_PROBE, force_full_sync=SHEETS_FORCE_FULL_SYNC):
+        super().__init__()
         self.spreadsheet_id = spreadsheet_id
-        self.service = self._get_service()
+        self.namespace = spreadsheet_namespace(spreadsheet_id)
+        self.fetch_mode = fetch_mode
+        self.batch_size = max(1, batch_size)
+        self.metadata_ttl = metadata_ttl
+        self.stream_window = max(1, stream_window)
+        self.database = database
+        self.revision_probe = revision_probe
+        self.force_full_sync = force_full_sync
+        self._pending_fingerprints = {}
+        self._row_counts = {}
+        self._sheets_cache = None
+        self._sheets_cache_time = 0.0
+        self._scopes = SCOPES + [DRIVE_METADATA_SCOPE] if revision_probe else SCOPES
+        self._credentials = None
+        self._drive_service = None
+        self._service = None
     
+    @property
+    def service(self):
+        """Клиент Sheets API; создаётся при первом обращении, а не при запуске бота"""
+        if self._service is None:
+            self._service = self._get_service()
+        return self._service
+
+    @service.setter
+    def service(self, value):
+        self._service = value
+
     def _get_service(self):
         """Получить доступ к Google Sheets API"""
+        from google.oauth2.service_account import Credentials
         creds = None
         
         # Вариант 1: Service Account JSON из переменной окружения (для Railway/облако)
@@ -25,9 +78,10 @@ class GoogleSheetsAPI:
         if creds_json_str:
             try:
                 creds_dict = json.loads(creds_json_str)
-                creds = Credentials.from_service_account_info(creds_dict, scopes=SCOPES)
+                creds = Credentials.from_service_account_info(creds_dict, scopes=self._scopes)
                 logger.info("✅ Использую Google Service Account из переменной окружения")
-                return build('sheets', 'v4', credentials=creds)
+                self._credentials = creds
+                return _build_client('sheets', 'v4', creds)
             except Exception as e:
                 logger.warning(f"⚠️ Ошибка при парсинге GOOGLE_CREDENTIALS_JSON: {e}")
         
@@ -41,8 +95,9 @@ class GoogleSheetsAPI:
                 f"Файл {credentials_file} не найден. "
                 f"Загрузите его из Google Cloud Console"
             )
-        creds = Credentials.from_service_account_file(credentials_file, scopes=SCOPES)
-        return build('sheets', 'v4', credentials=creds)
+        creds = Credentials.from_service_account_file(credentials_file, scopes=self._scopes)
+        self._credentials = creds
+        return _build_client('sheets', 'v4', creds)
 
         if os.path.exists('token.json'):
             creds = UserCredentials.from_authorized_user_file('token.json', SCOPES)
@@ -70,69 +125,114 @@ class GoogleSheetsAPI:
             with open('token.json', 'w') as token:
                 token.write(creds.to_json())
         
-        return build('sheets', 'v4', credentials=creds)
+        return _build_client('sheets', 'v4', creds)
     
     def _parse_date(self, date_str):
-        """Парсить дату в форматах дд.мм.гггг и дд.гг"""
-        if not date_str or not date_str.strip():
-            return None
-        
-        date_str = date_str.strip()
-        
-        # Формат дд.мм.гггг (полный)
-        match = re.match(r'(\d{1,2})\.(\d{1,2})\.(\d{4})', date_str)
-        if match:
-            day, month, year = match.groups()
-            try:
-                return datetime(int(year), int(month), int(day)).strftime('%Y-%m-%d')
-            except ValueError:
-                logger.warning(f"⚠️ Невалидная дата: {date_str}")
-                return None
-        
-        # Формат дд.гг (месяц.год, предполагаем текущий день)
-        match = re.match(r'(\d{1,2})\.(\d{2})', date_str)
-        if match:
-            month, year = match.groups()
-            # Предполагаем, что это означает 1-й день месяца в году 20гг или 19гг
-            year_full = int(year)
-            if year_full < 50:
-                year_full += 2000
-            else:
-                year_full += 1900
-            
-            try:
-                return datetime(year_full, int(month), 1).strftime('%Y-%m-%d')
-            except ValueError:
-                logger.warning(f"⚠️ Невалидная дата: {date_str}")
-                return None
-        
-        # Стандартные форматы
-        formats = ['%Y-%m-%d', '%d.%m.%Y', '%d/%m/%Y', '%d-%m-%Y']
-        for fmt in formats:
-            try:
-                parsed = datetime.strptime(date_str, fmt)
-                return parsed.strftime('%Y-%m-%d')
-            except ValueError:
-                continue
-        
-        logger.warning(f"⚠️ Невозможно распарсить дату: {date_str}")
-        return None
+        """Парсить дату в форматах дд.мм.гггг и дд.гг (см. dates.normalize_date)"""
+        return normalize_date(date_str)
     
-    def get_all_sheets(self):
-        """Получить список всех листов в таблице"""
+    def get_all_sheets(self, force_refresh=False):
+        """Получить список всех листов в таблице (кэшируется на metadata_ttl секунд)"""
+        now = time.monotonic()
+        if (not force_refresh and self._sheets_cache is not None
+                and now - self._sheets_cache_time < self.metadata_ttl):
+            return list(self._sheets_cache)
+        
         try:
-            sheet_metadata = self.service.spreadsheets().get(
-                spreadsheetId=self.spreadsheet_id
-            ).execute()
-            sheets = sheet_metadata.get('sheets', [])
-            return [sheet['properties']['title'] for sheet in sheets]
+            return list(self._load_sheets(now))
         except Exception as e:
             logger.error(f"Ошибка при получении списка листов: {e}")
-            return []
+            # Лучше отдать устаревший список, чем пропустить цикл целиком
+            return list(self._sheets_cache) if self._sheets_cache else []
+    
+    def _load_sheets(self, now):
+        """Запросить названия и размеры листов и обновить кэш (исключения не перехватываются)"""
+        # Запрашиваем только названия и размеры листов, без остальных метаданных таблицы
+        sheet_metadata = self._execute('spreadsheets.get', self.service.spreadsheets().get(
+            spreadsheetId=self.spreadsheet_id,
+            fields='sheets.properties(title,gridProperties.rowCount)'
+        ))
+        sheets = sheet_metadata.get('sheets', [])
+        titles = [sheet['properties']['title'] for sheet in sheets]
+        self._row_counts = {
+            sheet['properties']['title']: sheet['properties'].get('gridProperties', {}).get('rowCount')
+            for sheet in sheets
+        }
+        self._sheets_cache = titles
+        self._sheets_cache_time = now
+        return titles
+    
+    def invalidate_sheets_cache(self):
+        """Сбросить кэш списка листов"""
+        self._sheets_cache = None
+        self._sheets_cache_time = 0.0
+    
+    def get_revision(self):
+        """Ревизия таблицы (version и modifiedTime из Drive API) или None, если недоступна"""
+        if not self.revision_probe:
+            return None
+        try:
+            if self._drive_service is None:
+                # Учётные данные появляются вместе с клиентом Sheets
+                self.service
+                if not self._credentials:
+                    return None
+                self._drive_service = _build_client('drive', 'v3', self._credentials)
+            meta = self._execute('files.get', self._drive_service.files().get(
+                fileId=self.spreadsheet_id,
+                fields='version,modifiedTime',
+                supportsAllDrives=True
+            ))
+            return f"{meta.get('version')}:{meta.get('modifiedTime')}"
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось получить ревизию таблицы: {e}")
+            return None
+    
+    def commit_fingerprints(self, failed_sheets=(), listed_sheets=None):
+        """Сохранить отпечатки прочитанных листов.
+        
+        Вызывается после успешной записи кандидатов в базу: иначе лист, данные
+        которого не дошли до базы, был бы пропущен в следующем цикле.
+        listed_sheets - полный список листов таблицы: отпечатки листов, которых
+        в нём нет, удаляются. Их кандидаты помечены удалёнными, и лист,
+        вернувшийся под прежним именем, должен быть прочитан заново, а не
+        пропущен по старому отпечатку.
+        """
+        fingerprints = {
+            sheet_name: fingerprint
+            for sheet_name, fingerprint in self._pending_fingerprints.items()
+            if sheet_name not in failed_sheets
+        }
+        self._pending_fingerprints = {}
+        if self.database and (fingerprints or listed_sheets):
+            self.database.save_sheet_fingerprints(self.spreadsheet_id, fingerprints, listed_sheets)
     
-    def get_candidates(self, sheet_names=None):
-        """Получить список кандидатов из всех листов или из указанных"""
-        candidates = []
+    @staticmethod
+    def _checksum(values):
+        """Контрольная сумма значений листа"""
+        hasher = hashlib.sha1()
+        for row in values:
+            hasher.update('\x1f'.join(row).encode('utf-8'))
+            hasher.update(b'\x1e')
+        return hasher.hexdigest()
+    
+    def iter_sheet_candidates(self, sheet_names=None, skip_unchanged=True):
+        """Выдавать пары (имя листа, кандидаты) по мере чтения таблицы.
+        
+        В режиме stream кандидаты - генератор, который читает лист окнами по
+        stream_window строк: в памяти одновременно находится не больше одного
+        окна. Ошибка чтения окна выбрасывается при итерации по кандидатам.
+        Для листа, который не удалось скачать в режимах batch и sheet, тоже
+        выдаётся генератор, падающий при итерации: синхронизация отмечает лист
+        в failed_sheets, не удаляет его строки и не сохраняет его отпечаток.
+        
+        При skip_unchanged неизменившиеся листы не выдаются (см. skipped_sheets):
+        лист не скачивается, если с его последней синхронизации не сдвинулась
+        ревизия таблицы, и не разбирается (в режимах batch и sheet), если
+        совпали число строк и контрольная сумма значений.
+        """
+        self.skipped_sheets = []
+        self._pending_fingerprints = {}
         
         # Получить все листы, если не указаны конкретные
         if not sheet_names:
@@ -140,69 +240,172 @@ class GoogleSheetsAPI:
         
         if not sheet_names:
             logger.error("Листы не найдены в таблице")
-            return []
+            return
         
-        for sheet_name in sheet_names:
-            logger.info(f"Чтение кандидатов с листа: {sheet_name}")
-            candidates.extend(self._get_candidates_from_sheet(sheet_name))
+        full_sync = self.force_full_sync or not skip_unchanged
+        fingerprints = {}
+        if self.database and not full_sync:
+            fingerprints = self.database.get_sheet_fingerprints(self.spreadsheet_id)
         
-        return candidates
+        revision = self.get_revision()
+        if revision and fingerprints:
+            unchanged = [name for name in sheet_names
+                         if name in fingerprints and fingerprints[name][2] == revision]
+            if unchanged:
+                self.skipped_sheets.extend(unchanged)
+                sheet_names = [name for name in sheet_names if name not in set(unchanged)]
+                logger.info(f"⏭️ Ревизия таблицы не изменилась, пропущено листов: {len(unchanged)}")
+        
+        if self.fetch_mode == 'stream':
+            if sheet_names:
+                # Окна читаются до gridProperties.rowCount, а кэш списка листов живёт
+                # metadata_ttl: строка за устаревшей границей была бы принята за удалённую.
+                # Если размеры не обновить, цикл падает целиком - без удалений
+                self._load_sheets(time.monotonic())
+            for sheet_name in sheet_names:
+                logger.debug("Чтение кандидатов с листа: %s", sheet_name)
+                rows = self._fingerprinted_rows(sheet_name, self._iter_sheet_rows(sheet_name), revision)
+                yield sheet_name, self._iter_parse_rows(sheet_name, rows)
+            return
+        
+        if self.fetch_mode == 'batch':
+            chunks = (
+                self._batch_get_values(sheet_names[start:start + self.batch_size]).items()
+                for start in range(0, len(sheet_names), self.batch_size)
+            )
+        else:
+            chunks = (
+                [(sheet_name, self._get_sheet_values(sheet_name))]
+                for sheet_name in sheet_names
+            )
+        
+        for chunk in chunks:
+            for sheet_name, values in chunk:
+                if values is None:
+                    yield sheet_name, self._unreadable(sheet_name)
+                    continue
+                fingerprint = (len(values), self._checksum(values), revision)
+                self._pending_fingerprints[sheet_name] = fingerprint
+                previous = fingerprints.get(sheet_name)
+                if previous and previous[:2] == fingerprint[:2]:
+                    self.skipped_sheets.append(sheet_name)
+                    logger.debug("Лист '%s' не изменился", sheet_name)
+                    continue
+                logger.debug("Чтение кандидатов с листа: %s", sheet_name)
+                yield sheet_name, self._parse_rows(sheet_name, values)
+        
+        if self.skipped_sheets:
+            logger.info(f"⏭️ Пропущено неизменившихся листов: {len(self.skipped_sheets)}")
     
-    def _get_candidates_from_sheet(self, sheet_name):
-        """Получить кандидатов с одного листа"""
+    @staticmethod
+    def _unreadable(sheet_name):
+        """Кандидаты листа, который не удалось скачать: итерация сразу падает"""
+        raise RuntimeError(f"данные листа '{sheet_name}' не получены")
+        yield
+    
+    def _fingerprinted_rows(self, sheet_name, rows, revision):
+        """Пропустить строки насквозь, посчитав отпечаток листа; он запоминается, только если лист прочитан до конца"""
+        hasher = hashlib.sha1()
+        count = 0
+        for row_number, row in rows:
+            hasher.update('\x1f'.join(row).encode('utf-8'))
+            hasher.update(b'\x1e')
+            count += 1
+            yield row_number, row
+        self._pending_fingerprints[sheet_name] = (count, hasher.hexdigest(), revision)
+    
+    @staticmethod
+    def _execute(method, request):
+        """Выполнить запрос к Google API, учитывая его в метриках"""
+        metrics.SHEETS_API_CALLS.labels(method).inc()
+        started = time.perf_counter()
         try:
-            sheet = self.service.spreadsheets()
-            # Получить максимальный диапазон для этого листа
-            result = sheet.values().get(
-                spreadsheetId=self.spreadsheet_id,
-                range=f"'{sheet_name}'!A2:Q"  # От A до Q (колонка Q = индекс 16)
-            ).execute()
-            
-            values = result.get('values', [])
-            candidates = []
-            
-            for idx, row in enumerate(values):
-                # Проверить минимальные колонки (до Q = индекс 16)
-                if len(row) < 17:
-                    # Дополнить пустыми значениями до нужного размера
-                    row = row + [''] * (17 - len(row))
-                
-                try:
-                    name = row[COLUMNS['name']].strip() if len(row) > COLUMNS['name'] else ''
-                    obj = row[COLUMNS['object']].strip() if len(row) > COLUMNS['object'] else ''
-                    recruiter = row[COLUMNS['recruiter']].strip() if len(row) > COLUMNS['recruiter'] else None
-                    date_str = row[COLUMNS['start_date']].strip() if len(row) > COLUMNS['start_date'] else ''
-                    
-                    # Пропустить пустые строки
-                    if not name or not obj or not date_str:
-                        continue
-                    
-                    # Парсить дату
-                    parsed_date = self._parse_date(date_str)
-                    if not parsed_date:
-                        continue
-                    
-                    # Создать уникальный ID кандидата
-                    candidate_id = f"{sheet_name}_{idx+2}"
-                    
-                    candidate = {
-                        'id': candidate_id,
-                        'name': name,
-                        'object': obj,
-                        'start_date': parsed_date,
-                        'recruiter_id': recruiter if recruiter else None,
-                        'sheet': sheet_name
-                    }
-                    candidates.append(candidate)
-                    logger.info(f"  ✓ {name} | {obj} | {parsed_date}")
-                
-                except (IndexError, AttributeError, ValueError) as e:
-                    logger.debug(f"Ошибка при обработке строки {idx+2}: {e}")
-                    continue
-            
-            logger.info(f"Лист '{sheet_name}': загружено {len(candidates)} кандидатов")
-            return candidates
+            return request.execute()
+        except Exception:
+            metrics.SHEETS_API_FAILURES.labels(method).inc()
+            raise
+        finally:
+            metrics.SHEETS_API_SECONDS.labels(method).observe(time.perf_counter() - started)
+    
+    def _batch_get_values(self, sheet_names):
+        """Прочитать диапазоны всех листов через values.batchGet.
         
+        Список листов режется на пачки по batch_size диапазонов, чтобы
+        не упереться в ограничение длины URL запроса. Листам пачки, которую
+        не удалось прочитать, соответствует None.
+        """
+        values_by_sheet = {}
+        sheet = self.service.spreadsheets()
+        for start in range(0, len(sheet_names), self.batch_size):
+            chunk = sheet_names[start:start + self.batch_size]
+            try:
+                result = self._execute('values.batchGet', sheet.values().batchGet(
+                    spreadsheetId=self.spreadsheet_id,
+                    ranges=[self._sheet_range(name) for name in chunk],
+                    majorDimension='ROWS'
+                ))
+            except Exception as e:
+                logger.error(f"Ошибка при пакетном чтении листов {chunk}: {e}")
+                values_by_sheet.update(dict.fromkeys(chunk))
+                continue
+            
+            # valueRanges возвращаются в том же порядке, что и запрошенные диапазоны;
+            # лист, для которого диапазон не вернулся, считается непрочитанным
+            value_ranges = result.get('valueRanges', [])
+            for index, sheet_name in enumerate(chunk):
+                values_by_sheet[sheet_name] = (
+                    value_ranges[index].get('values', []) if index < len(value_ranges) else None
+                )
+        return values_by_sheet
+    
+    def _get_sheet_values(self, sheet_name):
+        """Прочитать диапазон одного листа. Возвращает None при ошибке"""
+        try:
+            return self._fetch_range(sheet_name, SHEET_RANGE)
         except Exception as e:
             logger.error(f"Ошибка при получении данных с листа '{sheet_name}': {e}")
-            return []
+            return None
+    
+    def _fetch_range(self, sheet_name, a1_range):
+        """Прочитать диапазон листа (исключения не перехватываются)"""
+        result = self._execute('values.get', self.service.spreadsheets().values().get(
+            spreadsheetId=self.spreadsheet_id,
+            range=self._sheet_range(sheet_name, a1_range)
+        ))
+        return result.get('values', [])
+    
+    def _iter_rows(self, sheet_name):
+        return self._iter_sheet_rows(sheet_name)
+    
+    def _iter_sheet_rows(self, sheet_name):
+        """Выдавать (номер строки, строка) листа, читая его окнами по stream_window строк.
+        
+        Граница листа берётся из gridProperties.rowCount (перечитывается в начале
+        каждого цикла stream): пустое окно в середине листа не означает, что
+        дальше данных нет.
+        """
+        row_count = self._row_counts.get(sheet_name)
+        first_col, last_col = SHEET_RANGE.split(':')
+        first_col = first_col.rstrip('0123456789')
+        start = 2
+        while True:
+            end = start + self.stream_window - 1
+            if row_count:
+                end = min(end, row_count)
+            values = self._fetch_range(sheet_name, f"{first_col}{start}:{last_col}{end}")
+            for offset, row in enumerate(values):
+                yield start + offset, row
+            if row_count is None:
+                # Размер листа неизвестен: читаем, пока окна не пустые
+                if not values:
+                    break
+            elif end >= row_count:
+                break
+            start = end + 1
+    
+    @staticmethod
+    def _sheet_range(sheet_name, a1_range=SHEET_RANGE):
+        """A1-нотация диапазона данных листа"""
+        escaped = sheet_name.replace("'", "''")
+        return f"'{escaped}'!{a1_range}"
+
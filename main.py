@@ -1,159 +1,551 @@
+import os
+import time
+import socket
 import asyncio
+import signal
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from apscheduler.schedulers.background import BackgroundScheduler
-from google_sheets import GoogleSheetsAPI
+from sheet_source import create_sheet_sources
 from telegram_bot import TelegramBot
 from database import Database
-from config import CHECK_INTERVAL_HOURS
+from dates import parse_date, date_cache_stats
+from sync import SheetSync, SyncResult
+from profiling import CycleProfiler
+from reminder_timer import ReminderTimer
+import metrics
+from config import (
+    CHECK_INTERVAL_HOURS, REMINDER_MODE, LOG_LEVEL, LOG_ROW_SAMPLE_EVERY,
+    REMINDER_OUTBOX_BATCH_SIZE, REMINDER_MAX_ATTEMPTS, REMINDER_RETRY_BASE_SECONDS,
+    REMINDER_RETRY_MAX_SECONDS, REMINDER_OUTBOX_POLL_SECONDS, SHEETS_WORKERS,
+    LEASE_TTL_SECONDS, REPLICA_ID
+)
 import logging
 
 # Настройка логирования
 logging.basicConfig(
-    level=logging.INFO,
+    level=getattr(logging, LOG_LEVEL, logging.INFO),
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
 
+# Аренда рассылки напоминаний; аренды таблиц - sheets:<ID таблицы>
+REMINDERS_LEASE = 'reminders'
+
+
 class CandidateBot:
-    def __init__(self):
-        self.db = Database()
-        self.sheets_api = GoogleSheetsAPI()
-        self.telegram_bot = TelegramBot(database=self.db)
-        self.scheduler = BackgroundScheduler()
+    def __init__(self, sheet_source=None, telegram_bot=None, database=None, sheet_sources=None):
+        self.db = database or Database()
+        if sheet_sources is None:
+            sheet_sources = [sheet_source] if sheet_source else create_sheet_sources(self.db)
+        self.sheet_sources = list(sheet_sources)
+        # Первая таблица; для одной таблицы - единственный источник
+        self.sheets_api = self.sheet_sources[0]
+        self.telegram_bot = telegram_bot or TelegramBot(database=self.db)
+        # У каждой таблицы своя синхронизация; первая забирает кандидатов,
+        # записанных до поддержки нескольких таблиц
+        self.syncs = [
+            SheetSync(self.db, spreadsheet=source.spreadsheet_id, adopt_legacy=index == 0)
+            for index, source in enumerate(self.sheet_sources)
+        ]
+        self.sync = self.syncs[0]
+        self.sheets_workers = max(1, min(SHEETS_WORKERS, len(self.sheet_sources)))
+        self._pool = None
+        # Синхронизация последнего цикла в потоке (asyncio.Future) - её дожидается остановка
+        self._sync_job = None
+        # Имя реплики в таблице leases и аренды, которые она держит
+        self.replica_id = REPLICA_ID or f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_ttl = LEASE_TTL_SECONDS
+        self._leases = set()
+        # Аренды таблиц, перехваченные между циклами: снимок синхронизации надо перечитать
+        self._stale_leases = set()
+        self.reminder_mode = REMINDER_MODE
+        self.outbox_batch_size = REMINDER_OUTBOX_BATCH_SIZE
+        self.reminder_max_attempts = REMINDER_MAX_ATTEMPTS
+        self.retry_base_seconds = REMINDER_RETRY_BASE_SECONDS
+        self.retry_max_seconds = REMINDER_RETRY_MAX_SECONDS
+        self._delivering = False
+        # Планировщик создаётся в run(): разовые запуски и бенчмарки обходятся без него
+        self.scheduler = None
+        # Проверять напоминания прямо в check_candidates(); в run() их отправляет таймер
+        self.inline_reminders = True
+        self._stop_event = None
+        self._metrics_server = None
+        self.profiler = CycleProfiler()
+        self.telegram_bot.profiler = self.profiler
+        # Рассылка по сроку (накануне выхода в REMINDER_SEND_TIME), а не по циклу чтения таблицы
+        self.reminder_timer = ReminderTimer(self.db, self.check_reminders)
+        self.telegram_bot.reminder_timer = self.reminder_timer
     
     async def check_candidates(self):
-        """Проверить новых кандидатов и отправить напоминания"""
+        """Синхронизировать кандидатов с таблицей.
+        
+        Напоминания отправляет ReminderTimer; если он не запущен (разовый
+        вызов, бенчмарки), они проверяются здесь же после синхронизации.
+        """
         logger.info("🔍 Проверка кандидатов в Google Sheets...")
         
+        # Профиль цикла, если он взведён (PROFILE_CYCLES, /profile или медленный прошлый цикл)
+        capture = self.profiler.begin()
+        started = time.perf_counter()
         try:
-            candidates = self.sheets_api.get_candidates()
-            logger.info(f"Найдено {len(candidates)} кандидатов в таблице")
-            
-            # Собираем все уникальные имена рекрутеров для кэша
-            recruiter_names = list(set([c['recruiter_id'] for c in candidates if c['recruiter_id']]))
-            recruiter_names.sort()
-            self.db.set_unique_recruiter_names(recruiter_names)
-            logger.info(f"Уникальных рекрутеров в таблице: {', '.join(recruiter_names) if recruiter_names else 'нет'}")
-            
-            # Добавить новых кандидатов
-            for candidate in candidates:
-                if not self.db.candidate_exists(candidate['id']):
-                    self.db.add_candidate(
-                        candidate_id=candidate['id'],
-                        name=candidate['name'],
-                        obj=candidate['object'],
-                        start_date=candidate['start_date'],
-                        recruiter_id=candidate.get('recruiter_id')
-                    )
-                    logger.info(f"✅ Добавлен новый кандидат: {candidate['name']} (рекрутер: {candidate.get('recruiter_id', 'не указан')})")
-            
-            # Проверить напоминания
-            await self.check_reminders()
+            # Чтение таблицы и запись в SQLite блокируют - выполняем их вне event loop,
+            # чтобы не задерживать обработку команд бота
+            self._sync_job = asyncio.ensure_future(
+                asyncio.to_thread(self.profiler.wrap(capture, self._sync_candidates), capture)
+            )
+            # Планировщик при остановке отменяет эту задачу, но поток не прервать:
+            # shield оставляет его future для run(), который дождётся конца записи
+            result = await asyncio.shield(self._sync_job)
+            
+            if self.inline_reminders:
+                # Без таймера (разовый запуск, бенчмарки) напоминания проверяются в том же цикле
+                await self.check_reminders()
+            elif result.changed:
+                # Напоминания отправляет таймер; изменённые строки могли сдвинуть ближайший срок
+                self.reminder_timer.notify()
+            metrics.CYCLES.labels('partial' if result.failed_sheets else 'ok').inc()
         
         except Exception as e:
+            metrics.CYCLES.labels('error').inc()
             logger.error(f"❌ Ошибка при проверке кандидатов: {e}")
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.STAGE_SECONDS.labels('cycle').observe(elapsed)
+            logger.info(f"⏱️ Проверка заняла {elapsed:.1f} с")
+            self.profiler.end(capture, elapsed)
+    
+    def _sync_candidates(self, capture=None):
+        """Прочитать таблицы и синхронизировать кандидатов с базой.
+        
+        Несколько таблиц читаются и разбираются параллельно на пуле из
+        sheets_workers потоков. Таблицу, аренду которой держит другая реплика,
+        эта реплика пропускает. Возвращает общий SyncResult.
+        """
+        work = list(zip(self.sheet_sources, self.syncs))
+        if len(work) == 1:
+            # Этот поток уже профилируется (см. check_candidates) - без второй обёртки
+            outcomes = [self._sync_spreadsheet(*work[0])]
+        else:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.sheets_workers, thread_name_prefix='sheets')
+            # Потоки пула профилируются отдельно и попадают в тот же профиль цикла
+            sync_one = self.profiler.wrap(capture, self._sync_spreadsheet)
+            outcomes = list(self._pool.map(lambda item: sync_one(*item), work))
+        
+        errors = [error for _, _, error in outcomes if error]
+        if errors and len(errors) == len(outcomes):
+            # Не удалась ни одна таблица - цикл неудачный
+            raise errors[0]
+        
+        result = SyncResult()
+        for _, spreadsheet_result, _ in outcomes:
+            if spreadsheet_result:
+                result.merge(spreadsheet_result)
+        if len(work) > 1:
+            synced = sum(1 for _, spreadsheet_result, _ in outcomes if spreadsheet_result)
+            logger.info(f"📚 Таблиц синхронизировано: {synced} из {len(work)}, с ошибкой: {len(errors)}")
+        
+        for key, value in date_cache_stats().items():
+            metrics.DATE_CACHE.labels(key).set(value)
+        
+        recruiter_names = self._recruiter_names(outcomes)
+        added, removed = self.db.update_recruiter_directory(recruiter_names)
+        logger.info(f"Уникальных рекрутеров в таблице: {len(recruiter_names)}"
+                    + (f" (новых: {added}, пропало: {removed})" if added or removed else ""))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Рекрутеры: %s", ', '.join(sorted(recruiter_names)))
+        return result
+    
+    def _sync_spreadsheet(self, source, sync):
+        """Синхронизировать одну таблицу под её арендой.
+        
+        Возвращает (источник, SyncResult или None, ошибка или None); None вместо
+        результата - таблицу обрабатывает другая реплика или синхронизация упала.
+        """
+        label = f" [{source.spreadsheet_id}]" if len(self.sheet_sources) > 1 else ""
+        try:
+            lease = self._spreadsheet_lease(source)
+            taken_over = lease not in self._leases or lease in self._stale_leases
+            if not self._hold_lease(lease):
+                logger.info(f"🔒 Таблицу{label} обрабатывает другая реплика - пропуск")
+                return source, None, None
+            if taken_over:
+                # Пока таблицу вела другая реплика, снимок в памяти устарел
+                self._stale_leases.discard(lease)
+                sync.reset()
+            
+            # Список листов кэширован, поэтому его получение здесь не стоит лишнего запроса
+            with metrics.STAGE_SECONDS.labels('sheets_list').time():
+                listed_sheets = source.get_all_sheets()
+            
+            # Кандидаты идут потоком от чтения таблицы к записи в базу;
+            # в базу попадают только изменившиеся строки
+            with metrics.STAGE_SECONDS.labels('sync').time():
+                result = sync.sync(
+                    source.iter_sheet_candidates(listed_sheets),
+                    listed_sheets=listed_sheets
+                )
+            # Отпечатки листов фиксируются только после успешной записи в базу
+            source.commit_fingerprints(result.failed_sheets, listed_sheets)
+        except Exception as e:
+            logger.error(f"❌ Ошибка при синхронизации таблицы{label}: {e}")
+            return source, None, e
+        
+        metrics.SYNC_ROWS.labels('inserted').inc(len(result.inserted))
+        metrics.SYNC_ROWS.labels('updated').inc(len(result.updated))
+        metrics.SYNC_ROWS.labels('deleted').inc(len(result.deleted))
+        metrics.SYNC_ROWS.labels('unchanged').inc(result.unchanged)
+        metrics.SHEETS_SKIPPED.labels().inc(len(source.skipped_sheets))
+        logger.info(f"Найдено {result.total} кандидатов в изменившихся листах{label}")
+        logger.info(f"🔄 Синхронизация{label}: {result}, пропущено листов: {len(source.skipped_sheets)}")
+        return source, result, None
+    
+    def _recruiter_names(self, outcomes):
+        """Полный набор имён рекрутеров во всех таблицах после синхронизации"""
+        names = set()
+        additive = False
+        for source, result, _ in outcomes:
+            if result is None or result.failed_sheets:
+                # Таблицу ведёт другая реплика или её (или какой-то её лист) не удалось
+                # прочитать: строки непрочитанного остались в базе - имена берём оттуда
+                return self.db.get_candidate_recruiter_names()
+            if not source.skipped_sheets:
+                # Прочитаны все листы - имена собраны при синхронизации
+                names |= result.recruiters
+            elif not result.updated and not result.deleted:
+                # Строки только добавлялись, так что ни одно имя пропасть не могло:
+                # к справочнику добавляются имена из прочитанных листов
+                names |= result.recruiters
+                additive = True
+            else:
+                # Имя могло исчезнуть вместе с изменённой или удалённой строкой непрочитанного
+                # целиком листа - берём имена из базы
+                return self.db.get_candidate_recruiter_names()
+        if additive:
+            names |= set(self.db.get_unique_recruiter_names())
+        return names
+    
+    @staticmethod
+    def _spreadsheet_lease(source):
+        return f"sheets:{source.spreadsheet_id or 'default'}"
+    
+    def _hold_lease(self, name):
+        """Взять или продлить аренду name. True - её держит эта реплика"""
+        held = self.db.acquire_lease(name, self.replica_id, self.lease_ttl)
+        if held and name not in self._leases:
+            self._leases.add(name)
+            logger.info(f"🔑 Аренда '{name}' у реплики {self.replica_id}")
+        elif not held and name in self._leases:
+            self._leases.discard(name)
+            logger.warning(f"⚠️ Аренда '{name}' перешла к другой реплике")
+        metrics.LEASES_HELD.labels(name).set(1 if held else 0)
+        return held
+    
+    def _hold_reminders_lease(self):
+        """Аренда рассылки напоминаний.
+        
+        Когда рассылка переходит к этой реплике (в том числе при запуске),
+        сообщения, оставшиеся in_flight у прежнего держателя, отправляются
+        заново, а таймер перепроверяет напоминания на завтра: прежний
+        держатель мог не успеть поставить их в очередь.
+        """
+        taken_over = REMINDERS_LEASE not in self._leases
+        if not self._hold_lease(REMINDERS_LEASE):
+            return False
+        if taken_over:
+            resumed = self.db.resume_reminders()
+            if resumed:
+                logger.info(f"♻️ Возвращено в очередь неподтверждённых напоминаний: {resumed}")
+            self.reminder_timer.notify()
+        return True
+    
+    async def renew_leases(self):
+        """Продлить аренды реплики и забрать освободившиеся аренды таблиц.
+        
+        Таблица, чей держатель остановился или пропал, проверяется сразу,
+        а не в следующем плановом цикле этой реплики.
+        """
+        spreadsheet_leases = [self._spreadsheet_lease(source) for source in self.sheet_sources]
+        taken = False
+        for name in list(self._leases) + [lease for lease in spreadsheet_leases if lease not in self._leases]:
+            taken_over = name not in self._leases
+            try:
+                held = self._hold_lease(name)
+            except Exception as e:
+                logger.error(f"❌ Не удалось продлить аренду '{name}': {e}")
+                continue
+            if held and taken_over:
+                self._stale_leases.add(name)
+                taken = True
+        if taken and self.scheduler and self.scheduler.get_job('check_candidates'):
+            self.scheduler.modify_job('check_candidates', next_run_time=datetime.now())
     
     async def check_reminders(self):
-        """?????????, ???? ????? ????????? ???????????"""
+        """Отправить напоминания о кандидатах, выходящих завтра"""
+        with metrics.STAGE_SECONDS.labels('reminders').time():
+            await self._check_reminders()
+    
+    async def _check_reminders(self):
         try:
-            candidates = self.db.get_candidates_for_reminder()
-            logger.info(f"???????? ??????????? ??? {len(candidates)} ??????????")
+            if not self._hold_reminders_lease():
+                # Напоминания рассылает другая реплика
+                return
+            today = datetime.now().date()
+            tomorrow = today + timedelta(days=1)
+            
+            # Просроченные напоминания больше не участвуют в выборке
+            expired = self.db.expire_past_reminders(today.isoformat())
+            if expired:
+                logger.info(f"⌛ Дата выхода уже прошла, напоминания просрочены: {expired}")
+            
+            candidates = self.db.get_due_reminders(tomorrow.isoformat())
+            logger.info(f"🔔 Проверка напоминаний для {len(candidates)} кандидатов")
 
-            for candidate_id, name, obj, start_date, recruiter_id in candidates:
-                logger.info(f"?? ????????: {name}, ????: {start_date}, ????????: {recruiter_id}")
+            # Построчные записи собираются только на DEBUG и с выборкой LOG_ROW_SAMPLE_EVERY
+            log_rows = logger.isEnabledFor(logging.DEBUG)
+            # Карта имя -> chat_id из памяти: без запроса к базе на каждого кандидата
+            chat_ids = self.db.get_recruiter_chat_ids()
+            by_chat = {}
+            routed = 0
+            unrouted = {}
+            for number, (candidate_id, name, obj, start_date, recruiter_id) in enumerate(candidates):
+                chat_id = chat_ids.get(recruiter_id) if recruiter_id else None
+                if log_rows and number % LOG_ROW_SAMPLE_EVERY == 0:
+                    logger.debug("👤 Кандидат: %s, дата: %s, рекрутер: %s, chat_id: %s",
+                                 name, start_date, recruiter_id, chat_id)
 
-                if self._should_send_reminder(start_date):
-                    logger.info(f"? ???? ????????? ???: {name}")
-                    # ???????? chat_id ????????? ?? ?? ?? ??? ?????
-                    chat_id = None
-                    if recruiter_id:
-                        chat_id = self.db.get_chat_id_by_recruiter_name(recruiter_id)
-                        logger.info(f"?? Chat ID ??? {recruiter_id}: {chat_id}")
+                if chat_id:
+                    by_chat.setdefault(chat_id, []).append((candidate_id, name, obj))
+                    routed += 1
+                else:
+                    unrouted[recruiter_id] = unrouted.get(recruiter_id, 0) + 1
 
-                    if chat_id:
-                        logger.info(f"?? ????????? ??????????? {name} ? chat {chat_id}")
-                        # ????????? ??????????? ??????????????????? ?????????
-                        success = await self.telegram_bot.send_reminder(name, obj, chat_id)
+            if unrouted:
+                # Одна запись на цикл вместо предупреждения на каждого кандидата
+                details = ', '.join(f"{recruiter or 'не указан'} ({count})"
+                                    for recruiter, count in sorted(unrouted.items(), key=lambda item: -item[1]))
+                logger.warning(f"⚠️ Chat ID не найден для рекрутеров: {details}")
 
-                        if success:
-                            self.db.mark_reminder_sent(candidate_id)
-                            logger.info(f"? ??????????? ??????????: {name}")
-                        else:
-                            logger.error(f"? ?????? ????????: {name}")
+            if by_chat:
+                # Ключ сообщения - список кандидатов, доставку которых оно подтверждает
+                messages = []
+                target_date = tomorrow.isoformat()
+                for chat_id, chat_candidates in by_chat.items():
+                    if self.reminder_mode == 'digest':
+                        for candidate_ids, text in self.telegram_bot.format_digest(chat_candidates):
+                            messages.append((candidate_ids, chat_id, text, target_date))
                     else:
-                        logger.warning(f"?? Chat ID ?? ?????? ??? ????????? {recruiter_id}")
-                else:
-                    logger.info(f"?? ???? ?? ????????? ??? ?????? ???: {name}")
+                        for candidate_id, name, obj in chat_candidates:
+                            messages.append(([candidate_id], chat_id,
+                                             self.telegram_bot.format_reminder(name, obj), target_date))
+                
+                # Сообщения и отметка кандидатов - одна транзакция: после сбоя кандидат
+                # либо ещё ждёт постановки в очередь, либо его сообщение уже в ней
+                enqueued = self.db.enqueue_reminders(messages)
+                logger.info(f"📥 В очередь поставлено {enqueued} сообщений о {routed} кандидатах")
+            
+            await self.deliver_reminders()
 
         except Exception as e:
-            logger.error(f"? ?????? ? check_reminders: {e}")
-
-    def _should_send_reminder(self, start_date_str):
-
+            logger.error(f"❌ Ошибка в check_reminders: {e}")
 
-
-        """Проверить, нужно ли отправить напоминание (за день до выхода)"""
-        if not start_date_str or not str(start_date_str).strip():
-            return False
+    async def deliver_reminders(self):
+        """Отправить сообщения из очереди напоминаний, у которых подошло время.
+        
+        Сообщения забираются пачками по outbox_batch_size, результаты каждой
+        пачки записываются одной транзакцией. Временные ошибки откладывают
+        сообщение с экспоненциальной паузой, после reminder_max_attempts
+        попыток или при окончательной ошибке оно помечается недоставленным.
+        """
+        if self._delivering:
+            # Очередь уже разбирается - новые сообщения заберёт он или следующий опрос очереди
+            return
+        self._delivering = True
         try:
-            # Поддерживаемые форматы дат
-            formats = ['%Y-%m-%d', '%d.%m.%Y', '%d/%m/%Y']
-            start_date = None
+            if self._hold_reminders_lease():
+                await self._deliver_reminders()
+        except Exception as e:
+            logger.error(f"❌ Ошибка при отправке напоминаний из очереди: {e}")
+        finally:
+            self._delivering = False
+    
+    async def _deliver_reminders(self):
+        today = datetime.now().date().isoformat()
+        log_rows = logger.isEnabledFor(logging.DEBUG)
+        sent_total = failed_total = retry_total = 0
+        while True:
+            batch = self.db.claim_reminders(self.outbox_batch_size, today)
+            if not batch:
+                break
             
-            for fmt in formats:
-                try:
-                    start_date = datetime.strptime(start_date_str, fmt).date()
-                    break
-                except ValueError:
-                    continue
+            with metrics.STAGE_SECONDS.labels('telegram_send').time():
+                results = await self.telegram_bot.send_messages([
+                    ((outbox_id, candidate_ids, attempts), chat_id, text)
+                    for outbox_id, chat_id, text, candidate_ids, attempts in batch
+                ])
             
-            if not start_date:
-                logger.warning(f"⚠️ Невозможно распарсить дату: {start_date_str}")
-                return False
+            sent = []
+            failed = []
+            now = datetime.now()
+            for result in results:
+                outbox_id, candidate_ids, attempts = result.key
+                if result.success:
+                    sent.append((outbox_id, candidate_ids))
+                    if log_rows:
+                        logger.debug("✅ Напоминание #%s отправлено в %s", outbox_id, result.chat_id)
+                    continue
+                retry_at = None
+                if result.retryable and attempts < self.reminder_max_attempts:
+                    delay = min(self.retry_max_seconds, self.retry_base_seconds * 2 ** (attempts - 1))
+                    retry_at = (now + timedelta(seconds=delay)).isoformat()
+                    retry_total += len(candidate_ids)
+                    logger.warning(f"⚠️ Напоминание #{outbox_id} в {result.chat_id} не доставлено "
+                                   f"(попытка {attempts}): {result.error}. Повтор через {delay:.0f} с")
+                else:
+                    failed_total += len(candidate_ids)
+                    logger.error(f"❌ Ошибка отправки напоминания #{outbox_id} в {result.chat_id} "
+                                 f"после {attempts} попыток: {result.error}")
+                failed.append((outbox_id, candidate_ids, str(result.error), retry_at))
             
-            # Проверить, завтра ли выход
-            tomorrow = (datetime.now() + timedelta(days=1)).date()
-            return start_date == tomorrow
+            self.db.complete_reminders(sent, failed)
+            sent_total += sum(len(candidate_ids) for _, candidate_ids in sent)
+            if len(batch) < self.outbox_batch_size:
+                break
         
-        except Exception as e:
-            logger.error(f"Ошибка при обработке даты {start_date_str}: {e}")
-            return False
+        metrics.REMINDERS.labels('sent').inc(sent_total)
+        metrics.REMINDERS.labels('failed').inc(failed_total)
+        metrics.REMINDERS.labels('retry').inc(retry_total)
+        if sent_total or failed_total or retry_total:
+            logger.info(f"📬 Напоминаний отправлено: {sent_total}, не доставлено: {failed_total}, "
+                        f"отложено: {retry_total}")
     
-    def _run_async_job(self):
-        """Обёртка для запуска async функции из scheduler"""
-        asyncio.run(self.check_candidates())
-    
-    def start(self):
-        """Запустить бота"""
-        logger.info("🚀 Запуск Candidate Bot...")
+    def _should_send_reminder(self, start_date_str):
+        """Проверить, нужно ли отправить напоминание (за день до выхода)"""
+        start_date = parse_date(start_date_str)
+        if not start_date:
+            return False
         
-        # Проверить подключение
-        asyncio.run(self.telegram_bot.test_connection())
+        # Проверить, завтра ли выход
+        tomorrow = (datetime.now() + timedelta(days=1)).date()
+        return start_date == tomorrow
+    
+    async def run(self):
+        """Запустить бота: scheduler и polling Telegram в одном event loop.
         
-        # Добавить задачу в scheduler
-        self.scheduler.add_job(
-            self._run_async_job,
-            'interval',
-            hours=CHECK_INTERVAL_HOURS,
-            id='check_candidates',
-            name='Проверка кандидатов'
-        )
+        Работает до SIGTERM/SIGINT, затем корректно всё останавливает.
+        """
+        logger.info("🚀 Запуск Candidate Bot...")
         
-        # Запустить scheduler
-        self.scheduler.start()
-        logger.info(f"⏰ Бот запущен. Проверка каждые {CHECK_INTERVAL_HOURS} часа(ов)")
+        self._stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, self._stop_event.set)
+            except NotImplementedError:
+                # Windows: остаётся KeyboardInterrupt
+                pass
         
         try:
-            # Первая проверка сразу
-            asyncio.run(self.check_candidates())
+            # Эндпоинт метрик (если задан METRICS_PORT)
+            self._metrics_server = await metrics.start_http_server()
             
-            # Бот работает в фоне
-            while True:
-                import time
-                time.sleep(1)
-        except KeyboardInterrupt:
+            from apscheduler.schedulers.asyncio import AsyncIOScheduler
+            self.scheduler = AsyncIOScheduler()
+            self.inline_reminders = False
+            
+            # Первая проверка таблицы - сразу и параллельно с запуском Telegram:
+            # синхронизации бот не нужен, а напоминания ждут таймера
+            self.scheduler.add_job(
+                self.check_candidates,
+                'interval',
+                hours=CHECK_INTERVAL_HOURS,
+                id='check_candidates',
+                name='Проверка кандидатов',
+                next_run_time=datetime.now(),
+                max_instances=1,
+                coalesce=True
+            )
+            self.scheduler.start()
+            
+            # Обработчики /start и выбора рекрутера
+            try:
+                await self.telegram_bot.start(self.db)
+            except Exception as e:
+                logger.error(f"❌ Не удалось запустить приём обновлений Telegram: {e}")
+            
+            # Проверить подключение
+            await self.telegram_bot.test_connection()
+            
+            # Рассылку ведёт одна реплика; получив её, эта реплика заново отправит
+            # сообщения, которые отправлялись в момент остановки прежнего держателя
+            if not self._hold_reminders_lease():
+                logger.info("🔒 Напоминания рассылает другая реплика")
+            # Аренды продлеваются, пока реплика жива; иначе их заберут другие
+            self.scheduler.add_job(
+                self.renew_leases,
+                'interval',
+                seconds=max(1, self.lease_ttl // 3),
+                id='renew_leases',
+                name='Продление аренд',
+                max_instances=1,
+                coalesce=True
+            )
+            # Повторы отложенных напоминаний, не дожидаясь следующей проверки таблицы
+            self.scheduler.add_job(
+                self.deliver_reminders,
+                'interval',
+                seconds=REMINDER_OUTBOX_POLL_SECONDS,
+                id='deliver_reminders',
+                name='Отправка напоминаний из очереди',
+                max_instances=1,
+                coalesce=True
+            )
+            
+            # Таймер напоминаний - когда Telegram готов отправлять
+            self.reminder_timer.start()
+            logger.info(f"⏰ Бот запущен. Проверка каждые {CHECK_INTERVAL_HOURS} часа(ов), "
+                        f"напоминания накануне выхода в {self.reminder_timer.send_time:%H:%M}")
+            
+            await self._stop_event.wait()
+        finally:
             logger.info("⏹️  Бот остановлен")
-            self.scheduler.shutdown()
+            if self.scheduler and self.scheduler.running:
+                self.scheduler.shutdown(wait=False)
+            await self.reminder_timer.stop()
+            sync_job = self._sync_job
+            if sync_job and not sync_job.done():
+                # Поток синхронизации пишет в базу через своё соединение: до его конца
+                # нельзя ни закрыть базу, ни отдать аренды таблиц другим репликам
+                logger.info("⏳ Ожидание синхронизации, начатой до остановки...")
+                await asyncio.wait([sync_job])
+                if sync_job.exception():
+                    logger.error(f"❌ Ошибка при проверке кандидатов: {sync_job.exception()}")
+            if self._pool:
+                self._pool.shutdown()
+            if self._leases:
+                # Другие реплики подхватят таблицы и рассылку, не дожидаясь истечения аренд
+                try:
+                    self.db.release_leases(self._leases, self.replica_id)
+                except Exception as e:
+                    logger.warning(f"⚠️ Не удалось освободить аренды: {e}")
+                self._leases.clear()
+            await self.telegram_bot.stop()
+            if self._metrics_server:
+                self._metrics_server.close()
+                await self._metrics_server.wait_closed()
+            self.db.close()
+    
+    def stop(self):
+        """Попросить запущенного бота остановиться"""
+        if self._stop_event:
+            self._stop_event.set()
+    
+    def start(self):
+        """Запустить бота"""
+        try:
+            asyncio.run(self.run())
+        except KeyboardInterrupt:
+            pass
 
 if __name__ == '__main__':
     bot = CandidateBot()
@@ -0,0 +1,321 @@
+import time
+import asyncio
+import bisect
+import functools
+import logging
+import threading
+from contextlib import contextmanager
+from config import METRICS_HOST, METRICS_PORT
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм длительности (секунды)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class _CounterValue:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class _GaugeValue(_CounterValue):
+    __slots__ = ()
+
+    def set(self, value):
+        self.value = value
+
+
+class _HistogramValue:
+    __slots__ = ('buckets', 'counts', 'sum', 'count', '_lock')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    @contextmanager
+    def time(self):
+        """Замерить длительность блока with"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+
+class Metric:
+    """Метрика с метками в духе prometheus_client: metric.labels('значение').inc()"""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        key = tuple(str(value) for value in values)
+        value = self._values.get(key)
+        if value is None:
+            with self._lock:
+                value = self._values.setdefault(key, self._new_value())
+        return value
+
+    def _new_value(self):
+        raise NotImplementedError
+
+    def items(self):
+        with self._lock:
+            return sorted(self._values.items())
+
+    def _label_text(self, key, extra=()):
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in self.items():
+            lines.append(f"{self.name}{self._label_text(key)} {_number(value.value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def _new_value(self):
+        return _CounterValue()
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def _new_value(self):
+        return _GaugeValue()
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_value(self):
+        return _HistogramValue(self.buckets)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in self.items():
+            with value._lock:
+                counts = list(value.counts)
+                total, count = value.sum, value.count
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else _number(bound)
+                lines.append(f"{self.name}_bucket{self._label_text(key, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_text(key)} {_number(total)}")
+            lines.append(f"{self.name}_count{self._label_text(key)} {count}")
+        return lines
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+CYCLES = REGISTRY.counter(
+    'candidate_bot_cycles_total', 'Циклы проверки кандидатов (ok, partial - часть листов не прочитана, error)',
+    ['result'])
+STAGE_SECONDS = REGISTRY.histogram(
+    'candidate_bot_stage_seconds', 'Длительность этапов цикла', ['stage'])
+SHEETS_API_CALLS = REGISTRY.counter(
+    'candidate_bot_sheets_api_calls_total', 'Запросы к Google API', ['method'])
+SHEETS_API_FAILURES = REGISTRY.counter(
+    'candidate_bot_sheets_api_failures_total', 'Неудачные запросы к Google API', ['method'])
+SHEETS_API_SECONDS = REGISTRY.histogram(
+    'candidate_bot_sheets_api_seconds', 'Длительность запросов к Google API', ['method'])
+SHEET_ROWS = REGISTRY.gauge(
+    'candidate_bot_sheet_candidates', 'Кандидатов на листе при последнем разборе',
+    ['spreadsheet', 'sheet'])
+SHEETS_SKIPPED = REGISTRY.counter(
+    'candidate_bot_sheets_skipped_total', 'Листы, пропущенные как неизменившиеся')
+SYNC_ROWS = REGISTRY.counter(
+    'candidate_bot_sync_rows_total', 'Строки, обработанные синхронизацией', ['change'])
+DB_SECONDS = REGISTRY.histogram(
+    'candidate_bot_db_seconds', 'Длительность операций SQLite', ['operation'])
+DB_FAILURES = REGISTRY.counter(
+    'candidate_bot_db_failures_total', 'Операции SQLite, завершившиеся ошибкой', ['operation'])
+TELEGRAM_REQUESTS = REGISTRY.counter(
+    'candidate_bot_telegram_requests_total', 'Попытки отправки в Telegram по результату', ['result'])
+TELEGRAM_SECONDS = REGISTRY.histogram(
+    'candidate_bot_telegram_request_seconds', 'Длительность запроса sendMessage')
+TELEGRAM_WEBHOOK_REQUESTS = REGISTRY.counter(
+    'candidate_bot_telegram_webhook_requests_total', 'Запросы к приёмнику webhook по HTTP-статусу', ['status'])
+LEASES_HELD = REGISTRY.gauge(
+    'candidate_bot_leases_held', 'Аренды таблиц и рассылки у этой реплики (1 - держит)', ['lease'])
+DATE_CACHE = REGISTRY.gauge(
+    'candidate_bot_date_cache', 'Кэш разобранных дат: hits, misses, size, unparseable (с запуска)', ['value'])
+REMINDERS = REGISTRY.counter(
+    'candidate_bot_reminders_total', 'Напоминания о кандидатах по результату', ['result'])
+
+
+def timed(histogram, failures, name):
+    """Декоратор: длительность вызова в histogram, исключения - в failures (метка name)"""
+    def decorator(func):
+        observed = histogram.labels(name)
+        failed = failures.labels(name)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                failed.inc()
+                raise
+            finally:
+                observed.observe(time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+def summary():
+    """Короткая сводка для команды /stats"""
+    def counter_total(metric, *key):
+        return sum(value.value for labels, value in metric.items() if labels[:len(key)] == key)
+
+    lines = [
+        f"Циклы: {counter_total(CYCLES, 'ok'):.0f} успешных, {counter_total(CYCLES, 'partial'):.0f} "
+        f"с непрочитанными листами, {counter_total(CYCLES, 'error'):.0f} с ошибкой",
+        "",
+        "Этапы (вызовов / среднее / всего, с):",
+    ]
+    for (stage,), value in STAGE_SECONDS.items():
+        average = value.sum / value.count if value.count else 0
+        lines.append(f"  {stage}: {value.count} / {average:.3f} / {value.sum:.1f}")
+
+    lines.append("")
+    lines.append("Google API (вызовов / ошибок):")
+    for (method,), value in SHEETS_API_CALLS.items():
+        lines.append(f"  {method}: {value.value:.0f} / {counter_total(SHEETS_API_FAILURES, method):.0f}")
+    lines.append(f"  пропущено неизменившихся листов: {counter_total(SHEETS_SKIPPED):.0f}")
+
+    sync_rows = ', '.join(f"{change} {value.value:.0f}" for (change,), value in SYNC_ROWS.items())
+    lines.append("")
+    lines.append(f"Синхронизация: {sync_rows or 'нет данных'}")
+    lines.append(f"Листов в последнем разборе: {len(SHEET_ROWS.items())}, "
+                 f"кандидатов: {sum(value.value for _, value in SHEET_ROWS.items()):.0f}")
+    date_cache = {key: value.value for (key,), value in DATE_CACHE.items()}
+    if date_cache:
+        lines.append(f"Кэш дат: попаданий {date_cache.get('hits', 0):.0f}, промахов {date_cache.get('misses', 0):.0f}, "
+                     f"строк в кэше {date_cache.get('size', 0):.0f}, нераспознанных {date_cache.get('unparseable', 0):.0f}")
+
+    db_failures = counter_total(DB_FAILURES)
+    db_time = sum(value.sum for _, value in DB_SECONDS.items())
+    lines.append(f"SQLite: {db_time:.2f} с суммарно, ошибок {db_failures:.0f}")
+
+    telegram = ', '.join(f"{result} {value.value:.0f}" for (result,), value in TELEGRAM_REQUESTS.items())
+    lines.append(f"Telegram: {telegram or 'нет отправок'}")
+    webhook = ', '.join(f"{status} {value.value:.0f}" for (status,), value in TELEGRAM_WEBHOOK_REQUESTS.items())
+    if webhook:
+        lines.append(f"Webhook (HTTP-статус): {webhook}")
+    lines.append(
+        f"Напоминания: отправлено {counter_total(REMINDERS, 'sent'):.0f}, "
+        f"не доставлено {counter_total(REMINDERS, 'failed'):.0f}, "
+        f"отложено для повтора {counter_total(REMINDERS, 'retry'):.0f}"
+    )
+    return '\n'.join(lines)
+
+
+async def _handle_http(reader, writer):
+    """Минимальный HTTP: GET /metrics отдаёт метрики, остальное - 404"""
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+        # Заголовки запроса не нужны, но их надо вычитать до пустой строки
+        while True:
+            line = await asyncio.wait_for(reader.readline(), timeout=5)
+            if not line or line in (b'\r\n', b'\n'):
+                break
+        parts = request_line.decode('latin-1').split()
+        if len(parts) >= 2 and parts[0] in ('GET', 'HEAD') and parts[1].split('?')[0] in ('/metrics', '/'):
+            status = '200 OK'
+            body = REGISTRY.render().encode('utf-8')
+            content_type = 'text/plain; version=0.0.4; charset=utf-8'
+        else:
+            status = '404 Not Found'
+            body = b'not found\n'
+            content_type = 'text/plain; charset=utf-8'
+        head = (
+            f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n"
+        ).encode('latin-1')
+        writer.write(head if parts and parts[0] == 'HEAD' else head + body)
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_http_server(host=METRICS_HOST, port=METRICS_PORT):
+    """Запустить HTTP-эндпоинт метрик в текущем event loop. port=0 - выключено"""
+    if not port:
+        return None
+    try:
+        server = await asyncio.start_server(_handle_http, host, port)
+    except OSError as e:
+        logger.error(f"❌ Не удалось открыть эндпоинт метрик {host}:{port}: {e}")
+        return None
+    logger.info(f"📈 Метрики Prometheus: http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,42 @@
+from collections import namedtuple
+from operator import itemgetter
+
+# Кандидат из строки таблицы. namedtuple не хранит __dict__ на каждый экземпляр,
+# поэтому на больших таблицах занимает заметно меньше памяти, чем словарь
+Candidate = namedtuple(
+    'Candidate',
+    ['id', 'name', 'object', 'start_date', 'recruiter_id', 'sheet', 'row']
+)
+
+
+class RowExtractor:
+    """Извлечение полей кандидата из строки таблицы по индексам колонок.
+
+    Индексы разрешаются один раз при создании. Строка не копируется и не
+    дополняется пустыми ячейками: Sheets API отбрасывает пустые ячейки в конце
+    строки, поэтому строка короче самой правой обязательной колонки
+    заведомо не содержит кандидата.
+    """
+
+    __slots__ = ('width', '_getter', '_recruiter', '_recruiter_inside')
+
+    def __init__(self, columns):
+        self.width = max(columns['name'], columns['object'], columns['start_date']) + 1
+        self._recruiter = columns['recruiter']
+        self._recruiter_inside = self._recruiter < self.width
+        if self._recruiter_inside:
+            self._getter = itemgetter(
+                columns['name'], columns['object'], columns['recruiter'], columns['start_date']
+            )
+        else:
+            self._getter = itemgetter(columns['name'], columns['object'], columns['start_date'])
+
+    def __call__(self, row):
+        """Вернуть (ФИО, объект, рекрутер, дата) или None, если обязательных колонок нет"""
+        if len(row) < self.width:
+            return None
+        if self._recruiter_inside:
+            return self._getter(row)
+        name, obj, date_str = self._getter(row)
+        recruiter = row[self._recruiter] if len(row) > self._recruiter else ''
+        return name, obj, recruiter, date_str
@@ -0,0 +1,145 @@
+import io
+import os
+import sys
+import pstats
+import cProfile
+import logging
+import threading
+import tracemalloc
+from datetime import datetime
+from config import PROFILE_DIR, PROFILE_CYCLES, PROFILE_SLOW_CYCLE_SECONDS, PROFILE_TOP_N
+
+logger = logging.getLogger(__name__)
+
+# До 3.12 cProfile видит только поток, где его включили, и профилировщики разных
+# потоков не мешают друг другу. С 3.12 он работает через sys.monitoring: один
+# профилировщик на интерпретатор, зато он видит все потоки сразу, а второй
+# enable() падает с ValueError
+PER_THREAD_PROFILES = sys.version_info < (3, 12)
+
+
+class CycleCapture:
+    """Профиль одного цикла: cProfile по всем потокам, где шла работа, и tracemalloc.
+
+    До Python 3.12 cProfile видит только поток, в котором его включили,
+    поэтому работа, вынесенная в asyncio.to_thread, оборачивается через
+    wrap(): её профиль собирается отдельно и складывается с профилем event
+    loop. С 3.12 профиль event loop и так охватывает все потоки, и wrap()
+    возвращает функцию без изменений (см. PER_THREAD_PROFILES).
+    """
+
+    def __init__(self, reason):
+        self.reason = reason
+        self.started_at = datetime.now()
+        self._profiles = []
+        self._lock = threading.Lock()
+        self._own_tracemalloc = not tracemalloc.is_tracing()
+        if self._own_tracemalloc:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        self._snapshot = tracemalloc.take_snapshot()
+        self._loop_profile = cProfile.Profile()
+        self._loop_profile.enable()
+
+    def wrap(self, func):
+        """Функция, которая при вызове (в любом потоке) попадёт в профиль цикла"""
+        if not PER_THREAD_PROFILES:
+            return func
+
+        def wrapper(*args, **kwargs):
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.disable()
+                with self._lock:
+                    self._profiles.append(profile)
+        return wrapper
+
+    def finish(self, elapsed, directory, top):
+        """Остановить сбор и записать отчёт. Возвращает путь к текстовому отчёту"""
+        self._loop_profile.disable()
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        if self._own_tracemalloc:
+            tracemalloc.stop()
+
+        stats = pstats.Stats(self._loop_profile)
+        for profile in self._profiles:
+            stats.add(profile)
+
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, f"cycle-{self.started_at:%Y%m%d-%H%M%S}-{self.reason}")
+        # .prof открывается pstats, snakeviz и т.п.
+        stats.dump_stats(base + '.prof')
+
+        report = io.StringIO()
+        report.write(f"Цикл: {self.started_at:%Y-%m-%d %H:%M:%S}, причина: {self.reason}, "
+                     f"длительность {elapsed:.2f} с\n")
+        report.write(f"Память (tracemalloc): пик {peak / 1024 / 1024:.1f} МБ, "
+                     f"в конце цикла {current / 1024 / 1024:.1f} МБ\n\n")
+
+        report.write(f"Прирост памяти за цикл, топ-{top}:\n")
+        for diff in snapshot.compare_to(self._snapshot, 'lineno')[:top]:
+            report.write(f"  {diff}\n")
+        report.write(f"\nУдерживаемые выделения в конце цикла, топ-{top}:\n")
+        for stat in snapshot.statistics('lineno')[:top]:
+            report.write(f"  {stat}\n")
+
+        report.write(f"\ncProfile, топ-{top * 2} по накопленному времени:\n")
+        stats.stream = report
+        stats.sort_stats('cumulative').print_stats(top * 2)
+
+        with open(base + '.txt', 'w', encoding='utf-8') as f:
+            f.write(report.getvalue())
+        return base + '.txt'
+
+
+class CycleProfiler:
+    """Профилирование циклов проверки по запросу.
+
+    arm(n) включает сбор на следующие n циклов (из PROFILE_CYCLES при старте
+    или командой /profile). Цикл дольше slow_threshold секунд сам взводит
+    профилирование следующего цикла: медленный цикл уже прошёл, но причина
+    обычно повторяется.
+    """
+
+    def __init__(self, directory=PROFILE_DIR, cycles=PROFILE_CYCLES,
+                 slow_threshold=PROFILE_SLOW_CYCLE_SECONDS, top=PROFILE_TOP_N):
+        self.directory = directory
+        self.slow_threshold = slow_threshold
+        self.top = max(1, top)
+        self.remaining = max(0, cycles)
+        self.reason = 'env'
+        self.last_report = None
+
+    def arm(self, cycles=1, reason='admin'):
+        self.remaining = max(self.remaining, cycles)
+        self.reason = reason
+        logger.info(f"🔬 Профилирование включено на {self.remaining} цикл(ов), причина: {reason}")
+
+    def begin(self):
+        """Начать сбор, если он взведён. Возвращает CycleCapture или None"""
+        if self.remaining <= 0:
+            return None
+        self.remaining -= 1
+        return CycleCapture(self.reason)
+
+    def end(self, capture, elapsed):
+        """Закончить цикл: записать отчёт и проверить порог медленного цикла"""
+        if capture:
+            try:
+                self.last_report = capture.finish(elapsed, self.directory, self.top)
+                logger.info(f"🔬 Профиль цикла записан: {self.last_report}")
+            except Exception as e:
+                logger.error(f"❌ Не удалось записать профиль цикла: {e}")
+        # Профилированный цикл сам по себе медленнее, поэтому порог проверяется
+        # только для обычных - иначе один медленный цикл профилировал бы все следующие
+        if capture is None and self.slow_threshold and elapsed > self.slow_threshold and self.remaining <= 0:
+            logger.warning(f"🐢 Цикл занял {elapsed:.1f} с (порог {self.slow_threshold:g} с), "
+                           f"следующий цикл будет профилирован")
+            self.arm(1, reason='slow')
+
+    def wrap(self, capture, func):
+        return capture.wrap(func) if capture else func
@@ -0,0 +1,94 @@
+import bisect
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+# callback_data кнопок выбора: в кнопке только короткий числовой id справочника
+# (лимит callback_data - 64 байта, а кириллическое имя занимает 2 байта на букву)
+SELECT_PREFIX = 'rs:'
+PAGE_PREFIX = 'rp:'
+# Кнопка с номером страницы ничего не делает
+NOOP_DATA = 'rp:-'
+# Формат кнопок до появления справочника: recruiter_<имя>
+LEGACY_PREFIX = 'recruiter_'
+
+
+def normalize(text):
+    """Строка для поиска: без регистра, ё = е, одиночные пробелы"""
+    return ' '.join(text.lower().replace('ё', 'е').split())
+
+
+class RecruiterIndex:
+    """Поиск по справочнику рекрутеров.
+
+    Строится из списка (id, имя) Database.get_recruiter_directory(). Каждое
+    слово имени лежит в отсортированном списке, поэтому поиск по началу
+    фамилии или имени - это bisect, а не перебор всех имён. Если по началу
+    слов ничего не нашлось, запрос ищется как подстрока.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        # Порядок по нормализованному имени: при бинарном ORDER BY в SQLite «Ё» идёт раньше «А»
+        self.entries = sorted(directory, key=lambda entry: normalize(entry[1]))
+        self._names = [normalize(name) for _, name in self.entries]
+        words = sorted(
+            (word, position)
+            for position, name in enumerate(self._names)
+            for word in set(name.split())
+        )
+        self._words = [word for word, _ in words]
+        self._positions = [position for _, position in words]
+        self._by_name = {name: self.entries[p][1] for p, name in enumerate(self._names)}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def find_name(self, name):
+        """Имя из справочника, совпадающее с name после normalize(), или None"""
+        return self._by_name.get(normalize(name))
+
+    def search(self, text):
+        """Все записи (id, имя), подходящие под запрос, по алфавиту.
+
+        Первое слово запроса ищется как начало любого слова имени, остальные
+        слова - как подстроки имени. Если совпадений по началу слов нет,
+        весь запрос ищется как подстрока.
+        """
+        query = normalize(text)
+        if not query:
+            return []
+        first, *rest = query.split()
+
+        positions = set()
+        index = bisect.bisect_left(self._words, first)
+        while index < len(self._words) and self._words[index].startswith(first):
+            positions.add(self._positions[index])
+            index += 1
+        positions = [p for p in positions if all(word in self._names[p] for word in rest)]
+
+        if not positions:
+            positions = [p for p, name in enumerate(self._names) if query in name]
+        return [self.entries[p] for p in sorted(positions)]
+
+
+def page_count(total, page_size):
+    return max(1, -(-total // page_size))
+
+
+def picker_keyboard(entries, page, page_size):
+    """Клавиатура одной страницы выбора рекрутера. Возвращает (клавиатура, страница, страниц)"""
+    pages = page_count(len(entries), page_size)
+    page = min(max(0, page), pages - 1)
+    start = page * page_size
+    rows = [
+        [InlineKeyboardButton(name, callback_data=f"{SELECT_PREFIX}{recruiter_id}")]
+        for recruiter_id, name in entries[start:start + page_size]
+    ]
+    if pages > 1:
+        navigation = []
+        if page > 0:
+            navigation.append(InlineKeyboardButton("◀️", callback_data=f"{PAGE_PREFIX}{page - 1}"))
+        navigation.append(InlineKeyboardButton(f"{page + 1}/{pages}", callback_data=NOOP_DATA))
+        if page < pages - 1:
+            navigation.append(InlineKeyboardButton("▶️", callback_data=f"{PAGE_PREFIX}{page + 1}"))
+        rows.append(navigation)
+    return InlineKeyboardMarkup(rows), page, pages
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+from datetime import datetime, date, time as dt_time, timedelta
+from config import REMINDER_SEND_TIME
+
+logger = logging.getLogger(__name__)
+
+# Дольше этого таймер не спит даже без дел: страховка от перевода часов и смены суток
+MAX_SLEEP_SECONDS = 3600
+
+
+def parse_send_time(value):
+    """Время отправки ЧЧ:ММ; при ошибке в настройке - 09:00"""
+    try:
+        return datetime.strptime(value.strip(), '%H:%M').time()
+    except (AttributeError, ValueError):
+        logger.error(f"❌ Неверное REMINDER_SEND_TIME '{value}', используется 09:00")
+        return dt_time(9, 0)
+
+
+class ReminderTimer:
+    """Таймер напоминаний: будит рассылку к моменту, когда она нужна.
+
+    Напоминание о выходе кандидата в день D отправляется накануне, в
+    send_time по местному времени. Очередь сроков - это сами ожидающие
+    кандидаты: частичный индекс idx_candidates_due упорядочивает их по дате
+    выхода, так что ближайший срок - один запрос, а не перебор кандидатов.
+
+    Таймер спит до ближайшего срока и вызывает callback (проверку напоминаний).
+    notify() будит его раньше: синхронизация нашла изменённые строки или
+    зарегистрировался рекрутер - ближайший срок мог сдвинуться, а уже
+    наступивший срок на завтра нужно проверить ещё раз.
+    """
+
+    def __init__(self, database, callback, send_time=REMINDER_SEND_TIME):
+        self.db = database
+        self.callback = callback
+        self.send_time = parse_send_time(send_time) if isinstance(send_time, str) else send_time
+        self._changed = None
+        self._task = None
+        # Дата выхода, напоминания о которой уже проверены после наступления срока
+        self._handled = None
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def send_at(self, start_date):
+        """Когда отправлять напоминание о выходе в start_date"""
+        return datetime.combine(start_date - timedelta(days=1), self.send_time)
+
+    def next_deadline(self, now=None):
+        """Ближайший срок отправки (datetime) или None, если ждать нечего"""
+        now = now or datetime.now()
+        tomorrow = now.date() + timedelta(days=1)
+        # Завтрашний срок после проверки снова рассматривается только после notify()
+        after = tomorrow if self._handled == tomorrow else now.date()
+        next_date = self.db.get_next_reminder_date(after.isoformat())
+        if not next_date:
+            return None
+        try:
+            deadline = self.send_at(date.fromisoformat(next_date))
+        except ValueError:
+            logger.warning(f"⚠️ Непонятная дата выхода в очереди напоминаний: {next_date}")
+            return None
+        return max(now, deadline)
+
+    def notify(self):
+        """Строки кандидатов или рекрутеры изменились - пересчитать срок"""
+        self._handled = None
+        if self._changed:
+            self._changed.set()
+
+    def start(self):
+        """Запустить таймер в текущем event loop"""
+        self._changed = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        return self._task
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            self._changed.clear()
+            try:
+                deadline = self.next_deadline()
+            except Exception as e:
+                logger.error(f"❌ Ошибка при расчёте срока напоминаний: {e}")
+                deadline = None
+
+            if deadline is None:
+                timeout = MAX_SLEEP_SECONDS
+            else:
+                timeout = min(MAX_SLEEP_SECONDS, (deadline - datetime.now()).total_seconds())
+                if timeout > 0:
+                    logger.info(f"⏰ Следующая проверка напоминаний: {deadline:%Y-%m-%d %H:%M}")
+
+            if timeout > 0:
+                try:
+                    await asyncio.wait_for(self._changed.wait(), timeout)
+                    continue
+                except asyncio.TimeoutError:
+                    pass
+
+            now = datetime.now()
+            if deadline is None or now < deadline:
+                continue
+            # Все ожидающие кандидаты с выходом завтра проверяются за один вызов
+            self._handled = now.date() + timedelta(days=1)
+            await self.callback()
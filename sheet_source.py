@@ -0,0 +1,367 @@
+import os
+import csv
+import time
+import random
+import logging
+import metrics
+from datetime import date, datetime, timedelta
+from config import (
+    COLUMNS, SHEET_SOURCE, GOOGLE_SHEETS_IDS, LOCAL_SHEETS_PATH, LOG_ROW_SAMPLE_EVERY,
+    SYNTHETIC_TABS, SYNTHETIC_ROWS, SYNTHETIC_SEED
+)
+from dates import normalize_date
+from models import Candidate, RowExtractor
+from sync import row_identity, candidate_key
+
+logger = logging.getLogger(__name__)
+
+# Ширина строки данных: колонки A..Q, как в диапазоне Google Sheets
+ROW_WIDTH = 17
+
+
+class SheetSource:
+    """Источник листов с кандидатами.
+
+    Наследник реализует get_all_sheets() и _iter_rows(): разбор строк,
+    стабильные ID кандидатов и выдача по листам общие для всех источников,
+    поэтому синхронизация (sync.SheetSync) не знает, откуда пришли данные.
+
+    spreadsheet_id - ID таблицы, если источник их различает (Google Sheets):
+    ID кандидатов тогда получают префикс namespace, а синхронизация ведётся
+    отдельно по каждой таблице.
+    """
+
+    def __init__(self):
+        self.skipped_sheets = []
+        self.spreadsheet_id = None
+        self.namespace = None
+
+    def get_all_sheets(self, force_refresh=False):
+        """Список имён листов"""
+        raise NotImplementedError
+
+    def _iter_rows(self, sheet_name):
+        """Выдавать (номер строки, строка) листа без заголовка; строка - список строк"""
+        raise NotImplementedError
+
+    def invalidate_sheets_cache(self):
+        """Сбросить кэш списка листов, если он есть"""
+
+    def commit_fingerprints(self, failed_sheets=(), listed_sheets=None):
+        """Сохранить отпечатки прочитанных листов (если источник их ведёт)"""
+
+    def iter_sheet_candidates(self, sheet_names=None, skip_unchanged=True):
+        """Выдавать пары (имя листа, генератор кандидатов).
+
+        Ошибка чтения листа выбрасывается при итерации по его кандидатам.
+        """
+        self.skipped_sheets = []
+        if not sheet_names:
+            sheet_names = self.get_all_sheets()
+
+        if not sheet_names:
+            logger.error("Листы не найдены в таблице")
+            return
+
+        for sheet_name in sheet_names:
+            logger.debug("Чтение кандидатов с листа: %s", sheet_name)
+            yield sheet_name, self._iter_parse_rows(sheet_name, self._iter_rows(sheet_name))
+
+    # Индексы колонок разрешаются один раз, а не на каждой строке
+    _extract = RowExtractor(COLUMNS)
+
+    def _parse_rows(self, sheet_name, values):
+        """Разобрать строки листа в список кандидатов"""
+        return list(self._iter_parse_rows(sheet_name, enumerate(values, 2)))
+
+    def _iter_parse_rows(self, sheet_name, rows):
+        """Разобрать строки листа. rows - пары (номер строки, строка), результат - генератор кандидатов"""
+        count = 0
+        skipped = 0
+        seen_ids = set()
+        parse_row = self._parse_row
+        clock = time.perf_counter
+        # Время считается только на сам разбор, без чтения строк и работы потребителя
+        parse_time = 0.0
+        # Построчная запись строится только на DEBUG, и то для каждой N-й строки
+        log_rows = logger.isEnabledFor(logging.DEBUG)
+
+        for row_number, row in rows:
+            started = clock()
+            candidate = parse_row(sheet_name, row_number, row, seen_ids)
+            parse_time += clock() - started
+            if candidate is None:
+                skipped += 1
+                continue
+            count += 1
+            if log_rows and count % LOG_ROW_SAMPLE_EVERY == 0:
+                logger.debug("  ✓ %s | %s | %s", candidate.name, candidate.object, candidate.start_date)
+            yield candidate
+
+        metrics.STAGE_SECONDS.labels('parse').observe(parse_time)
+        # Одноимённые листы разных таблиц - разные серии
+        metrics.SHEET_ROWS.labels(self.spreadsheet_id or '', sheet_name).set(count)
+        logger.info(f"Лист '{sheet_name}': загружено {count} кандидатов, пропущено строк {skipped} "
+                    f"({parse_time:.2f} с)")
+
+    def _parse_row(self, sheet_name, row_number, row, seen_ids):
+        """Кандидат из строки листа или None, если строка неполная или с нераспознанной датой.
+
+        seen_ids - хэши ID, уже выданных на этом листе (для нумерации дубликатов).
+        """
+        fields = self._extract(row)
+        if fields is None:
+            return None
+
+        try:
+            name, obj, recruiter, date_str = fields
+            name = name.strip()
+            obj = obj.strip()
+            date_str = date_str.strip()
+
+            # Пропустить пустые строки
+            if not name or not obj or not date_str:
+                return None
+
+            # Парсить дату
+            parsed_date = normalize_date(date_str)
+            if not parsed_date:
+                return None
+
+            # Создать стабильный ID кандидата (не зависит от номера строки);
+            # полные дубликаты на листе получают следующий порядковый номер
+            identity = row_identity(name, obj)
+            ordinal = 0
+            namespace = self.namespace
+            candidate_id = candidate_key(sheet_name, identity, ordinal, namespace)
+            # Запоминаем не саму строку ID, а её 64-битный хэш-суффикс (он однозначен
+            # в пределах листа): так лист не удерживает в памяти все ID разом
+            digest = int(candidate_id[-16:], 16)
+            while digest in seen_ids:
+                ordinal += 1
+                candidate_id = candidate_key(sheet_name, identity, ordinal, namespace)
+                digest = int(candidate_id[-16:], 16)
+            seen_ids.add(digest)
+
+            recruiter = recruiter.strip()
+            return Candidate(
+                candidate_id, name, obj, parsed_date, recruiter or None, sheet_name, row_number
+            )
+
+        except ValueError as e:
+            # Только ошибки данных строки: ошибка в коде не должна выглядеть как пропущенная строка
+            logger.debug("Ошибка при обработке строки %s: %s", row_number, e)
+            return None
+
+
+def _trim_row(row):
+    """Привести строку к виду ответа Sheets API: не шире A..Q, без пустых ячеек в конце"""
+    row = row[:ROW_WIDTH]
+    end = len(row)
+    while end and not row[end - 1]:
+        end -= 1
+    return row[:end]
+
+
+def _cell_text(value):
+    """Значение ячейки XLSX в виде текста, как его показывает таблица"""
+    if value is None:
+        return ''
+    if isinstance(value, (datetime, date)):
+        return value.strftime('%d.%m.%Y')
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class LocalSheetSource(SheetSource):
+    """Листы из локальных файлов - для разработки и тестов без доступа к Google.
+
+    path - папка с CSV (каждый файл - лист с именем файла без расширения),
+    один CSV-файл или книга XLSX (каждый лист книги - лист таблицы). Первая
+    строка каждого листа - заголовок, как и в Google Sheets. Для XLSX нужен
+    openpyxl; он импортируется только при чтении книги.
+    """
+
+    def __init__(self, path=LOCAL_SHEETS_PATH):
+        super().__init__()
+        self.path = path
+        self._files = {}
+
+    def get_all_sheets(self, force_refresh=False):
+        """Список листов: файлы CSV в папке или листы книги XLSX"""
+        path = self.path
+        self._files = {}
+        if not path or not os.path.exists(path):
+            logger.error(f"❌ Путь к локальным листам не найден: {path}")
+            return []
+
+        if os.path.isdir(path):
+            for file_name in sorted(os.listdir(path)):
+                stem, ext = os.path.splitext(file_name)
+                if ext.lower() == '.csv':
+                    self._files[stem] = os.path.join(path, file_name)
+            return list(self._files)
+
+        stem, ext = os.path.splitext(os.path.basename(path))
+        if ext.lower() == '.xlsx':
+            workbook = self._open_workbook()
+            try:
+                return list(workbook.sheetnames)
+            finally:
+                workbook.close()
+        self._files[stem] = path
+        return [stem]
+
+    def _iter_rows(self, sheet_name):
+        if self.path.lower().endswith('.xlsx'):
+            return self._iter_xlsx_rows(sheet_name)
+        if sheet_name not in self._files:
+            self.get_all_sheets()
+        return self._iter_csv_rows(self._files[sheet_name])
+
+    def _iter_csv_rows(self, file_path):
+        with open(file_path, newline='', encoding='utf-8-sig') as f:
+            sample = f.read(4096)
+            f.seek(0)
+            try:
+                dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+            except csv.Error:
+                dialect = csv.excel
+            reader = csv.reader(f, dialect)
+            next(reader, None)
+            for row_number, row in enumerate(reader, 2):
+                yield row_number, _trim_row(row)
+
+    def _iter_xlsx_rows(self, sheet_name):
+        workbook = self._open_workbook()
+        try:
+            worksheet = workbook[sheet_name]
+            rows = worksheet.iter_rows(min_row=2, max_col=ROW_WIDTH, values_only=True)
+            for row_number, values in enumerate(rows, 2):
+                yield row_number, _trim_row([_cell_text(value) for value in values])
+        finally:
+            workbook.close()
+
+    def _open_workbook(self):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise RuntimeError("Для чтения XLSX установите openpyxl: pip install openpyxl")
+        # read_only читает лист потоком, data_only отдаёт значения формул, а не сами формулы
+        return load_workbook(self.path, read_only=True, data_only=True)
+
+
+class SyntheticSheetSource(SheetSource):
+    """Сгенерированная таблица из tabs листов по rows строк - для нагрузочных проверок.
+
+    Строки не хранятся, а генерируются заново при каждом чтении и зависят только
+    от seed, поэтому повторное чтение даёт те же данные. Даты разбросаны вокруг
+    base_date (часть приходится на завтра) и записаны в разных форматах, часть
+    строк неполная или с нераспознаваемой датой - как в реальной таблице.
+    advance() имитирует правки таблицы между циклами.
+    """
+
+    FIRST_NAMES = (
+        'Иван', 'Пётр', 'Алексей', 'Сергей', 'Дмитрий', 'Андрей', 'Михаил', 'Николай',
+        'Анна', 'Мария', 'Елена', 'Ольга', 'Наталья', 'Ирина', 'Татьяна', 'Светлана',
+    )
+    LAST_NAMES = (
+        'Иванов', 'Петров', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев', 'Соколов', 'Михайлов',
+        'Новиков', 'Фёдоров', 'Морозов', 'Волков', 'Алексеев', 'Лебедев', 'Семёнов', 'Егоров',
+    )
+    OBJECTS = (
+        'Склад Подольск', 'Склад Химки', 'ТЦ Мега', 'Офис Сити', 'Завод Север',
+        'Магазин 12', 'Магазин 47', 'Логистический центр', 'Кафе Центр', 'Стройка Юг',
+    )
+
+    def __init__(self, tabs=SYNTHETIC_TABS, rows=SYNTHETIC_ROWS, seed=SYNTHETIC_SEED,
+                 recruiters=40, base_date=None, spread_days=60):
+        super().__init__()
+        self.tabs = max(1, tabs)
+        self.rows = max(0, rows)
+        self.seed = seed
+        self.base_date = base_date or date.today()
+        self.spread_days = max(1, spread_days)
+        self.recruiter_names = [self._recruiter_name(i) for i in range(max(1, recruiters))]
+        self.revision = 0
+        # (лист, строка) -> ревизия, в которой строка правилась последний раз
+        self._edits = {}
+
+    def _recruiter_name(self, index):
+        """Уникальное имя рекрутера номер index"""
+        last = self.LAST_NAMES[index % len(self.LAST_NAMES)]
+        cycle, first = divmod(index // len(self.LAST_NAMES), len(self.FIRST_NAMES))
+        name = f"{last} {self.FIRST_NAMES[first]}"
+        return f"{name} {cycle + 1}" if cycle else name
+
+    def sheet_names(self):
+        return [f"Лист {tab + 1}" for tab in range(self.tabs)]
+
+    def get_all_sheets(self, force_refresh=False):
+        return self.sheet_names()
+
+    def advance(self, changes=20):
+        """Следующая ревизия таблицы: у changes случайных строк сдвигается дата выхода"""
+        self.revision += 1
+        rng = random.Random(self.seed * 7919 + self.revision)
+        for _ in range(min(changes, self.tabs * self.rows)):
+            self._edits[(rng.randrange(self.tabs), rng.randrange(self.rows) + 2)] = self.revision
+        return self.revision
+
+    def _iter_rows(self, sheet_name):
+        tab = int(sheet_name.rsplit(' ', 1)[-1]) - 1
+        if not 0 <= tab < self.tabs:
+            raise KeyError(sheet_name)
+        for row_number in range(2, self.rows + 2):
+            yield row_number, self.make_row(tab, row_number)
+
+    def make_row(self, tab, row_number):
+        """Строка листа tab (с нуля) с номером row_number"""
+        rng = random.Random((self.seed * 1000003 + tab) * 10000019 + row_number)
+        name = f"{rng.choice(self.LAST_NAMES)} {rng.choice(self.FIRST_NAMES)} {tab}-{row_number}"
+        obj = rng.choice(self.OBJECTS)
+        recruiter = self.recruiter_names[rng.randrange(len(self.recruiter_names))]
+        offset = rng.randint(-self.spread_days, self.spread_days)
+        offset += self._edits.get((tab, row_number), 0)
+        start = self.base_date + timedelta(days=offset)
+
+        roll = rng.random()
+        if roll < 0.70:
+            date_str = start.strftime('%d.%m.%Y')
+        elif roll < 0.85:
+            date_str = start.isoformat()
+        elif roll < 0.90:
+            date_str = f"{start.day}.{start.month}.{start.year}"
+        elif roll < 0.94:
+            date_str = start.strftime('%d/%m/%Y')
+        elif roll < 0.97:
+            date_str = start.strftime('%m.%y')
+        elif roll < 0.985:
+            date_str = 'уточняется'
+        else:
+            date_str = ''
+
+        row = [''] * ROW_WIDTH
+        row[COLUMNS['name']] = name
+        row[COLUMNS['object']] = obj
+        row[COLUMNS['recruiter']] = recruiter if roll < 0.99 else ''
+        row[COLUMNS['start_date']] = date_str
+        return _trim_row(row)
+
+
+def create_sheet_sources(database=None, kind=SHEET_SOURCE, spreadsheet_ids=GOOGLE_SHEETS_IDS):
+    """Источники листов по настройке SHEET_SOURCE: google (по одному на таблицу GOOGLE_SHEETS_IDS), local или synthetic"""
+    if kind == 'local':
+        logger.info(f"📁 Источник листов: локальные файлы ({LOCAL_SHEETS_PATH})")
+        return [LocalSheetSource()]
+    if kind == 'synthetic':
+        logger.info(f"🧪 Источник листов: синтетические данные ({SYNTHETIC_TABS} x {SYNTHETIC_ROWS})")
+        return [SyntheticSheetSource()]
+    if kind != 'google':
+        raise ValueError(f"Неизвестный источник листов: {kind}")
+    # Импорт здесь: google_sheets сам зависит от этого модуля
+    from google_sheets import GoogleSheetsAPI
+    if len(spreadsheet_ids) > 1:
+        logger.info(f"📚 Таблиц Google Sheets: {len(spreadsheet_ids)}")
+    return [GoogleSheetsAPI(spreadsheet_id, database=database) for spreadsheet_id in spreadsheet_ids]
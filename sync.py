@@ -0,0 +1,215 @@
+import hashlib
+import logging
+from config import SYNC_BATCH_SIZE, LOG_ROW_SAMPLE_EVERY
+
+logger = logging.getLogger(__name__)
+
+
+def row_identity(name, obj):
+    """Нормализованная пара (ФИО, объект), по которой строка узнаётся между синхронизациями"""
+    return (' '.join(name.split()).casefold(), ' '.join(obj.split()).casefold())
+
+
+def spreadsheet_namespace(spreadsheet_id):
+    """Короткий префикс ID кандидатов таблицы: одноимённые листы разных таблиц не пересекаются"""
+    return hashlib.sha1(spreadsheet_id.encode('utf-8')).hexdigest()[:8]
+
+
+def candidate_key(sheet_name, identity, ordinal=0, namespace=None):
+    """Стабильный ID кандидата.
+
+    Не зависит от номера строки, поэтому вставка строки выше не меняет ID
+    остальных кандидатов. ordinal различает полные дубликаты (ФИО, объект)
+    на одном листе в порядке их следования. namespace - префикс таблицы
+    (spreadsheet_namespace); без него ID имеет прежний вид.
+    """
+    raw = '\x1f'.join((identity[0], identity[1], str(ordinal)))
+    digest = hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+    if namespace:
+        return f"{namespace}:{sheet_name}_{digest}"
+    return f"{sheet_name}_{digest}"
+
+
+def content_hash(name, obj, start_date, recruiter_id):
+    """Хэш содержимого строки: меняется при любом изменении отслеживаемых полей"""
+    raw = '\x1f'.join((name, obj, start_date, recruiter_id or ''))
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class SyncResult:
+    """Итог одной синхронизации: ID вставленных, изменённых и удалённых строк"""
+
+    def __init__(self):
+        self.inserted = []
+        self.updated = []
+        self.deleted = []
+        self.unchanged = 0
+        self.sheets = 0
+        self.failed_sheets = []
+        self.recruiters = set()
+
+    @property
+    def total(self):
+        """Число кандидатов в прочитанных листах"""
+        return len(self.inserted) + len(self.updated) + self.unchanged
+
+    @property
+    def changed(self):
+        return len(self.inserted) + len(self.updated) + len(self.deleted)
+
+    def merge(self, other):
+        """Добавить итог синхронизации другой таблицы"""
+        self.inserted.extend(other.inserted)
+        self.updated.extend(other.updated)
+        self.deleted.extend(other.deleted)
+        self.unchanged += other.unchanged
+        self.sheets += other.sheets
+        self.failed_sheets.extend(other.failed_sheets)
+        self.recruiters |= other.recruiters
+        return self
+
+    def __str__(self):
+        return (
+            f"листов: {self.sheets}, новых: {len(self.inserted)}, "
+            f"изменённых: {len(self.updated)}, удалённых: {len(self.deleted)}, "
+            f"без изменений: {self.unchanged}"
+        )
+
+
+class SheetSync:
+    """Инкрементальная синхронизация строк таблицы с базой данных.
+
+    Хранит в памяти снимок состояния базы (candidate_id -> хэш строки),
+    сравнивает с ним каждую выгрузку и применяет к базе только разницу.
+    Снимок читается из базы один раз при первой синхронизации.
+
+    spreadsheet - ID таблицы: снимок, удаления и записи ограничены её
+    кандидатами, так что у каждой таблицы свой SheetSync. adopt_legacy -
+    перед первой загрузкой снимка забрать кандидатов без таблицы (записанных
+    до поддержки нескольких таблиц), переведя их ID на префикс этой таблицы.
+    """
+
+    def __init__(self, database, batch_size=SYNC_BATCH_SIZE, spreadsheet=None, adopt_legacy=False):
+        self.db = database
+        self.batch_size = max(1, batch_size)
+        self.spreadsheet = spreadsheet
+        self.adopt_legacy = adopt_legacy and spreadsheet is not None
+        self._hashes = None
+        self._by_sheet = None
+
+    def _load_state(self):
+        """Загрузить снимок живых строк из базы"""
+        if self.adopt_legacy:
+            adopted = self.db.adopt_legacy_candidates(self.spreadsheet, spreadsheet_namespace(self.spreadsheet))
+            if adopted:
+                logger.info(f"🔄 Кандидаты, загруженные до поддержки нескольких таблиц, "
+                            f"отнесены к таблице {self.spreadsheet}: {adopted}")
+            self.adopt_legacy = False
+        self._hashes = {}
+        self._by_sheet = {}
+        for candidate_id, sheet_name, row_hash in self.db.get_sync_state(self.spreadsheet):
+            self._hashes[candidate_id] = row_hash
+            self._by_sheet.setdefault(sheet_name, set()).add(candidate_id)
+
+    def reset(self):
+        """Сбросить снимок: при следующей синхронизации он будет перечитан из базы"""
+        self._hashes = None
+        self._by_sheet = None
+
+    def sync(self, sheets, listed_sheets=None):
+        """Синхронизировать листы с базой.
+
+        sheets - пары (имя листа, кандидаты models.Candidate) только для успешно
+        прочитанных листов; кандидаты могут быть генератором. Изменения пишутся
+        в базу пачками по batch_size строк, так что память не растёт с размером
+        листа. Если итерация по кандидатам листа падает, уже записанные строки
+        остаются, но удаление строк этого листа пропускается. listed_sheets -
+        полный список листов таблицы: строки листов, которых в нём больше нет,
+        удаляются.
+        """
+        if self._hashes is None:
+            self._load_state()
+
+        result = SyncResult()
+        pending = []
+        deletes = []
+
+        try:
+            for sheet_name, candidates in sheets:
+                result.sheets += 1
+                live = self._by_sheet.setdefault(sheet_name, set())
+                # Копия ссылается на уже загруженные строки ID; по мере чтения листа из неё
+                # вычёркиваются найденные строки, и в конце в ней остаются удалённые
+                missing = set(live)
+                new_ids = []
+                recruiters = result.recruiters
+                try:
+                    for candidate in candidates:
+                        candidate_id = candidate.id
+                        if candidate.recruiter_id:
+                            recruiters.add(candidate.recruiter_id)
+                        row_hash = content_hash(
+                            candidate.name, candidate.object, candidate.start_date, candidate.recruiter_id
+                        )
+                        previous = self._hashes.get(candidate_id)
+                        if previous is None:
+                            new_ids.append(candidate_id)
+                        else:
+                            missing.discard(candidate_id)
+                            if previous == row_hash:
+                                result.unchanged += 1
+                                continue
+                        pending.append((candidate, row_hash, previous is None))
+                        if len(pending) >= self.batch_size:
+                            self._flush(pending, result)
+                            pending = []
+                except Exception as e:
+                    logger.error(f"❌ Ошибка при чтении листа '{sheet_name}': {e}")
+                    result.failed_sheets.append(sheet_name)
+                    # Лист прочитан не полностью: ничего не удаляем, только запоминаем новые строки
+                    live.update(new_ids)
+                    continue
+
+                live -= missing
+                live.update(new_ids)
+                deletes.extend(missing)
+                if not live:
+                    del self._by_sheet[sheet_name]
+
+            if listed_sheets:
+                listed = set(listed_sheets)
+                for sheet_name in [name for name in self._by_sheet if name not in listed]:
+                    deletes.extend(self._by_sheet.pop(sheet_name))
+
+            if pending:
+                self._flush(pending, result)
+            if deletes:
+                self.db.delete_candidates(deletes)
+                for candidate_id in deletes:
+                    self._hashes.pop(candidate_id, None)
+                result.deleted = deletes
+        except Exception:
+            # Состояние базы неизвестно - перечитаем снимок в следующий раз
+            self.reset()
+            raise
+
+        return result
+
+    def _flush(self, pending, result):
+        """Записать пачку новых и изменённых строк одной транзакцией"""
+        inserted, updated = self.db.upsert_candidates(
+            (candidate for candidate, _, _ in pending), spreadsheet=self.spreadsheet
+        )
+        logger.debug("💾 Записано в базу: новых %s, обновлённых %s", inserted, updated)
+        # Итог по всем пачкам пишется одной строкой в конце цикла (SyncResult),
+        # по кандидатам - только на DEBUG и с выборкой
+        log_rows = logger.isEnabledFor(logging.DEBUG)
+        for candidate, row_hash, is_new in pending:
+            self._hashes[candidate.id] = row_hash
+            if is_new:
+                result.inserted.append(candidate.id)
+                if log_rows and len(result.inserted) % LOG_ROW_SAMPLE_EVERY == 0:
+                    logger.debug("✅ Добавлен новый кандидат: %s (рекрутер: %s)",
+                                 candidate.name, candidate.recruiter_id or 'не указан')
+            else:
+                result.updated.append(candidate.id)
@@ -1,22 +1,174 @@
 import asyncio
-from telegram import Bot, Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes
-from config import TELEGRAM_BOT_TOKEN, TELEGRAM_RECRUITER_CHAT_ID
+import html
+import random
+import secrets
+import time
+from urllib.parse import urlparse
+from telegram import Bot, Update
+from telegram.error import BadRequest, NetworkError, RetryAfter
+from telegram.ext import (
+    Application, CommandHandler, CallbackQueryHandler, MessageHandler, ContextTypes, filters
+)
+from config import (
+    TELEGRAM_BOT_TOKEN, TELEGRAM_RECRUITER_CHAT_ID,
+    TELEGRAM_GLOBAL_RATE, TELEGRAM_PER_CHAT_RATE, TELEGRAM_SEND_CONCURRENCY,
+    TELEGRAM_SEND_MAX_ATTEMPTS, TELEGRAM_RETRY_BASE_DELAY, TELEGRAM_ADMIN_CHAT_IDS,
+    TELEGRAM_PICKER_PAGE_SIZE, TELEGRAM_UPDATE_MODE, TELEGRAM_WEBHOOK_URL, TELEGRAM_WEBHOOK_HOST,
+    TELEGRAM_WEBHOOK_PORT, TELEGRAM_WEBHOOK_SECRET, TELEGRAM_WEBHOOK_CONCURRENCY,
+    TELEGRAM_WEBHOOK_POLLING_FALLBACK
+)
+from recruiter_picker import (
+    RecruiterIndex, picker_keyboard, SELECT_PREFIX, PAGE_PREFIX, NOOP_DATA, LEGACY_PREFIX
+)
+from webhook import WebhookServer
 import logging
+import metrics
 
 logger = logging.getLogger(__name__)
 
+# Максимальная длина текста сообщения в Telegram
+MESSAGE_LIMIT = 4096
+# Попыток set_webhook при сетевых сбоях; пауза между ними растёт вдвое
+WEBHOOK_SETUP_ATTEMPTS = 3
+WEBHOOK_SETUP_RETRY_DELAY = 2
+
+class TokenBucket:
+    """Token bucket для asyncio: rate токенов в секунду, не больше capacity подряд"""
+    
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+    
+    async def acquire(self):
+        """Дождаться и забрать один токен"""
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class RateLimiter:
+    """Ограничитель отправки: общий лимит бота и отдельный лимит на каждый чат.
+    
+    После RetryAfter от Telegram все отправки приостанавливаются на указанное время.
+    """
+    
+    def __init__(self, global_rate=TELEGRAM_GLOBAL_RATE, per_chat_rate=TELEGRAM_PER_CHAT_RATE):
+        self.per_chat_rate = per_chat_rate
+        self._global = TokenBucket(global_rate, capacity=max(1, int(global_rate)))
+        self._chats = {}
+        self._paused_until = 0.0
+    
+    def pause(self, seconds):
+        """Приостановить все отправки на seconds секунд"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+    
+    async def acquire(self, chat_id):
+        """Дождаться разрешения на отправку в chat_id"""
+        await self.acquire_chat(chat_id)
+        await self.acquire_global()
+    
+    async def acquire_chat(self, chat_id):
+        """Дождаться токена лимита чата chat_id"""
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = self._chats[chat_id] = TokenBucket(self.per_chat_rate)
+        await bucket.acquire()
+    
+    async def acquire_global(self):
+        """Дождаться конца паузы после RetryAfter и токена общего лимита"""
+        while True:
+            delay = self._paused_until - time.monotonic()
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+        await self._global.acquire()
+
+
+class DeliveryResult:
+    """Результат отправки одного сообщения"""
+    
+    __slots__ = ('key', 'chat_id', 'success', 'attempts', 'error')
+    
+    def __init__(self, key, chat_id, success, attempts, error=None):
+        self.key = key
+        self.chat_id = chat_id
+        self.success = success
+        self.attempts = attempts
+        self.error = error
+    
+    @property
+    def retryable(self):
+        """Ошибка временная (сеть, flood control) - отправку стоит повторить позже"""
+        if self.success or isinstance(self.error, BadRequest):
+            return False
+        return isinstance(self.error, (NetworkError, RetryAfter))
+
+
+def _retry_after_seconds(error):
+    """Время ожидания из RetryAfter (int в PTB 21, timedelta в новых версиях)"""
+    retry_after = error.retry_after
+    if hasattr(retry_after, 'total_seconds'):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
 class TelegramBot:
     def __init__(self, token=TELEGRAM_BOT_TOKEN, database=None):
-        self.bot = Bot(token=token)
+        self.token = token
+        self._bot = None
         self.default_chat_id = TELEGRAM_RECRUITER_CHAT_ID
         self.database = database
         self.app = None
+        self.rate_limiter = RateLimiter()
+        self.send_concurrency = max(1, TELEGRAM_SEND_CONCURRENCY)
+        self.max_attempts = max(1, TELEGRAM_SEND_MAX_ATTEMPTS)
+        self.retry_base_delay = TELEGRAM_RETRY_BASE_DELAY
+        self.admin_chat_ids = TELEGRAM_ADMIN_CHAT_IDS
+        self.picker_page_size = max(1, TELEGRAM_PICKER_PAGE_SIZE)
+        self.update_mode = TELEGRAM_UPDATE_MODE
+        self.webhook_url = TELEGRAM_WEBHOOK_URL
+        self.webhook_host = TELEGRAM_WEBHOOK_HOST
+        self.webhook_port = TELEGRAM_WEBHOOK_PORT
+        self.webhook_secret = TELEGRAM_WEBHOOK_SECRET
+        self.webhook_concurrency = TELEGRAM_WEBHOOK_CONCURRENCY
+        self.webhook_polling_fallback = TELEGRAM_WEBHOOK_POLLING_FALLBACK
+        self.webhook = None
+        self._recruiter_index = None
+        # CycleProfiler из main.py; без него /profile недоступна
+        self.profiler = None
+        # ReminderTimer из main.py: новая регистрация может сделать доставляемыми
+        # уже просмотренные напоминания
+        self.reminder_timer = None
+    
+    @property
+    def bot(self):
+        """Клиент Bot API: до start() - отдельный, создаётся при первой отправке"""
+        if self._bot is None:
+            # Конструктор поднимает HTTP-клиенты с SSL-контекстом - не на старте
+            self._bot = Bot(token=self.token)
+        return self._bot
+    
+    @bot.setter
+    def bot(self, value):
+        self._bot = value
     
     async def setup_handlers(self, app):
         """Настроить обработчики команд"""
         app.add_handler(CommandHandler("start", self.start_command))
+        app.add_handler(CommandHandler("stats", self.stats_command))
+        app.add_handler(CommandHandler("profile", self.profile_command))
         app.add_handler(CallbackQueryHandler(self.recruiter_selection_callback))
+        # Текст в личном чате - поиск своего имени в справочнике
+        app.add_handler(MessageHandler(
+            filters.TEXT & ~filters.COMMAND & filters.ChatType.PRIVATE, self.recruiter_search
+        ))
     
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /start - выбор рекрутера"""
@@ -36,42 +188,131 @@ class TelegramBot:
             )
             return
         
-        # Получаем всех рекрутеров из таблицы (все уникальные имена)
-        recruiters = self.database.get_unique_recruiter_names()
-        
-        if not recruiters:
+        # Справочник рекрутеров может быть большим - показываем его постранично
+        index = self._picker_index()
+        if not len(index):
             await update.message.reply_text("❌ Нет рекрутеров в таблице")
             return
         
-        # Создаем кнопки для выбора
-        keyboard = []
-        for recruiter_name in recruiters:
-            keyboard.append([
-                InlineKeyboardButton(recruiter_name, callback_data=f"recruiter_{recruiter_name}")
-            ])
+        reply_markup, _, _ = picker_keyboard(index.entries, 0, self.picker_page_size)
+        await update.message.reply_text(
+            "👋 Выберите вашу фамилию и имя из списка\n"
+            "или отправьте начало фамилии для поиска:",
+            reply_markup=reply_markup
+        )
+    
+    def _picker_index(self):
+        """Индекс поиска по справочнику; перестраивается, только когда справочник перечитан"""
+        directory = self.database.get_recruiter_directory()
+        if self._recruiter_index is None or self._recruiter_index.directory is not directory:
+            self._recruiter_index = RecruiterIndex(directory)
+        return self._recruiter_index
+    
+    async def recruiter_search(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Поиск рекрутера по тексту сообщения - для ещё не зарегистрированных чатов"""
+        if not self.database or not update.message or not update.message.text:
+            return
+        if self.database.get_recruiter_by_chat_id(str(update.effective_chat.id)):
+            return
         
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        matches = self._picker_index().search(update.message.text)
+        if not matches:
+            await update.message.reply_text(
+                "🔍 Никого не нашлось. Попробуйте другую часть фамилии или /start для полного списка"
+            )
+            return
         
+        page_size = self.picker_page_size
+        reply_markup, _, _ = picker_keyboard(matches[:page_size], 0, page_size)
+        text = f"🔍 Найдено: {len(matches)}"
+        if len(matches) > page_size:
+            text += f", показаны первые {page_size} - уточните запрос"
+        await update.message.reply_text(text, reply_markup=reply_markup)
+    
+    def is_admin(self, chat_id):
+        """Чат администратора (TELEGRAM_ADMIN_CHAT_IDS)"""
+        return str(chat_id) in self.admin_chat_ids
+    
+    async def stats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработчик команды /stats - сводка метрик, только для администраторов"""
+        if not self.is_admin(update.effective_chat.id):
+            await update.message.reply_text("⛔ Команда доступна только администраторам")
+            return
+        
+        text = html.escape(metrics.summary())
+        # Сводка в <pre> должна уложиться в одно сообщение
+        budget = MESSAGE_LIMIT - len("<pre></pre>") - 1
+        if len(text) > budget:
+            text = text[:budget].rsplit('\n', 1)[0] + "…"
+        await update.message.reply_text(f"<pre>{text}</pre>", parse_mode='HTML')
+    
+    async def profile_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработчик команды /profile [N] - профилировать следующие N циклов проверки"""
+        if not self.is_admin(update.effective_chat.id):
+            await update.message.reply_text("⛔ Команда доступна только администраторам")
+            return
+        if not self.profiler:
+            await update.message.reply_text("❌ Профилирование недоступно")
+            return
+        
+        args = context.args if context else None
+        try:
+            cycles = int(args[0]) if args else 1
+        except ValueError:
+            cycles = 0
+        if not 1 <= cycles <= 10:
+            await update.message.reply_text("❌ Укажите число циклов от 1 до 10: /profile 3")
+            return
+        
+        self.profiler.arm(cycles, reason='admin')
         await update.message.reply_text(
-            "👋 Выберите вашу фамилию и имя из списка:",
-            reply_markup=reply_markup
+            f"🔬 Будет профилировано циклов: {self.profiler.remaining}. "
+            f"Отчёты появятся в {html.escape(self.profiler.directory)}",
+            parse_mode='HTML'
         )
     
     async def recruiter_selection_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Обработчик нажатия кнопки с выбором рекрутера"""
+        """Обработчик кнопок выбора рекрутера: листание страниц и выбор имени"""
         query = update.callback_query
+        data = query.data or ''
         await query.answer()
         
         if not self.database:
             await query.edit_message_text("❌ База данных недоступна")
             return
         
-        # Извлекаем имя рекрутера из callback_data
-        if not query.data.startswith("recruiter_"):
+        if data.startswith(PAGE_PREFIX):
+            if data == NOOP_DATA:
+                return
+            try:
+                page = int(data[len(PAGE_PREFIX):])
+            except ValueError:
+                return
+            reply_markup, _, _ = picker_keyboard(self._picker_index().entries, page, self.picker_page_size)
+            try:
+                await query.edit_message_reply_markup(reply_markup=reply_markup)
+            except BadRequest as e:
+                # Повторное нажатие той же кнопки: "message is not modified"
+                logger.debug("Страница выбора рекрутера не обновлена: %s", e)
             return
         
-        recruiter_name = query.data.replace("recruiter_", "")
-        chat_id = str(query.effective_chat.id)
+        # Кнопка несёт id справочника; имя в callback_data - формат старых сообщений,
+        # его тоже нужно найти в справочнике: callback_data присылает клиент
+        if data.startswith(SELECT_PREFIX):
+            try:
+                recruiter_id = int(data[len(SELECT_PREFIX):])
+            except ValueError:
+                return
+            recruiter_name = self.database.get_recruiter_name(recruiter_id)
+        elif data.startswith(LEGACY_PREFIX):
+            recruiter_name = self._picker_index().find_name(data[len(LEGACY_PREFIX):])
+        else:
+            return
+        if not recruiter_name:
+            await query.edit_message_text("❌ Рекрутер не найден в таблице. Отправьте /start ещё раз")
+            return
+        
+        chat_id = str(update.effective_chat.id)
         
         # Сохраняем рекрутера в БД
         success = self.database.add_recruiter(chat_id, recruiter_name)
@@ -79,50 +320,145 @@ class TelegramBot:
         if success:
             await query.edit_message_text(
                 f"✅ <b>Вы зарегистрированы!</b>\n\n"
-                f"Имя: <b>{recruiter_name}</b>\n\n"
+                f"Имя: <b>{html.escape(recruiter_name)}</b>\n\n"
                 f"Вы будете получать напоминания о кандидатах, назначенных вам.",
                 parse_mode='HTML'
             )
             logger.info(f"✅ Рекрутер {recruiter_name} зарегистрирован с chat_id {chat_id}")
+            if self.reminder_timer:
+                self.reminder_timer.notify()
         else:
             await query.edit_message_text("❌ Ошибка при регистрации. Попробуйте позже.")
     
-    async def send_reminder(self, candidate_name, object_name, chat_id=None):
-        """Отправить напоминание рекрутеру"""
-        if not chat_id:
-            chat_id = self.default_chat_id
-        
-        message = (
+    @staticmethod
+    def format_reminder(candidate_name, object_name):
+        """Текст напоминания о выходе кандидата"""
+        return (
             f"⚠️ <b>Напоминание о выходе кандидата</b>\n\n"
-            f"<b>Кандидат:</b> {candidate_name}\n"
-            f"<b>Объект:</b> {object_name}\n\n"
+            f"<b>Кандидат:</b> {html.escape(candidate_name)}\n"
+            f"<b>Объект:</b> {html.escape(object_name)}\n\n"
             f"🔔 Кандидат выходит на работу <b>ЗАВТРА</b>!\n"
             f"Пожалуйста, позвоните и уточните факт выхода."
         )
+    
+    @staticmethod
+    def format_digest(candidates, limit=MESSAGE_LIMIT):
+        """Сводка кандидатов, выходящих завтра, для одного рекрутера.
         
-        try:
-            await self.bot.send_message(
-                chat_id=chat_id,
-                text=message,
-                parse_mode='HTML'
-            )
-            return True
-        except Exception as e:
-            logger.error(f"❌ Ошибка при отправке сообщения: {e}")
-            return False
+        candidates - список (candidate_id, ФИО, объект). Возвращает список
+        (candidate_ids, текст): сводка режется по границам кандидатов так,
+        чтобы каждое сообщение укладывалось в limit символов.
+        """
+        header = f"⚠️ <b>Завтра выходят на работу: {len(candidates)}</b>\n\n"
+        continued = "⚠️ <b>Завтра выходят на работу (продолжение)</b>\n\n"
+        footer = "\n🔔 Пожалуйста, позвоните и уточните факт выхода."
+        
+        messages = []
+        ids = []
+        lines = []
+        size = len(header) + len(footer)
+        for number, (candidate_id, name, obj) in enumerate(candidates, 1):
+            line = f"{number}. <b>{html.escape(name)}</b> — {html.escape(obj)}\n"
+            if lines and size + len(line) > limit:
+                messages.append((ids, (header if not messages else continued) + ''.join(lines) + footer))
+                ids = []
+                lines = []
+                size = len(continued) + len(footer)
+            if size + len(line) > limit:
+                # Строка сама по себе не помещается: обрезаем текст без разметки
+                budget = limit - size - 2
+                raw = f"{number}. {name} — {obj}"[:budget]
+                while len(html.escape(raw)) > budget:
+                    raw = raw[:-1]
+                line = html.escape(raw) + "…\n"
+            ids.append(candidate_id)
+            lines.append(line)
+            size += len(line)
+        if lines:
+            messages.append((ids, (header if not messages else continued) + ''.join(lines) + footer))
+        return messages
+    
+    async def send_reminder(self, candidate_name, object_name, chat_id=None):
+        """Отправить напоминание рекрутеру"""
+        if not chat_id:
+            chat_id = self.default_chat_id
+        
+        result = await self._deliver(None, chat_id, self.format_reminder(candidate_name, object_name))
+        return result.success
     
     async def send_message(self, chat_id, text):
         """Отправить произвольное сообщение"""
-        try:
-            await self.bot.send_message(
-                chat_id=chat_id,
-                text=text,
-                parse_mode='HTML'
-            )
-            return True
-        except Exception as e:
-            logger.error(f"❌ Ошибка при отправке сообщения: {e}")
-            return False
+        result = await self._deliver(None, chat_id, text)
+        return result.success
+    
+    async def send_messages(self, messages, concurrency=None):
+        """Отправить пачку сообщений параллельно с учётом лимитов Telegram.
+        
+        messages - последовательность (key, chat_id, text). Возвращает список
+        DeliveryResult в том же порядке, key передаётся в результат как есть.
+        Слот параллельности занимается только после токена лимита чата, чтобы
+        сообщения одного чата не держали слоты, пока ждут своей очереди.
+        """
+        semaphore = asyncio.Semaphore(concurrency or self.send_concurrency)
+        
+        return await asyncio.gather(*(
+            self._deliver(key, chat_id, text, semaphore) for key, chat_id, text in messages
+        ))
+    
+    async def _deliver(self, key, chat_id, text, slots=None):
+        """Отправить сообщение с повторами.
+        
+        RetryAfter приостанавливает все отправки на время, указанное Telegram;
+        временные сетевые ошибки повторяются с экспоненциальной задержкой;
+        остальные ошибки (BadRequest, Forbidden и т.п.) окончательные.
+        slots - семафор параллельности send_messages, занимается на время запроса.
+        """
+        slots = slots or asyncio.Semaphore(1)
+        error = None
+        for attempt in range(1, self.max_attempts + 1):
+            await self.rate_limiter.acquire_chat(chat_id)
+            try:
+                await self._send(chat_id, text, slots)
+                metrics.TELEGRAM_REQUESTS.labels('ok').inc()
+                return DeliveryResult(key, chat_id, True, attempt)
+            except RetryAfter as e:
+                metrics.TELEGRAM_REQUESTS.labels('retry_after').inc()
+                error = e
+                delay = _retry_after_seconds(e)
+                logger.warning(f"⏳ Flood control Telegram, пауза {delay:.0f} сек")
+                self.rate_limiter.pause(delay)
+            except BadRequest as e:
+                metrics.TELEGRAM_REQUESTS.labels('bad_request').inc()
+                error = e
+                break
+            except NetworkError as e:
+                metrics.TELEGRAM_REQUESTS.labels('network_error').inc()
+                error = e
+                if attempt < self.max_attempts:
+                    delay = self.retry_base_delay * 2 ** (attempt - 1) * (1 + random.random() / 2)
+                    logger.warning(f"⚠️ Сетевая ошибка при отправке в {chat_id}: {e}. Повтор через {delay:.1f} сек")
+                    await asyncio.sleep(delay)
+            except Exception as e:
+                metrics.TELEGRAM_REQUESTS.labels('error').inc()
+                error = e
+                break
+        
+        logger.error(f"❌ Ошибка при отправке сообщения: {error}")
+        return DeliveryResult(key, chat_id, False, attempt, error)
+    
+    async def _send(self, chat_id, text, slots):
+        """Один запрос sendMessage под слотом параллельности и общим лимитом"""
+        async with slots:
+            await self.rate_limiter.acquire_global()
+            started = time.perf_counter()
+            try:
+                return await self.bot.send_message(
+                    chat_id=chat_id,
+                    text=text,
+                    parse_mode='HTML'
+                )
+            finally:
+                metrics.TELEGRAM_SECONDS.labels().observe(time.perf_counter() - started)
     
     async def test_connection(self):
         """Проверить подключение к боту"""
@@ -135,22 +471,104 @@ class TelegramBot:
             return False
     
     async def start(self, database):
-        """Запустить Application бота с обработчиками"""
+        """Запустить Application бота с обработчиками.
+        
+        После запуска все отправки идут через self.app.bot: одно инициализированное
+        HTTP-соединение с пулом на весь процесс вместо отдельного клиента.
+        Обновления приходят через webhook (TELEGRAM_UPDATE_MODE=webhook) или polling.
+        Если webhook не удалось включить, на polling бот переходит только при
+        TELEGRAM_WEBHOOK_POLLING_FALLBACK: start_polling() снимает webhook, на
+        который рассчитывают другие реплики. Иначе - исключение, а Application
+        остаётся запущенным для отправки сообщений.
+        """
         self.database = database
-        self.app = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+        self.app = Application.builder().token(self.token).build()
         
         await self.setup_handlers(self.app)
         
-        # Запускаем polling
         await self.app.initialize()
+        self.bot = self.app.bot
         await self.app.start()
+        if self.update_mode == 'webhook':
+            try:
+                await self.start_webhook()
+                return self.app
+            except Exception as e:
+                if not self.webhook_polling_fallback:
+                    raise
+                logger.warning(f"⚠️ {e}. Используется polling (TELEGRAM_WEBHOOK_POLLING_FALLBACK)")
+        # start_polling() сам снимает webhook, оставшийся от прошлого запуска
         await self.app.updater.start_polling()
         
         return self.app
     
+    async def start_webhook(self):
+        """Поднять приёмник и зарегистрировать webhook в Telegram.
+        
+        set_webhook повторяется при сетевых сбоях; если приёмник не поднялся
+        (например, порт занят другой репликой) или Telegram так и не принял
+        webhook, приёмник останавливается и выбрасывается RuntimeError.
+        """
+        if not self.webhook_url:
+            raise RuntimeError("TELEGRAM_UPDATE_MODE=webhook, но TELEGRAM_WEBHOOK_URL не задан")
+        # token_urlsafe даёт только символы, допустимые в secret_token
+        secret = self.webhook_secret or secrets.token_urlsafe(32)
+        server = WebhookServer(
+            self.app, secret,
+            host=self.webhook_host,
+            port=self.webhook_port,
+            path=urlparse(self.webhook_url).path or '/',
+            concurrency=self.webhook_concurrency
+        )
+        try:
+            await server.start()
+        except OSError as e:
+            raise RuntimeError(
+                f"приёмник webhook не запустился на {self.webhook_host}:{self.webhook_port} ({e}); "
+                f"у каждой реплики должен быть свой TELEGRAM_WEBHOOK_PORT"
+            ) from e
+        try:
+            await self._set_webhook(secret)
+        except Exception as e:
+            await server.stop()
+            raise RuntimeError(f"Telegram не принял webhook {self.webhook_url}: {e}") from e
+        self.webhook = server
+        logger.info(f"🌐 Обновления Telegram через webhook {self.webhook_url} "
+                    f"(приём на {server.host}:{server.port}{server.path})")
+        return True
+    
+    async def _set_webhook(self, secret):
+        """set_webhook с повторами при NetworkError и RetryAfter"""
+        for attempt in range(1, WEBHOOK_SETUP_ATTEMPTS + 1):
+            try:
+                return await self.app.bot.set_webhook(
+                    self.webhook_url,
+                    secret_token=secret,
+                    max_connections=self.webhook_concurrency
+                )
+            except RetryAfter as e:
+                if attempt == WEBHOOK_SETUP_ATTEMPTS:
+                    raise
+                delay = _retry_after_seconds(e)
+            except NetworkError as e:
+                if attempt == WEBHOOK_SETUP_ATTEMPTS:
+                    raise
+                delay = WEBHOOK_SETUP_RETRY_DELAY * 2 ** (attempt - 1)
+            logger.warning(f"⚠️ set_webhook не удался (попытка {attempt}/{WEBHOOK_SETUP_ATTEMPTS}), "
+                           f"повтор через {delay:.0f} с")
+            await asyncio.sleep(delay)
+    
     async def stop(self):
         """Остановить бота"""
+        if self.webhook:
+            # Webhook в Telegram не снимается: обновления за время перезапуска
+            # Telegram придержит и доставит новому процессу
+            await self.webhook.stop()
+            self.webhook = None
         if self.app:
-            await self.app.updater.stop()
-            await self.app.stop()
+            if self.app.updater and self.app.updater.running:
+                await self.app.updater.stop()
+            if self.app.running:
+                await self.app.stop()
             await self.app.shutdown()
+            self.app = None
@@ -0,0 +1,141 @@
+import hmac
+import json
+import asyncio
+import logging
+from telegram import Update
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Заголовок, в котором Telegram присылает secret_token из setWebhook
+SECRET_HEADER = 'x-telegram-bot-api-secret-token'
+# Обновление Telegram - единицы килобайт; тело больше этого не читается
+MAX_BODY_BYTES = 1024 * 1024
+MAX_HEADERS = 100
+# Сколько ждать строку запроса, заголовки и тело от клиента (сек)
+READ_TIMEOUT = 10
+
+_REASONS = {
+    200: 'OK',
+    400: 'Bad Request',
+    403: 'Forbidden',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    411: 'Length Required',
+    413: 'Payload Too Large',
+    500: 'Internal Server Error',
+}
+
+
+class WebhookServer:
+    """Приёмник webhook Telegram на asyncio.start_server.
+
+    Принимает POST на path с JSON-обновлением, проверяет заголовок
+    X-Telegram-Bot-Api-Secret-Token и передаёт обновление в
+    Application.process_update() - те же обработчики, что и при polling.
+    Одновременно обрабатывается не больше concurrency обновлений; ответ
+    200 уходит после обработки, поэтому обновление, которое не успели
+    обработать до остановки, Telegram пришлёт снова.
+
+    Сервер не зависит от того, кто шлёт запросы: локально обновление можно
+    отправить обычным HTTP-клиентом с тем же секретом.
+    """
+
+    def __init__(self, app, secret, host='127.0.0.1', port=0, path='/', concurrency=8):
+        self.app = app
+        self.secret = secret.encode('utf-8')
+        self.host = host
+        self.path = path or '/'
+        self._port = port
+        self._slots = asyncio.Semaphore(max(1, concurrency))
+        self._server = None
+
+    @property
+    def port(self):
+        """Порт, который слушает сервер (при port=0 - выбранный системой)"""
+        if self._server and self._server.sockets:
+            return self._server.sockets[0].getsockname()[1]
+        return self._port
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self._port)
+        return self
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader, writer):
+        status = 400
+        try:
+            status = await self._serve(reader)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        except Exception as e:
+            logger.error(f"❌ Ошибка приёмника webhook: {e}")
+            status = 500
+        try:
+            reason = _REASONS.get(status, '')
+            writer.write(
+                f"HTTP/1.1 {status} {reason}\r\nContent-Length: 0\r\nConnection: close\r\n\r\n".encode('latin-1')
+            )
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            metrics.TELEGRAM_WEBHOOK_REQUESTS.labels(str(status)).inc()
+            writer.close()
+
+    async def _serve(self, reader):
+        """Прочитать запрос и обработать обновление. Возвращает HTTP-статус ответа"""
+        request_line = await asyncio.wait_for(reader.readline(), READ_TIMEOUT)
+        parts = request_line.decode('latin-1').split()
+        if len(parts) < 2:
+            return 400
+
+        headers = {}
+        while True:
+            line = await asyncio.wait_for(reader.readline(), READ_TIMEOUT)
+            if not line or line in (b'\r\n', b'\n'):
+                break
+            if len(headers) >= MAX_HEADERS:
+                return 400
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        method, target = parts[0], parts[1].split('?')[0]
+        if target != self.path:
+            return 404
+        if method != 'POST':
+            return 405
+        # Секрет проверяется до чтения тела и за постоянное время
+        received = headers.get(SECRET_HEADER, '').encode('latin-1')
+        if not hmac.compare_digest(received, self.secret):
+            logger.warning("⚠️ Запрос к webhook с неверным секретом отклонён")
+            return 403
+        if 'content-length' not in headers:
+            return 411
+        length = int(headers['content-length'])
+        if length < 0 or length > MAX_BODY_BYTES:
+            return 413
+
+        body = await asyncio.wait_for(reader.readexactly(length), READ_TIMEOUT)
+        try:
+            data = json.loads(body)
+            update = Update.de_json(data, self.app.bot) if isinstance(data, dict) else None
+        except (ValueError, TypeError, KeyError) as e:
+            logger.warning(f"⚠️ Webhook: не удалось разобрать обновление: {e}")
+            return 400
+        if update is None:
+            return 400
+
+        async with self._slots:
+            # Ошибка обработчика - не повод для 500: Telegram бесконечно
+            # повторял бы то же обновление
+            try:
+                await self.app.process_update(update)
+            except Exception as e:
+                logger.error(f"❌ Ошибка при обработке обновления {update.update_id}: {e}")
+        return 200